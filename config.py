@@ -13,6 +13,14 @@ DATA_DIR = os.path.join(APP_DIR, 'data')
 STORAGE_DIR = os.path.join(APP_DIR, 'storage')
 THUMBNAIL_DIR = os.path.join(STORAGE_DIR, 'thumbnails')
 DRAWINGS_DIR = os.path.join(STORAGE_DIR, 'drawings')
+# 內容定址檔案庫（以 SHA-256 命名，相同內容只存一份）
+BLOB_DIR = os.path.join(STORAGE_DIR, 'blobs')
+# 歷史版次還原暫存目錄
+REVISION_CACHE_DIR = os.path.join(STORAGE_DIR, 'revision_cache')
+# 版次差異比對的渲染與疊圖快取（以檔案雜湊命名）
+DIFF_CACHE_DIR = os.path.join(STORAGE_DIR, 'diff_cache')
+# 出口文件組產生的 PDF（每張訂單一個子目錄）
+EXPORT_DOCS_DIR = os.path.join(STORAGE_DIR, 'export_documents')
 
 # 資料庫路徑
 DB_PATH = os.path.join(DATA_DIR, 'dwg_manager.db')
@@ -77,9 +85,67 @@ FLOW_A_STEPS = ['車工部整理', '管理部寄客戶', '客戶確認', '已完
 # B/C流程任務狀態
 FLOW_BC_TASK_STATUS = ['待通知', '已收到']
 
+# 發行時效標準（小時）：B/C 為發行到收到，A 為每個步驟
+CIRCULATION_SLA_HOURS = {'A': 72, 'B': 24, 'C': 24}
+
 # 備份目錄（所有上傳到軟體的檔案都會備份到此路徑）
 BACKUP_DIR = r'D:\OneDrive\公司圖面'
 
+# 文字格式圖檔的舊版次改存壓縮差異（最新版次保留完整檔案）
+REVISION_DELTA_ENABLED = True
+REVISION_DELTA_EXTENSIONS = ('.dxf', '.igs', '.iges')
+
+# 實體快取有效秒數（其他工作站的修改最晚在此時間後反映）
+ENTITY_CACHE_TTL = 30
+
+# 產能負荷：每台機器每日可用工時；單一任務每個工作日佔用的工時
+CAPACITY_HOURS_PER_DAY = 8
+
+# 多人共用資料庫：鎖定時等待的毫秒數、寫入重試次數與退避（起始秒數, 上限秒數）
+DB_BUSY_TIMEOUT_MS = 5000
+DB_WRITE_RETRIES = 5
+DB_RETRY_BACKOFF = (0.05, 2.0)
+
+# 用戶端/伺服器模式：設定 API_SERVER_URL（例如 'http://192.168.1.10:8765'）時，
+# 介面改透過查詢 API 伺服器存取資料，不直接開啟網路磁碟上的資料庫檔案
+API_SERVER_URL = None
+API_SERVER_HOST = '127.0.0.1'
+API_SERVER_PORT = 8765
+API_SERVER_TOKEN = None     # 設定後用戶端需以 X-Api-Token 標頭帶入；伺服器監聽非本機位址時必填
+API_CLIENT_TIMEOUT = 30
+
+# 查詢效能量測（開發用）：啟用後記錄各查詢函式耗時，超過 SLOW_QUERY_MS 寫入慢查詢紀錄
+QUERY_PROFILING = False
+SLOW_QUERY_MS = 250
+SLOW_QUERY_LOG = os.path.join(DATA_DIR, 'slow_queries.log')
+QUERY_STATS_FILE = os.path.join(DATA_DIR, 'query_stats.json')
+
+# 即時搜尋：停止輸入多久後查詢（毫秒）、快取的關鍵字數
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_CACHE_SIZE = 32
+
+# 資料異動輪詢間隔（毫秒）與異動紀錄保留天數
+CHANGE_POLL_INTERVAL_MS = 3000
+CHANGE_LOG_KEEP_DAYS = 7
+
+# 圖檔文字擷取（標題欄、料號、註記）：支援格式、背景程序數、每個檔案保留的字元上限
+CONTENT_EXTRACT_EXTENSIONS = ('.pdf', '.dxf', '.igs', '.iges')
+CONTENT_EXTRACT_WORKERS = 2
+CONTENT_TEXT_MAX_CHARS = 200000
+CONTENT_EXTRACT_RETRY_HOURS = 24     # 缺少擷取套件等暫時性失敗，隔多久再重試
+
+# 相似圖面：感知雜湊的最大漢明距離（64 位元中不同的位元數）、縮圖索引重新掃描間隔（秒）
+SIMILARITY_MAX_DISTANCE = 10
+SIMILARITY_REFRESH_SECONDS = 60
+
+# 版次差異比對：比對圖片長邊像素上限、快取保留的檔案數上限
+DIFF_MAX_SIDE = 3000
+DIFF_CACHE_MAX_FILES = 200
+
+# 批次 PDF 輸出的程序數（單據少於 BATCH_PDF_MIN_PARALLEL 張時在目前程序內依序產生）
+BATCH_PDF_WORKERS = 4
+BATCH_PDF_MIN_PARALLEL = 8
+
 # 資源目錄
 ASSETS_DIR = os.path.join(APP_DIR, 'assets')
 
@@ -151,6 +217,12 @@ ORDER_STATUS = ['新訂單', '生產中', '部分出貨', '已出貨', '已完
 # 發票狀態
 INVOICE_STATUS = ['未付', '部分付款', '已付清', '逾期', '已作廢']
 
+# 應收帳款計入的發票狀態（部分付款以發票全額計，發票未記錄已收金額）
+AR_OPEN_STATUSES = ['未付', '部分付款', '逾期']
+
+# 逾期檢查間隔（分鐘）：主視窗啟動時與之後每隔此時間，將過了到期日的未付發票標為逾期
+AR_OVERDUE_CHECK_MINUTES = 60
+
 # 出口文件類型
 EXPORT_DOC_TYPES = [
     '商業發票 (Commercial Invoice)',
@@ -166,6 +238,9 @@ EXPORT_DOC_TYPES = [
 # 出口文件狀態
 EXPORT_DOC_STATUS = ['準備中', '已出具', '已寄出', '已歸檔']
 
+# 出口文件組預設包含的文件（商業發票與裝箱單自動產生 PDF，其餘建立待補紀錄）
+EXPORT_PACK_DOC_TYPES = EXPORT_DOC_TYPES[:4]
+
 # 運輸方式
 SHIPPING_METHODS = ['海運', '空運', '快遞', '陸運', '自取']
 
@@ -199,7 +274,7 @@ DOC_NUMBER_PREFIX = {
 
 
 # 確保必要目錄存在
-for d in [DATA_DIR, STORAGE_DIR, THUMBNAIL_DIR, DRAWINGS_DIR, ASSETS_DIR]:
+for d in [DATA_DIR, STORAGE_DIR, THUMBNAIL_DIR, DRAWINGS_DIR, BLOB_DIR, ASSETS_DIR]:
     os.makedirs(d, exist_ok=True)
 # 備份目錄容錯（外部磁碟可能不存在）
 try:
@@ -0,0 +1,180 @@
+"""批次文件輸出 — 依期間、客戶、狀態一次產生多張發票或報價單 PDF
+
+表頭與明細各以一次查詢取得（business_queries.get_batch_documents），
+PDF 在程序池中平行產生（每個工作程序只註冊一次字型），結果依單號排序輸出為：
+  'files'：每張單據一個 PDF，存到指定資料夾
+  'zip'  ：打包成一個 ZIP
+  'merge'：合併為單一 PDF，每張單據一個書籤（需 PyMuPDF）
+
+手動執行：
+    python -m core.batch_pdf invoice 2026-01.zip --from 2026-01-01 --to 2026-01-31 [--mode zip]
+"""
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from config import BATCH_PDF_WORKERS, BATCH_PDF_MIN_PARALLEL
+
+# 單據類型 → (顯示名稱, 單號欄)
+DOCUMENT_KINDS = {
+    'invoice': ('發票', 'invoice_number'),
+    'quotation': ('報價單', 'quotation_number'),
+}
+
+OUTPUT_MODES = {
+    'zip': 'ZIP 壓縮檔',
+    'merge': '合併為單一 PDF',
+    'files': '個別 PDF 檔（資料夾）',
+}
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+
+# ===== 產生（在工作程序中執行，只依賴傳入的資料） =====
+
+def _render_job(job):
+    """工作程序入口：回傳 (單號, PDF 內容, 錯誤訊息)"""
+    from core.pdf_generator import generate_invoice_pdf, generate_quotation_pdf
+    kind, header, items = job
+    number = header[DOCUMENT_KINDS[kind][1]]
+    generate = generate_invoice_pdf if kind == 'invoice' else generate_quotation_pdf
+    buf = io.BytesIO()
+    try:
+        generate(buf, header, items, client_name=header.get('client_name') or '')
+        return number, buf.getvalue(), None
+    except Exception as e:
+        return number, None, f"{type(e).__name__}: {e}"
+
+
+# ===== 輸出 =====
+
+class _FolderWriter:
+    def __init__(self, path):
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def add(self, name, data):
+        with open(os.path.join(self.path, f"{name}.pdf"), 'wb') as f:
+            f.write(data)
+
+    def close(self):
+        pass
+
+
+class _ZipWriter:
+    def __init__(self, path):
+        # PDF 內容已壓縮，ZIP 只儲存不再壓縮
+        self.zf = zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED)
+
+    def add(self, name, data):
+        self.zf.writestr(f"{name}.pdf", data)
+
+    def close(self):
+        self.zf.close()
+
+
+class _MergeWriter:
+    def __init__(self, path):
+        try:
+            import fitz  # PyMuPDF
+        except ImportError:
+            raise RuntimeError("需要安裝 PyMuPDF 套件才能合併 PDF") from None
+        self.fitz = fitz
+        self.path = path
+        self.doc = fitz.open()
+        self.toc = []
+
+    def add(self, name, data):
+        self.toc.append([1, name, self.doc.page_count + 1])
+        with self.fitz.open(stream=data, filetype='pdf') as part:
+            self.doc.insert_pdf(part)
+
+    def close(self):
+        if self.toc:
+            self.doc.set_toc(self.toc)
+        self.doc.save(self.path, garbage=3, deflate=True)
+        self.doc.close()
+
+
+_WRITERS = {'files': _FolderWriter, 'zip': _ZipWriter, 'merge': _MergeWriter}
+
+
+def generate_batch(kind, output, mode='zip', date_from=None, date_to=None, client_id=None,
+                   status=None, workers=BATCH_PDF_WORKERS, progress=None, cancel_event=None):
+    """批次產生單據 PDF
+
+    Args:
+        kind: 'invoice' 或 'quotation'
+        output: 輸出路徑（mode 為 'files' 時為資料夾）
+        mode: 'zip' / 'merge' / 'files'
+        date_from, date_to, client_id, status: 篩選條件（見 get_batch_documents）
+        workers: 程序數（1 表示在目前程序內依序產生）
+        progress: 進度回呼 progress(已完成, 總數)，在呼叫端執行緒中呼叫
+        cancel_event: threading.Event，設定後停止產生（已產生的仍會寫出）
+    Returns:
+        {'count': 成功張數, 'total': 符合條件張數, 'failed': [(單號, 錯誤)], 'cancelled': bool}
+    """
+    from db import business_queries as bq
+    headers, items = bq.get_batch_documents(kind, date_from, date_to, client_id, status)
+    jobs = [(kind, dict(h), [dict(i) for i in items.get(h['id'], [])]) for h in headers]
+    result = {'count': 0, 'total': len(jobs), 'failed': [], 'cancelled': False}
+    if not jobs:
+        return result
+
+    writer = _WRITERS[mode](output)
+    pool = None
+    try:
+        if workers <= 1 or len(jobs) < BATCH_PDF_MIN_PARALLEL:
+            rendered = map(_render_job, jobs)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            # 分塊送出以減少程序間往返；map 依原順序回傳，輸出維持單號排序
+            chunk = max(1, min(16, len(jobs) // (workers * 4)))
+            rendered = pool.map(_render_job, jobs, chunksize=chunk)
+
+        used = set()
+        for done, (number, data, error) in enumerate(rendered, 1):
+            if data is None:
+                result['failed'].append((number, error))
+                print(f"[批次 PDF 失敗] {number} → {error}")
+            else:
+                name = _UNSAFE_CHARS.sub('_', str(number))
+                while name in used:
+                    name += '_'
+                used.add(name)
+                writer.add(name, data)
+                result['count'] += 1
+            if progress:
+                progress(done, len(jobs))
+            if cancel_event is not None and cancel_event.is_set():
+                result['cancelled'] = True
+                break
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        writer.close()
+    return result
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='批次產生發票 / 報價單 PDF')
+    parser.add_argument('kind', choices=list(DOCUMENT_KINDS))
+    parser.add_argument('output')
+    parser.add_argument('--mode', choices=list(OUTPUT_MODES), default='zip')
+    parser.add_argument('--from', dest='date_from')
+    parser.add_argument('--to', dest='date_to')
+    parser.add_argument('--client', type=int, dest='client_id')
+    parser.add_argument('--status')
+    parser.add_argument('--workers', type=int, default=BATCH_PDF_WORKERS)
+    opts = parser.parse_args()
+
+    started = time.perf_counter()
+    res = generate_batch(opts.kind, opts.output, opts.mode, opts.date_from, opts.date_to,
+                         opts.client_id, opts.status, opts.workers,
+                         progress=lambda n, total: print(f"\r{n}/{total}", end='', flush=True))
+    print(f"\n完成 {res['count']}/{res['total']} 張（失敗 {len(res['failed'])}），"
+          f"耗時 {time.perf_counter() - started:.1f} 秒 → {opts.output}")
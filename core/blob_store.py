@@ -0,0 +1,196 @@
+"""內容定址檔案庫 — 以 SHA-256 為鍵值儲存圖檔
+
+相同內容的檔案（不同圖面或重複上傳的版次）只在 BLOB_DIR 存一份；
+存入前先計算雜湊，檔案庫已有此內容時不再寫入。檔案庫實體一律設為唯讀。
+- 管理目錄與版次暫存等使用者會開啟編輯的檔案：獨立複本（copy_blob），
+  以免在 CAD 中另存時直接改寫檔案庫實體、破壞所有參照同一雜湊的版次
+- 備份目錄：與檔案庫同一磁碟區時為唯讀硬連結（link_blob），不另佔空間；
+  跨磁碟區時才複製
+目的檔已是相同內容時不重複寫入。
+
+目錄結構：BLOB_DIR/前兩碼/完整雜湊
+"""
+import os
+import stat
+import shutil
+import hashlib
+import tempfile
+from config import BLOB_DIR
+
+# 串流讀寫區塊大小
+_CHUNK_SIZE = 1024 * 1024
+
+
+def blob_path(file_hash):
+    """取得雜湊值對應的檔案庫路徑"""
+    return os.path.join(BLOB_DIR, file_hash[:2], file_hash)
+
+
+def has_blob(file_hash):
+    """檢查檔案庫中是否已有此內容"""
+    return bool(file_hash) and os.path.exists(blob_path(file_hash))
+
+
+def file_sha256(file_path):
+    """串流計算檔案的 SHA-256"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _make_read_only(path):
+    mode = stat.S_IMODE(os.stat(path).st_mode)
+    os.chmod(path, mode & ~(stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH))
+
+
+def _make_writable(path):
+    os.chmod(path, stat.S_IMODE(os.stat(path).st_mode) | stat.S_IWUSR)
+
+
+def remove_file(path):
+    """刪除檔案（Windows 上唯讀檔案需先取消唯讀屬性）"""
+    try:
+        os.remove(path)
+    except PermissionError:
+        _make_writable(path)
+        os.remove(path)
+
+
+def store_blob(src_path):
+    """將檔案存入檔案庫
+
+    先只讀取計算雜湊，檔案庫已有此內容時不寫入任何資料；
+    沒有時才複製（複製時重新計算雜湊，期間來源被修改也以實際寫入的內容為準）。
+    blobs 表的登記由 queries.add_revision 在新增版次的同一交易內完成，
+    清理程序不會在存入與新增版次之間把內容當成無參照刪除。
+
+    Returns:
+        (file_hash, size)；來源不存在時回傳 (None, 0)
+    """
+    if not src_path or not os.path.exists(src_path):
+        return None, 0
+
+    file_hash = file_sha256(src_path)
+    if has_blob(file_hash):
+        return file_hash, os.path.getsize(blob_path(file_hash))
+
+    os.makedirs(BLOB_DIR, exist_ok=True)
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(prefix='.incoming_', dir=BLOB_DIR)
+    try:
+        with open(src_path, 'rb') as src, os.fdopen(fd, 'wb') as dst:
+            for chunk in iter(lambda: src.read(_CHUNK_SIZE), b''):
+                h.update(chunk)
+                dst.write(chunk)
+                size += len(chunk)
+        file_hash = h.hexdigest()
+
+        dest = blob_path(file_hash)
+        if os.path.exists(dest):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            os.replace(tmp_path, dest)
+            _make_read_only(dest)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return file_hash, size
+
+
+def _same_content(path, file_hash):
+    """目的檔是否已是此內容（大小不同時不必計算雜湊）"""
+    src = blob_path(file_hash)
+    return (os.path.getsize(path) == os.path.getsize(src)
+            and file_sha256(path) == file_hash)
+
+
+def copy_blob(file_hash, dest_path):
+    """將檔案庫內容複製為 dest_path 的獨立檔案
+
+    目的檔已存在且內容相同時直接略過；若目的檔與檔案庫是同一份實體（舊版以硬連結建立），
+    改為獨立複本。
+    """
+    src = blob_path(file_hash)
+    if not os.path.exists(src):
+        return None
+
+    if os.path.exists(dest_path):
+        try:
+            shared = os.path.samefile(src, dest_path)
+        except OSError:
+            shared = False
+        if not shared and _same_content(dest_path, file_hash):
+            return dest_path
+        remove_file(dest_path)
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    # 先寫暫存檔再更名，中斷時不會留下不完整的目的檔
+    fd, tmp_path = tempfile.mkstemp(prefix='.copy_', dir=os.path.dirname(dest_path))
+    os.close(fd)
+    try:
+        shutil.copy2(src, tmp_path)
+        # 檔案庫實體為唯讀，複本需可編輯
+        _make_writable(tmp_path)
+        os.replace(tmp_path, dest_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return dest_path
+
+
+def link_blob(file_hash, dest_path):
+    """將檔案庫內容以唯讀硬連結放到 dest_path（備份用，不另佔空間）
+
+    連結與檔案庫共用同一份唯讀實體，CAD 無法直接覆寫；另存新檔則會產生新的實體，
+    不影響檔案庫。目的檔已是相同內容時保留原檔（雲端同步不會重傳）。
+    跨磁碟區或檔案系統不支援硬連結時改以 copy_blob 複製。
+    """
+    src = blob_path(file_hash)
+    if not os.path.exists(src):
+        return None
+
+    if os.path.exists(dest_path):
+        try:
+            if os.path.samefile(src, dest_path):
+                return dest_path
+        except OSError:
+            pass
+        if _same_content(dest_path, file_hash):
+            return dest_path
+        remove_file(dest_path)
+
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    _make_read_only(src)
+    tmp_path = os.path.join(os.path.dirname(dest_path), f'.link_{os.getpid()}_{file_hash[:16]}')
+    try:
+        if os.path.lexists(tmp_path):
+            remove_file(tmp_path)
+        os.link(src, tmp_path)
+        os.replace(tmp_path, dest_path)
+    except OSError:
+        if os.path.lexists(tmp_path):
+            remove_file(tmp_path)
+        return copy_blob(file_hash, dest_path)
+    return dest_path
+
+
+def gc_blobs():
+    """清除已無任何版次參照的檔案庫內容，回傳刪除數量"""
+    from db import queries
+    removed = 0
+    for row in queries.get_orphan_blobs():
+        path = blob_path(row['hash'])
+        try:
+            if os.path.exists(path):
+                remove_file(path)
+            queries.delete_blob(row['hash'])
+            removed += 1
+        except OSError as e:
+            print(f"[檔案庫清理失敗] {path} → {e}")
+    return removed
@@ -0,0 +1,164 @@
+"""部門產能負荷計算 — 以日為單位的 NumPy 陣列彙總生產任務與機器停機
+
+負荷（工時）：每個未完成任務在其起訖期間內，每日佔用
+    CAPACITY_HOURS_PER_DAY × (1 - 進度%)
+產能（工時）：部門可用機器數 × CAPACITY_HOURS_PER_DAY，再扣除停機：
+    - 已完成的維修紀錄：downtime_hours 平均分攤在停機起訖日
+    - 未完成的維修紀錄：自停機日起至今日，每日整台機器不可用
+
+區間加總以差分陣列（np.add.at + cumsum）計算，任務數與天數皆為線性成本；
+週 / 月彙總以 np.add.reduceat 在日陣列上切段。
+"""
+from datetime import date, timedelta
+import numpy as np
+from db import business_queries as bq
+from config import DEPARTMENTS, CAPACITY_HOURS_PER_DAY
+
+# 維修紀錄已結案的狀態
+_CLOSED_STATUS = ('已完成', '已關閉')
+
+# 1970-01-01 為星期四，日序 % 7 == 4 即為星期一
+_MONDAY = 4
+
+
+class CapacityResult:
+    """產能負荷計算結果（列：部門，欄：時間區段）"""
+
+    def __init__(self, departments, periods, load, capacity):
+        self.departments = departments      # [部門名稱]
+        self.periods = periods              # [區段起始日 (date)]
+        self.load = load                    # ndarray (部門, 區段) 工時
+        self.capacity = capacity            # ndarray (部門, 區段) 工時
+
+    @property
+    def utilization(self):
+        """負荷率（負荷 / 產能）；無產能的區段為 NaN"""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.capacity > 0, self.load / self.capacity, np.nan)
+
+    def overloaded(self, threshold=1.0):
+        """負荷率超過門檻的 (部門, 區段起始日) 清單"""
+        util = np.nan_to_num(self.utilization, nan=0.0)
+        rows, cols = np.nonzero(util > threshold)
+        return [(self.departments[r], self.periods[c]) for r, c in zip(rows, cols)]
+
+
+def _iso_day(value):
+    """取日期字串的 'YYYY-MM-DD' 部分；空值或格式不符回傳 'NaT'"""
+    text = str(value or '')[:10]
+    try:
+        date.fromisoformat(text)
+    except ValueError:
+        return 'NaT'
+    return text
+
+
+def _day_index(values, origin):
+    """將日期字串轉為相對 origin 的日序（超出期間的部分由 _spread 裁切）
+
+    Returns:
+        (日序陣列, 有效遮罩)：空值或無法解析的日期其遮罩為 False，日序為 0
+    """
+    days = np.array([_iso_day(v) for v in values], dtype='datetime64[D]')
+    valid = ~np.isnat(days)
+    index = np.zeros(len(days), dtype=np.int64)
+    index[valid] = (days[valid] - origin).astype(np.int64)
+    return index, valid
+
+
+def _spread(matrix, rows, starts, ends, rates):
+    """在 matrix[row, start..end] 區間加上每日 rate（差分陣列）"""
+    n_days = matrix.shape[1]
+    starts = np.clip(starts, 0, n_days)
+    ends = np.clip(ends + 1, 0, n_days)
+    valid = starts < ends
+    diff = np.zeros((matrix.shape[0], n_days + 1))
+    np.add.at(diff, (rows[valid], starts[valid]), rates[valid])
+    np.add.at(diff, (rows[valid], ends[valid]), -rates[valid])
+    matrix += np.cumsum(diff[:, :-1], axis=1)
+
+
+def _bucket_starts(days, bucket):
+    """週 / 月區段在日陣列中的起始索引"""
+    if bucket == 'day':
+        return np.arange(len(days))
+    if bucket == 'week':
+        marks = (days.astype(np.int64) % 7) == _MONDAY
+    elif bucket == 'month':
+        months = days.astype('datetime64[M]')
+        marks = np.r_[True, months[1:] != months[:-1]]
+    else:
+        raise ValueError(f"不支援的區段單位：{bucket}")
+    marks[0] = True
+    return np.flatnonzero(marks)
+
+
+def compute_capacity(start_date, end_date, bucket='week'):
+    """計算各部門在期間內的負荷與產能
+
+    Args:
+        start_date, end_date: 'YYYY-MM-DD' 或 date，含頭尾
+        bucket: 'day' / 'week' / 'month'
+    """
+    start_date, end_date = str(start_date), str(end_date)
+    origin = np.datetime64(start_date, 'D')
+    days = np.arange(origin, np.datetime64(end_date, 'D') + 1)
+    n_days = len(days)
+
+    tasks = bq.get_tasks_for_capacity(start_date, end_date)
+    machines = bq.get_machine_counts_by_department()
+    downtime = bq.get_downtime_for_capacity(start_date, end_date)
+
+    departments = list(DEPARTMENTS)
+    for name in ([t['department'] for t in tasks] + [m['department'] for m in machines]):
+        if name not in departments:
+            departments.append(name)
+    dept_index = {name: i for i, name in enumerate(departments)}
+
+    load = np.zeros((len(departments), n_days))
+    capacity = np.zeros((len(departments), n_days))
+
+    # 負荷
+    if tasks:
+        rows = np.array([dept_index[t['department']] for t in tasks])
+        starts, has_start = _day_index([t['start_date'] for t in tasks], origin)
+        ends, has_end = _day_index([t['end_date'] for t in tasks], origin)
+        ends = np.where(has_end, np.maximum(ends, starts), starts)
+        progress = np.clip(np.array([t['progress_pct'] or 0 for t in tasks], dtype=float), 0, 100)
+        # 開工日無法解析的任務不計入負荷
+        _spread(load, rows[has_start], starts[has_start], ends[has_start],
+                (CAPACITY_HOURS_PER_DAY * (1 - progress / 100))[has_start])
+
+    # 產能
+    for m in machines:
+        capacity[dept_index[m['department']]] = m['machine_count'] * CAPACITY_HOURS_PER_DAY
+
+    if downtime:
+        today = (np.datetime64(date.today().isoformat(), 'D') - origin).astype(np.int64)
+        rows = np.array([dept_index[d['department']] for d in downtime])
+        starts, has_start = _day_index([d['down_from'] for d in downtime], origin)
+        down_to, has_end = _day_index([d['down_to'] for d in downtime], origin)
+        closed = np.array([d['status'] in _CLOSED_STATUS for d in downtime]) & has_end
+        ends = np.where(closed, np.maximum(down_to, starts), today)
+        hours = np.array([d['downtime_hours'] or 0 for d in downtime], dtype=float)
+        span = (ends - starts + 1).clip(min=1)
+        rates = np.where(closed, hours / span, CAPACITY_HOURS_PER_DAY)
+        # 停機日無法解析的紀錄不扣產能
+        _spread(capacity, rows[has_start], starts[has_start], ends[has_start], -rates[has_start])
+        np.clip(capacity, 0, None, out=capacity)
+
+    if n_days == 0:
+        return CapacityResult(departments, [], load, capacity)
+    idx = _bucket_starts(days, bucket)
+    periods = [date.fromisoformat(str(d)) for d in days[idx]]
+    return CapacityResult(departments, periods,
+                          np.add.reduceat(load, idx, axis=1),
+                          np.add.reduceat(capacity, idx, axis=1))
+
+
+def compute_capacity_months(months=12, bucket='week', start=None):
+    """自本月起 months 個月的產能負荷（熱度圖用）"""
+    start = (start or date.today()).replace(day=1)
+    year, month = divmod(start.month - 1 + months, 12)
+    end = date(start.year + year, month + 1, 1) - timedelta(days=1)
+    return compute_capacity(start.isoformat(), end.isoformat(), bucket=bucket)
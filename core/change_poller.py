@@ -0,0 +1,176 @@
+"""資料異動輪詢 — 讀取 change_log 的新紀錄並通知訂閱者
+
+各資料表的觸發器把新增/修改/刪除寫入 change_log（見 db/database.py），
+輪詢器只查詢 seq > 上次位置的紀錄（主鍵範圍掃描），沒有異動時幾乎沒有成本。
+本機與其他共用同一資料庫的工作站所做的修改都會被取得。
+
+用法：
+    poller = get_change_poller(self.root)
+    poller.subscribe(('drawings', 'revisions'), self._on_drawings_changed)
+    poller.start()
+
+回呼於 Tk 主執行緒執行，參數為 ChangeSet。
+"""
+from db import queries
+from db.cache import entity_cache
+from core.query_executor import get_query_executor
+from config import CHANGE_POLL_INTERVAL_MS, CHANGE_LOG_KEEP_DAYS
+
+
+class ChangeSet:
+    """一次輪詢取得的異動彙總"""
+
+    def __init__(self, since_seq):
+        self.since_seq = since_seq
+        self.last_seq = since_seq
+        self.rows = {}          # table_name -> set(row_id)
+        self.deleted = {}       # table_name -> set(row_id)
+        self.drawing_ids = set()
+
+    def add(self, row):
+        self.last_seq = row['seq']
+        self.rows.setdefault(row['table_name'], set()).add(row['row_id'])
+        if row['op'] == 'D':
+            self.deleted.setdefault(row['table_name'], set()).add(row['row_id'])
+        if row['drawing_id'] is not None:
+            self.drawing_ids.add(row['drawing_id'])
+
+    @property
+    def tables(self):
+        return set(self.rows)
+
+    def touches(self, tables):
+        """是否包含指定資料表的異動（tables 為 None 表示任何異動）"""
+        return bool(self.rows) if tables is None else not self.rows.keys().isdisjoint(tables)
+
+    def __bool__(self):
+        return bool(self.rows)
+
+
+def fetch_changes(since_seq, batch_size=1000):
+    """（工作執行緒）讀取 since_seq 之後的所有異動並彙總為 ChangeSet"""
+    changes = ChangeSet(since_seq)
+    while True:
+        rows = queries.get_changes_since(changes.last_seq, batch_size)
+        for row in rows:
+            changes.add(row)
+        if len(rows) < batch_size:
+            return changes
+
+
+class ChangePoller:
+    """定時輪詢 change_log，依資料表分派給訂閱者"""
+
+    # QueryExecutor 的請求 key（主視窗的載入指示會略過此 key）
+    QUERY_KEY = 'change_poll'
+
+    def __init__(self, root, interval_ms=CHANGE_POLL_INTERVAL_MS):
+        self._root = root
+        self._interval_ms = interval_ms
+        self._seq = None
+        self._after_id = None
+        self._running = False
+        self._subscribers = []  # (tables or None, callback)
+
+    # ----- 公開 API -----
+
+    def subscribe(self, tables, callback):
+        """訂閱指定資料表的異動：callback(ChangeSet)；tables 為 None 表示全部"""
+        self._subscribers.append((frozenset(tables) if tables else None, callback))
+
+    def unsubscribe(self, callback):
+        self._subscribers = [(t, cb) for t, cb in self._subscribers if cb != callback]
+
+    def start(self):
+        """開始輪詢：以目前最新序號為起點，並清理過期的異動紀錄"""
+        if self._running:
+            return
+        self._running = True
+        executor = get_query_executor(self._root)
+        executor.submit('change_log_prune', queries.prune_change_log, CHANGE_LOG_KEEP_DAYS)
+        executor.submit(self.QUERY_KEY, queries.get_latest_change_seq,
+                        on_done=self._on_started, on_error=self._on_error)
+
+    def stop(self):
+        self._running = False
+        if self._after_id is not None:
+            self._root.after_cancel(self._after_id)
+            self._after_id = None
+        get_query_executor(self._root).cancel(self.QUERY_KEY)
+
+    def skip_pending(self, callback):
+        """略過尚未分派的異動後呼叫 callback（例如使用者按下重新整理，畫面會整個重新載入）
+
+        先取得最新序號再呼叫 callback：callback 之後送出的查詢必定包含被略過的異動，
+        不會因下一次輪詢再重新整理一次。
+        """
+        if not self._running or self._seq is None:
+            callback()
+            return
+        if self._after_id is not None:
+            self._root.after_cancel(self._after_id)
+            self._after_id = None
+
+        def _skipped(seq):
+            if seq > self._seq:
+                self._seq = seq
+            entity_cache.clear()
+            callback()
+            self._schedule()
+
+        def _failed(error):
+            callback()
+            self._on_error(error)
+
+        # 與輪詢共用 key：進行中的輪詢結果會被丟棄
+        get_query_executor(self._root).submit(self.QUERY_KEY, queries.get_latest_change_seq,
+                                              on_done=_skipped, on_error=_failed)
+
+    # ----- 內部 -----
+
+    def _on_started(self, seq):
+        self._seq = seq
+        self._schedule()
+
+    def _schedule(self):
+        if self._running:
+            self._after_id = self._root.after(self._interval_ms, self._poll)
+
+    def _poll(self):
+        self._after_id = None
+        get_query_executor(self._root).submit(
+            self.QUERY_KEY, fetch_changes, self._seq,
+            on_done=self._dispatch, on_error=self._on_error)
+
+    def _on_error(self, error):
+        print(f"[異動輪詢失敗] {error}")
+        self._schedule()
+
+    def _dispatch(self, changes):
+        """（主執行緒）更新輪詢位置、使實體快取失效並通知訂閱者"""
+        if changes.last_seq > (self._seq or 0):
+            self._seq = changes.last_seq
+        if changes:
+            # 實體快取以資料表名稱為實體，其他工作站的修改不必等 TTL 到期
+            entity_cache.invalidate(*changes.tables)
+            for tables, callback in list(self._subscribers):
+                if changes.touches(tables):
+                    try:
+                        callback(changes)
+                    except Exception as e:
+                        print(f"[異動通知失敗] {getattr(callback, '__name__', callback)} → {e}")
+        self._schedule()
+
+
+# 全域輪詢器實例
+_global_poller = None
+
+
+def get_change_poller(widget=None):
+    """取得全域異動輪詢器；第一次呼叫需傳入任一 Tk 元件"""
+    global _global_poller
+    if _global_poller is None:
+        if widget is None:
+            raise RuntimeError("第一次取得異動輪詢器時需傳入 Tk 元件")
+        _global_poller = ChangePoller(widget._root())
+    return _global_poller
@@ -0,0 +1,79 @@
+"""發行時效分析 — 收到/完成耗時分佈、逾期偵測與儀表板彙總
+
+精確分佈：queries.get_circulation_latency_stats()，以視窗函數一次計算 p50/p95
+儀表板：先以 refresh_sla_rollup 增量累加新歷程，再由分桶彙總估算 p50/p95
+（回報所在分桶的上限，不需重掃 circulation_logs）
+"""
+from datetime import date, timedelta
+from db import queries
+from config import CIRCULATION_SLA_HOURS
+
+# 耗時分桶上限（小時）
+BUCKET_BOUNDS = (0.5, 1, 2, 4, 8, 12, 24, 48, 72, 120, 168, 336, 720)
+
+
+def _bucket_upper(bucket, max_hours):
+    """分桶上限；最後一桶（無上限）以實際最大值表示"""
+    return BUCKET_BOUNDS[bucket] if bucket < len(BUCKET_BOUNDS) else max_hours
+
+
+def _percentile(buckets, max_hours, pct):
+    """由 [(bucket, count)] 估算百分位數（nearest-rank，取分桶上限）"""
+    total = sum(c for _, c in buckets)
+    if total == 0:
+        return None
+    rank = -(-total * pct // 100)
+    seen = 0
+    for bucket, count in buckets:
+        seen += count
+        if seen >= rank:
+            return min(_bucket_upper(bucket, max_hours), max_hours)
+    return max_hours
+
+
+def refresh():
+    """累加新的收到/確認紀錄到彙總表"""
+    return queries.refresh_sla_rollup(BUCKET_BOUNDS, CIRCULATION_SLA_HOURS)
+
+
+def sla_summary(days=30, refresh_first=True):
+    """近 days 天各流程 × 部門（A流程為步驟）的時效摘要
+
+    Returns:
+        [{'flow_type', 'group_key', 'count', 'avg_hours', 'p50_hours', 'p95_hours',
+          'max_hours', 'over_sla', 'sla_hours'}]
+    """
+    if refresh_first:
+        refresh()
+    since = (date.today() - timedelta(days=days)).isoformat() if days else None
+
+    groups = {}
+    for r in queries.get_sla_rollup(since):
+        g = groups.setdefault((r['flow_type'], r['group_key']),
+                              {'buckets': [], 'count': 0, 'total': 0.0,
+                               'max': 0.0, 'over': 0})
+        g['buckets'].append((r['bucket'], r['count']))
+        g['count'] += r['count']
+        g['total'] += r['total_hours']
+        g['max'] = max(g['max'], r['max_hours'])
+        g['over'] += r['over_sla']
+
+    summary = []
+    for (flow_type, group_key), g in groups.items():
+        summary.append({
+            'flow_type': flow_type,
+            'group_key': group_key,
+            'count': g['count'],
+            'avg_hours': g['total'] / g['count'] if g['count'] else 0,
+            'p50_hours': _percentile(g['buckets'], g['max'], 50),
+            'p95_hours': _percentile(g['buckets'], g['max'], 95),
+            'max_hours': g['max'],
+            'over_sla': g['over'],
+            'sla_hours': CIRCULATION_SLA_HOURS.get(flow_type),
+        })
+    return summary
+
+
+def overdue_tasks():
+    """目前超過時效仍未處理的任務"""
+    return queries.get_overdue_circulation_tasks(CIRCULATION_SLA_HOURS)
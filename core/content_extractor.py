@@ -0,0 +1,330 @@
+"""圖檔文字擷取 — 將 PDF / DXF / IGES 內的文字寫入全文索引，供搜尋標題欄、料號與註記
+
+- PDF：PyMuPDF 逐頁擷取文字
+- DXF：ezdxf 讀取各配置與圖塊中的 TEXT / MTEXT，以及圖塊參照的屬性（ATTRIB）
+- IGES：Start 段（S）的說明文字與 Global 段（G）的字串參數（檔名、作者、單位等）
+
+擷取以檔案雜湊為單位（queries.file_texts），同一內容只擷取一次；
+新增版次或檔案內容改變（雜湊不同）時才會出現在待處理清單，已擷取的內容不會重做。
+檔案庫啟用前建立的舊版次（無 file_hash）會先由 file_path 計算雜湊並存入檔案庫。
+缺少擷取套件等暫時性失敗記錄為 extractor 為 NULL 的結果，
+CONTENT_EXTRACT_RETRY_HOURS 小時後才重試，不會每次啟動都重新建立程序池。
+擷取在背景程序池執行（CONTENT_EXTRACT_WORKERS），結果由主程序分批寫入資料庫。
+
+手動執行：
+    python -m core.content_extractor [--workers 4] [--limit 100] [--rebuild]
+"""
+import os
+import re
+import threading
+import importlib.util
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from config import (CONTENT_EXTRACT_EXTENSIONS, CONTENT_EXTRACT_WORKERS, CONTENT_TEXT_MAX_CHARS,
+                    CONTENT_EXTRACT_RETRY_HOURS)
+
+# 每累積幾筆結果寫入一次資料庫
+_SAVE_BATCH = 20
+
+
+# ===== 擷取（在工作程序中執行，只依賴檔案與第三方套件） =====
+
+def _clean(parts):
+    """合併文字片段：去除空白行與重複行，截斷至 CONTENT_TEXT_MAX_CHARS"""
+    seen = set()
+    lines = []
+    size = 0
+    for part in parts:
+        for line in (part or '').splitlines():
+            line = ' '.join(line.split())
+            if not line or line in seen:
+                continue
+            seen.add(line)
+            lines.append(line)
+            size += len(line) + 1
+            if size >= CONTENT_TEXT_MAX_CHARS:
+                return '\n'.join(lines)[:CONTENT_TEXT_MAX_CHARS]
+    return '\n'.join(lines)
+
+
+def _pdf_text(path):
+    import fitz  # PyMuPDF
+    doc = fitz.open(path)
+    try:
+        parts = []
+        size = 0
+        for page in doc:
+            text = page.get_text()
+            parts.append(text)
+            size += len(text)
+            if size >= CONTENT_TEXT_MAX_CHARS:
+                break
+        return _clean(parts)
+    finally:
+        doc.close()
+
+
+def _dxf_entity_texts(entities):
+    for e in entities:
+        kind = e.dxftype()
+        if kind in ('TEXT', 'ATTRIB', 'ATTDEF'):
+            yield e.dxf.get('text', '')
+        elif kind == 'MTEXT':
+            yield e.plain_text()
+        elif kind == 'INSERT':
+            for attrib in e.attribs:
+                yield attrib.dxf.get('text', '')
+
+
+def _dxf_text(path):
+    from ezdxf import recover
+    doc, _ = recover.readfile(path)
+    parts = []
+    for layout in doc.layouts:
+        parts.extend(_dxf_entity_texts(layout))
+    # 標題欄多半畫在圖塊定義內（匿名圖塊為標註等自動產生的內容，略過）
+    for block in doc.blocks:
+        if not block.name.startswith('*'):
+            parts.extend(_dxf_entity_texts(block))
+    return _clean(parts)
+
+
+_HOLLERITH_RE = re.compile(r'(\d+)H')
+
+
+def _hollerith_strings(text):
+    """取出 IGES 參數中的 Hollerith 字串（如 7HPART.IGS → PART.IGS）"""
+    strings = []
+    pos = 0
+    while True:
+        m = _HOLLERITH_RE.search(text, pos)
+        if not m:
+            return strings
+        start = m.end()
+        length = int(m.group(1))
+        value = text[start:start + length]
+        # 略過分隔字元等不含文字的參數
+        if any(ch.isalnum() for ch in value):
+            strings.append(value)
+        pos = start + length
+
+
+def _iges_text(path):
+    start, global_ = [], []
+    with open(path, 'r', errors='ignore') as f:
+        for line in f:
+            if len(line) < 73:
+                continue
+            section = line[72]
+            if section == 'S':
+                start.append(line[:72].rstrip())
+            elif section == 'G':
+                global_.append(line[:72])
+            elif section in 'DPT':
+                break
+    return _clean(start + _hollerith_strings(''.join(global_)))
+
+
+_EXTRACTORS = {
+    '.pdf': ('pdf', _pdf_text),
+    '.dxf': ('dxf', _dxf_text),
+    '.igs': ('iges', _iges_text),
+    '.iges': ('iges', _iges_text),
+}
+
+
+# 擷取器需要的第三方套件（IGES 為純文字解析，不需套件）
+_EXTRACTOR_PACKAGES = {
+    'pdf': 'fitz',
+    'dxf': 'ezdxf',
+}
+
+
+def _missing_package(ext):
+    """此格式的擷取套件未安裝時回傳套件名稱"""
+    name = _EXTRACTORS.get(ext.lower(), (None,))[0]
+    package = _EXTRACTOR_PACKAGES.get(name)
+    if package and importlib.util.find_spec(package) is None:
+        return package
+    return None
+
+
+def extract_text(path, ext):
+    """擷取檔案文字：回傳 (擷取器名稱, 文字)；不支援的格式回傳 (None, '')"""
+    name, fn = _EXTRACTORS.get(ext.lower(), (None, None))
+    if fn is None:
+        return None, ''
+    return name, fn(path)
+
+
+def _extract_job(job):
+    """工作程序入口：回傳 (file_hash, 擷取器, 文字, 錯誤訊息)
+
+    缺少擷取套件時擷取器為 None（暫時性失敗，CONTENT_EXTRACT_RETRY_HOURS 後重試）。
+    """
+    file_hash, path, ext = job
+    try:
+        extractor, text = extract_text(path, ext)
+        return file_hash, extractor, text, None
+    except ImportError as e:
+        return file_hash, None, '', f"缺少套件：{e.name}"
+    except Exception as e:
+        return file_hash, _EXTRACTORS.get(ext.lower(), (None,))[0], '', f"{type(e).__name__}: {e}"
+
+
+# ===== 排程（主程序） =====
+
+def _source_path(row):
+    """版次內容的檔案路徑：檔案庫有完整內容時直接使用，否則沿差異鏈還原為暫存檔"""
+    from core.blob_store import blob_path, has_blob
+    if has_blob(row['file_hash']):
+        return blob_path(row['file_hash'])
+    from core.revision_store import materialize_revision
+    return materialize_revision(row['revision_id'])
+
+
+def backfill_revision_hashes(limit=None):
+    """為檔案庫啟用前的舊版次補上雜湊：由 file_path 存入檔案庫並寫回 revisions.file_hash
+
+    檔案已不存在的版次略過（下次再檢查）。回傳補上的版次數。
+    """
+    from db import queries
+    from core.blob_store import store_blob
+    filled = 0
+    for row in queries.get_unhashed_revisions(CONTENT_EXTRACT_EXTENSIONS, limit):
+        try:
+            file_hash, size = store_blob(row['file_path'])
+            if file_hash and queries.set_revision_file_hash(row['id'], file_hash, size):
+                filled += 1
+        except Exception as e:
+            print(f"[版次雜湊補建失敗] {row['file_path']} → {e}")
+    return filled
+
+
+def index_pending(workers=CONTENT_EXTRACT_WORKERS, limit=None, progress=None):
+    """擷取所有待處理檔案的文字並寫入索引
+
+    Args:
+        workers: 程序數（1 表示在目前程序內依序執行）
+        limit: 本次最多處理的檔案數
+        progress: 進度回呼 progress(已完成, 總數)，在呼叫端執行緒中呼叫
+    Returns:
+        {'processed': 筆數, 'failed': 失敗筆數}
+    """
+    from db import queries
+    backfill_revision_hashes(limit)
+    pending = queries.get_pending_content_files(CONTENT_EXTRACT_EXTENSIONS, limit,
+                                                CONTENT_EXTRACT_RETRY_HOURS)
+    if not pending:
+        return {'processed': 0, 'failed': 0}
+
+    jobs, results = [], []
+    for row in pending:
+        ext = os.path.splitext(row['file_path'] or '')[1]
+        # 缺少套件時不必送進程序池，直接記錄為暫時性失敗
+        missing = _missing_package(ext)
+        if missing:
+            results.append((row['file_hash'], None, '', f"缺少套件：{missing}"))
+            continue
+        try:
+            path = _source_path(row)
+        except Exception as e:
+            path, error = None, f"{type(e).__name__}: {e}"
+        else:
+            error = None if path else '檔案庫中找不到內容'
+        if path:
+            jobs.append((row['file_hash'], path, ext))
+        else:
+            results.append((row['file_hash'], None, '', error))
+
+    done = len(results)
+    failed = len(results)
+    total = len(pending)
+
+    def _collect(result):
+        nonlocal done, failed
+        done += 1
+        failed += 1 if result[3] else 0
+        results.append(result)
+        if len(results) >= _SAVE_BATCH:
+            queries.save_file_texts(results)
+            results.clear()
+        if progress:
+            progress(done, total)
+
+    if workers <= 1 or len(jobs) <= 1:
+        for job in jobs:
+            _collect(_extract_job(job))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(_extract_job, job) for job in jobs]):
+                _collect(future.result())
+    if results:
+        queries.save_file_texts(results)
+    return {'processed': done, 'failed': failed}
+
+
+class BackgroundIndexer:
+    """在背景執行緒中擷取待處理檔案；執行中再次要求時，完成後會再跑一輪"""
+
+    def __init__(self, workers=CONTENT_EXTRACT_WORKERS):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._thread = None
+        self._again = False
+        self.last_result = None
+
+    def request(self):
+        with self._lock:
+            if self._thread is not None:
+                self._again = True
+                return
+            self._thread = threading.Thread(target=self._run, name='content-indexer',
+                                            daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.last_result = index_pending(self.workers)
+            except Exception as e:
+                print(f"[圖檔文字擷取失敗] → {e}")
+            with self._lock:
+                if not self._again:
+                    self._thread = None
+                    return
+                self._again = False
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+
+# 全域背景擷取器
+background_indexer = BackgroundIndexer()
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from db import queries
+    from db.database import init_db
+
+    parser = argparse.ArgumentParser(description='擷取圖檔文字並寫入全文索引')
+    parser.add_argument('--workers', type=int, default=CONTENT_EXTRACT_WORKERS)
+    parser.add_argument('--limit', type=int, default=None, help='本次最多處理的檔案數')
+    parser.add_argument('--rebuild', action='store_true', help='清除既有結果後全部重新擷取')
+    opts = parser.parse_args()
+
+    init_db()
+    if opts.rebuild:
+        queries.clear_file_texts()
+    pruned = queries.prune_file_texts()
+    started = time.perf_counter()
+    result = index_pending(opts.workers, opts.limit,
+                           progress=lambda n, total: print(f"\r{n}/{total}", end='', flush=True))
+    stats = queries.get_content_index_stats(CONTENT_EXTRACT_EXTENSIONS,
+                                            CONTENT_EXTRACT_RETRY_HOURS)
+    print(f"\n處理 {result['processed']} 個檔案（失敗 {result['failed']}），"
+          f"耗時 {time.perf_counter() - started:.1f} 秒；移除無參照 {pruned} 筆")
+    print(f"索引：{stats['indexed']} 個檔案、{stats['chars']:,} 字元；"
+          f"失敗 {stats['failed']}、待處理 {stats['pending']}")
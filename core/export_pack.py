@@ -0,0 +1,121 @@
+"""出口文件組 — 依客戶訂單一次產生整組出貨文件
+
+訂單、明細與發票以 business_queries.get_export_pack_data 一次取得；
+已開立發票時商業發票沿用發票號碼、明細、金額與幣別，裝箱單一律依訂單明細；
+商業發票與裝箱單以 pdf_generator 的共用框架（快取字型、樣式與表頭 form）產生 PDF，
+存到 EXPORT_DOCS_DIR/<訂單號>/；提單、產地證明等需外部出具的文件建立「準備中」紀錄，
+之後再以「附加檔案」補上。所有 export_documents 紀錄在同一個交易內寫入，
+重複產生時更新原紀錄而不重複新增。
+
+手動執行：
+    python -m core.export_pack <訂單 id> [--dest 美國] [--method 海運] [--bl ...]
+"""
+import os
+import re
+from datetime import date
+from config import EXPORT_DOCS_DIR, EXPORT_PACK_DOC_TYPES
+from core.pdf_generator import generate_commercial_invoice_pdf, generate_packing_list_pdf
+
+# 會自動產生 PDF 的文件類型 → (文件號碼前綴, 產生函式)
+_GENERATED = {
+    '商業發票 (Commercial Invoice)': ('CI', generate_commercial_invoice_pdf),
+    '裝箱單 (Packing List)': ('PL', generate_packing_list_pdf),
+}
+
+# 寫入每份文件的運送資訊欄位
+SHIPPING_FIELDS = ('destination_country', 'shipping_method', 'shipping_date',
+                   'vessel_name', 'bl_number', 'container_number')
+
+_UNSAFE_CHARS = re.compile(r'[\\/:*?"<>|]')
+
+
+def _doc_number(doc_type, order, invoice, shipping):
+    if doc_type == '商業發票 (Commercial Invoice)' and invoice is not None:
+        return invoice['invoice_number']
+    if doc_type in _GENERATED:
+        return f"{_GENERATED[doc_type][0]}-{order['order_number']}"
+    if doc_type == '提單 (Bill of Lading)':
+        return shipping.get('bl_number')
+    return None
+
+
+def build_export_pack(order_id, shipping=None, doc_types=None, output_dir=None):
+    """產生一張訂單的出口文件組
+
+    Args:
+        order_id: 客戶訂單 id
+        shipping: 運送資訊 {SHIPPING_FIELDS 之一: 值}，寫入 PDF 與每筆文件紀錄；
+                  未提供的欄位沿用該訂單既有文件紀錄
+        doc_types: 要建立的文件類型（預設 EXPORT_PACK_DOC_TYPES）
+        output_dir: PDF 輸出資料夾（預設 EXPORT_DOCS_DIR/<訂單號>）
+    Returns:
+        [{'id', 'doc_type', 'doc_number', 'file_path'}]，依 doc_types 順序
+    """
+    from db import business_queries as bq
+    order, items, invoice, invoice_items = bq.get_export_pack_data(order_id)
+    if order is None:
+        raise ValueError(f"找不到訂單：{order_id}")
+    if not items:
+        raise ValueError(f"訂單 {order['order_number']} 沒有明細，無法產生出口文件")
+
+    order = dict(order)
+    items = [dict(i) for i in items]
+    # 商業發票的號碼、品項與金額須與已開立的發票一致
+    sources = {'裝箱單 (Packing List)': (order, items)}
+    if invoice is not None and invoice_items:
+        sources['商業發票 (Commercial Invoice)'] = (
+            dict(order, currency=invoice['currency'] or order.get('currency')),
+            [dict(i) for i in invoice_items])
+    else:
+        sources['商業發票 (Commercial Invoice)'] = (order, items)
+    shipping = {k: v for k, v in (shipping or {}).items() if k in SHIPPING_FIELDS and v}
+    # 未填的運送資訊沿用該訂單既有的文件紀錄（最新的優先），重新產生時不會遺失
+    for existing in bq.get_all_export_documents(order_id=order_id):
+        for field in SHIPPING_FIELDS:
+            if not shipping.get(field) and existing[field]:
+                shipping[field] = existing[field]
+    doc_types = list(doc_types or EXPORT_PACK_DOC_TYPES)
+    today = date.today().isoformat()
+    if output_dir is None:
+        output_dir = os.path.join(EXPORT_DOCS_DIR, _UNSAFE_CHARS.sub('_', order['order_number']))
+
+    docs = []
+    for doc_type in doc_types:
+        doc = dict(shipping, doc_type=doc_type,
+                   invoice_id=invoice['id'] if invoice is not None else None,
+                   doc_number=_doc_number(doc_type, order, invoice, shipping))
+        if doc_type in _GENERATED:
+            os.makedirs(output_dir, exist_ok=True)
+            path = os.path.join(output_dir, f"{_UNSAFE_CHARS.sub('_', doc['doc_number'])}.pdf")
+            doc_order, doc_items = sources[doc_type]
+            _GENERATED[doc_type][1](path, doc['doc_number'], doc_order, doc_items,
+                                    shipping=shipping, issue_date=today)
+            doc.update(file_path=path, issue_date=today, status='已出具')
+        docs.append(doc)
+
+    ids = bq.save_export_pack(order_id, docs)
+    return [{'id': ids.get(d['doc_type']), 'doc_type': d['doc_type'],
+             'doc_number': d['doc_number'], 'file_path': d.get('file_path')} for d in docs]
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description='產生訂單的出口文件組')
+    parser.add_argument('order_id', type=int)
+    parser.add_argument('--dest', dest='destination_country')
+    parser.add_argument('--method', dest='shipping_method')
+    parser.add_argument('--ship-date', dest='shipping_date')
+    parser.add_argument('--vessel', dest='vessel_name')
+    parser.add_argument('--bl', dest='bl_number')
+    parser.add_argument('--container', dest='container_number')
+    parser.add_argument('--output')
+    opts = parser.parse_args()
+
+    started = time.perf_counter()
+    docs = build_export_pack(opts.order_id, {f: getattr(opts, f) for f in SHIPPING_FIELDS},
+                             output_dir=opts.output)
+    for d in docs:
+        print(f"{d['doc_type']}：{d['doc_number'] or '-'}  {d['file_path'] or '（待補）'}")
+    print(f"耗時 {time.perf_counter() - started:.2f} 秒")
@@ -0,0 +1,106 @@
+"""分面搜尋 — 搜尋結果依狀態、類型、客戶、年份分面計數，點選分面在記憶體中精煉
+
+第一次搜尋以 queries.search_drawings_faceted 取得總數與分面計數；
+完整結果於背景載入後快取，之後勾選分面值只在記憶體中篩選並重新計數，不再查詢資料庫。
+
+同一分面內勾選多個值為「或」，不同分面之間為「且」；
+每個分面的計數套用其他分面的勾選（勾選某狀態後，其他狀態的數量仍可見）。
+"""
+from collections import Counter
+from db import queries
+
+# 分面名稱 → 顯示標題
+FACET_LABELS = {
+    'status': '狀態',
+    'drawing_type': '圖面類型',
+    'client': '客戶',
+    'year': '建立年份',
+}
+
+
+def facet_value(row, facet):
+    """圖面列在指定分面的值"""
+    if facet == 'client':
+        return row['client_id']
+    if facet == 'year':
+        return (row['created_at'] or '')[:4]
+    return row[facet]
+
+
+class FacetedSearch:
+    """一次搜尋的分面狀態（搜尋條件、資料庫計數、快取的完整結果與勾選）"""
+
+    def __init__(self, filters, total, facets):
+        self.filters = filters
+        self.total = total
+        self.selected = {facet: set() for facet in FACET_LABELS}
+        self._db_facets = facets
+        self._labels = {('client', cid): name for cid, name, _ in facets['client']}
+        self._rows = None
+
+    @classmethod
+    def run(cls, filters):
+        """（工作執行緒）執行分面計數查詢"""
+        result = queries.search_drawings_faceted(**filters)
+        return cls(filters, result['total'], result['facets'])
+
+    def load_rows(self):
+        """（工作執行緒）載入完整結果供記憶體內精煉；回傳 self"""
+        if self._rows is None:
+            self._rows = queries.search_drawings(**self.filters)
+        return self
+
+    @property
+    def rows_loaded(self):
+        return self._rows is not None
+
+    def label(self, facet, value):
+        if facet == 'client':
+            return self._labels.get(('client', value), str(value))
+        return value or '（未設定）'
+
+    def toggle(self, facet, value):
+        values = self.selected[facet]
+        if value in values:
+            values.discard(value)
+        else:
+            values.add(value)
+
+    def clear_selection(self):
+        for values in self.selected.values():
+            values.clear()
+
+    def has_selection(self):
+        return any(self.selected.values())
+
+    def _passes(self, row, skip=None):
+        for facet, values in self.selected.items():
+            if values and facet != skip and facet_value(row, facet) not in values:
+                return False
+        return True
+
+    def refine(self):
+        """套用目前勾選：回傳 (結果列, 各分面計數 {facet: [(值, 標籤, 數量)]})
+
+        完整結果尚未載入時結果列為空，回傳資料庫計數（此時不應有勾選）。
+        """
+        if self._rows is None:
+            counts = {facet: [(v, self.label(facet, v), n) for v, n in self._facet_pairs(facet)]
+                      for facet in FACET_LABELS}
+            return [], counts
+
+        rows = [r for r in self._rows if self._passes(r)]
+        counts = {}
+        for facet in FACET_LABELS:
+            counter = Counter(facet_value(r, facet) for r in self._rows
+                              if self._passes(r, skip=facet))
+            # 保留資料庫分面的順序；勾選中但已無結果的值仍列出（數量 0）
+            ordered = [v for v, _ in self._facet_pairs(facet)]
+            counts[facet] = [(v, self.label(facet, v), counter.get(v, 0)) for v in ordered
+                             if counter.get(v, 0) or v in self.selected[facet]]
+        return rows, counts
+
+    def _facet_pairs(self, facet):
+        if facet == 'client':
+            return [(cid, n) for cid, _, n in self._db_facets['client']]
+        return self._db_facets[facet]
@@ -12,10 +12,16 @@ def open_file(file_path):
 
 
 def copy_file_to_storage(src_path, drawing_id, rev_code=''):
-    """複製檔案到管理目錄（選用功能）"""
+    """複製檔案到管理目錄（選用功能）
+
+    檔案先存入內容定址檔案庫，管理目錄中放置獨立複本（可直接開啟編輯，不影響檔案庫）；
+    目的檔已是相同內容時不重複寫入。
+    """
     if not src_path or not os.path.exists(src_path):
         return None
 
+    from core.blob_store import store_blob, copy_blob
+
     dest_dir = os.path.join(DRAWINGS_DIR, str(drawing_id))
     os.makedirs(dest_dir, exist_ok=True)
 
@@ -26,8 +32,8 @@ def copy_file_to_storage(src_path, drawing_id, rev_code=''):
         dest_name = os.path.basename(src_path)
 
     dest_path = os.path.join(dest_dir, dest_name)
-    shutil.copy2(src_path, dest_path)
-    return dest_path
+    file_hash, _ = store_blob(src_path)
+    return copy_blob(file_hash, dest_path)
 
 
 def file_exists(file_path):
@@ -49,11 +55,14 @@ def get_backup_dir(client_name='', project_name=''):
     return os.path.join(BACKUP_DIR, folder_client, folder_project)
 
 
-def backup_file(src_path, client_name='', project_name='', drawing_number='', rev_code=''):
+def backup_file(src_path, client_name='', project_name='', drawing_number='', rev_code='',
+                file_hash=None):
     """備份檔案到公司圖面目錄 (D:\\OneDrive\\公司圖面)
 
     目錄結構：客戶名/專案名/圖號_版次.副檔名
     不會刪除原始檔案。若備份失敗僅印出警告，不中斷主流程。
+    若提供 file_hash 且檔案庫已有此內容，備份檔為檔案庫的唯讀硬連結（同一磁碟區時不另佔空間，
+    跨磁碟區才複製）；備份檔已是相同內容時不重複寫入（OneDrive 不會重新同步）。
     """
     if not src_path or not os.path.exists(src_path):
         return None
@@ -71,6 +80,10 @@ def backup_file(src_path, client_name='', project_name='', drawing_number='', re
             dest_name = os.path.basename(src_path)
 
         dest_path = os.path.join(dest_dir, dest_name)
+        if file_hash:
+            from core.blob_store import has_blob, link_blob
+            if has_blob(file_hash):
+                return link_blob(file_hash, dest_path)
         shutil.copy2(src_path, dest_path)
         return dest_path
     except Exception as e:
@@ -100,7 +113,9 @@ def delete_backup_files(client_name='', project_name='', drawing_number=''):
             if name_no_ext == prefix or name_no_ext.startswith(prefix + '_Rev'):
                 fpath = os.path.join(dest_dir, fname)
                 if os.path.isfile(fpath):
-                    os.remove(fpath)
+                    # 備份可能是檔案庫的唯讀硬連結
+                    from core.blob_store import remove_file
+                    remove_file(fpath)
                     deleted += 1
 
         # 清理空的專案資料夾
@@ -0,0 +1,110 @@
+"""即時搜尋 — 輸入中的圖面關鍵字搜尋，前綴結果快取與記憶體內精煉
+
+queries.search_drawings(keyword=...) 的比對條件為：
+    圖號或名稱 LIKE '%關鍵字%'，或 FTS5 片語前綴 '"關鍵字"*'
+關鍵字變長時（"AB1" → "AB12"）結果必為原結果的子集，
+因此只要快取中有較短的前綴結果，就直接在記憶體中以相同規則篩選，不再查詢資料庫。
+
+圖面、專案、客戶有異動時呼叫 invalidate() 清除快取。
+"""
+import re
+import threading
+from collections import OrderedDict
+from db import queries
+from config import SEARCH_CACHE_SIZE
+
+# FTS5 unicode61 分詞：字母與數字為詞元字元，其餘（含底線）為分隔
+_TOKEN_RE = re.compile(r'[^\W_]+')
+
+
+def _tokens(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _phrase_prefix_match(text_tokens, needle_tokens):
+    """FTS5 '"a b"*' 片語前綴：前面的詞元完全相同、最後一個詞元為前綴"""
+    n = len(needle_tokens)
+    last = needle_tokens[-1]
+    for i in range(len(text_tokens) - n + 1):
+        if text_tokens[i + n - 1].startswith(last) and text_tokens[i:i + n - 1] == needle_tokens[:-1]:
+            return True
+    return False
+
+
+def _like_regex(keyword):
+    """LIKE '%關鍵字%' 的等效正規式（% 與 _ 為萬用字元，不分大小寫）"""
+    pattern = ''.join('.*' if ch == '%' else '.' if ch == '_' else re.escape(ch)
+                      for ch in keyword)
+    return re.compile(pattern, re.IGNORECASE | re.DOTALL)
+
+
+def matcher(keyword):
+    """建立記憶體內比對函式：row → 是否符合 search_drawings 的關鍵字條件"""
+    like = _like_regex(keyword)
+    needle_tokens = _tokens(keyword)
+
+    def match(row):
+        for text in (row['drawing_number'] or '', row['title'] or ''):
+            if like.search(text):
+                return True
+            if needle_tokens and _phrase_prefix_match(_tokens(text), needle_tokens):
+                return True
+        return False
+    return match
+
+
+class LiveSearch:
+    """關鍵字搜尋結果的 LRU 快取（可由多個背景執行緒同時使用）"""
+
+    def __init__(self, max_entries=SEARCH_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()     # 小寫關鍵字 -> [Row]
+        self._generation = 0
+        self.stats = {'hits': 0, 'refined': 0, 'queries': 0}
+
+    def search(self, keyword):
+        """搜尋關鍵字；回傳 (結果, 來源)，來源為 'cache' / 'refined' / 'query'"""
+        key = keyword.strip().lower()
+        if not key:
+            return [], 'cache'
+
+        with self._lock:
+            generation = self._generation
+            hit = self._cache.get(key)
+            if hit is not None:
+                self._cache.move_to_end(key)
+                self.stats['hits'] += 1
+                return hit, 'cache'
+            # 最長的已快取前綴
+            base = None
+            for cached_key in self._cache:
+                if key.startswith(cached_key) and (base is None or len(cached_key) > len(base)):
+                    base = cached_key
+            base_rows = self._cache[base] if base is not None else None
+
+        if base_rows is not None:
+            rows = list(filter(matcher(keyword.strip()), base_rows))
+            source = 'refined'
+        else:
+            rows = queries.search_drawings(keyword=keyword.strip())
+            source = 'query'
+
+        with self._lock:
+            self.stats[source if source == 'refined' else 'queries'] += 1
+            # 查詢期間若已清除快取（資料有異動），結果不寫回
+            if generation == self._generation:
+                self._cache[key] = rows
+                self._cache.move_to_end(key)
+                while len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+        return rows, source
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._cache.clear()
+
+
+# 全域即時搜尋實例
+live_search = LiveSearch()
@@ -1,12 +1,22 @@
-"""PDF 文件生成引擎 — 使用 reportlab 生成報價單 / 發票 / 請購單等業務文件"""
+"""PDF 文件生成引擎 — 使用 reportlab 生成報價單 / 發票 / 請購單等業務文件
+
+效能設計（大量匯出時每份文件只花數十毫秒）：
+- 中文字型每個程序只註冊一次（解析數 MB 的 TTC 檔是匯出最慢的一步）；
+  reportlab 的 TTFont 只嵌入文件實際用到的字形（子集），檔案不會因 CJK 字型變大
+- ParagraphStyle 與 TableStyle 依字型快取，不再每份文件重建
+- 表頭（公司名稱、文件名稱、分隔線）與頁尾說明在每份文件中只繪製一次為 form XObject，
+  各頁以 doForm 引用；只有頁碼逐頁繪製
+"""
 import os
+import threading
+from functools import lru_cache
 from datetime import datetime
 
 try:
     from reportlab.lib import colors
     from reportlab.lib.pagesizes import A4
     from reportlab.lib.units import mm, cm
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.styles import ParagraphStyle
     from reportlab.platypus import (
         SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, HRFlowable
     )
@@ -18,62 +28,184 @@ except ImportError:
 
 from config import COMPANY_NAME
 
+_FONT_PATHS = [
+    '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
+    '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
+    'C:/Windows/Fonts/msjh.ttc',
+    'C:/Windows/Fonts/mingliu.ttc',
+]
+_FONT_NAME = 'ChineseFont'
+_font_lock = threading.Lock()
+
+# 表頭 / 頁尾 form XObject 名稱
+_PAGE_FORM = 'page_decor'
+
+
+# ===== 字型與樣式（每個程序只建立一次） =====
 
+@lru_cache(maxsize=1)
 def _register_font():
-    """嘗試註冊中文字型"""
-    font_paths = [
-        '/usr/share/fonts/opentype/noto/NotoSansCJK-Regular.ttc',
-        '/usr/share/fonts/noto-cjk/NotoSansCJK-Regular.ttc',
-        'C:/Windows/Fonts/msjh.ttc',
-        'C:/Windows/Fonts/mingliu.ttc',
-    ]
-    for fp in font_paths:
-        if os.path.exists(fp):
-            try:
-                pdfmetrics.registerFont(TTFont('ChineseFont', fp))
-                return 'ChineseFont'
-            except Exception:
-                continue
-    return 'Helvetica'
+    """註冊中文字型（第一次呼叫後快取結果）；找不到時使用 Helvetica"""
+    with _font_lock:
+        if _FONT_NAME in pdfmetrics.getRegisteredFontNames():
+            return _FONT_NAME
+        for fp in _FONT_PATHS:
+            if os.path.exists(fp):
+                try:
+                    pdfmetrics.registerFont(TTFont(_FONT_NAME, fp))
+                    return _FONT_NAME
+                except Exception as e:
+                    print(f"[字型註冊失敗] {fp} → {e}")
+                    continue
+        return 'Helvetica'
 
 
+@lru_cache(maxsize=4)
 def _get_styles(font_name):
-    styles = getSampleStyleSheet()
-    styles.add(ParagraphStyle(
-        name='ChTitle', fontName=font_name, fontSize=16,
-        leading=20, alignment=1, spaceAfter=6
-    ))
-    styles.add(ParagraphStyle(
-        name='ChSubTitle', fontName=font_name, fontSize=10,
-        leading=14, alignment=1, spaceAfter=4
-    ))
-    styles.add(ParagraphStyle(
-        name='ChNormal', fontName=font_name, fontSize=9,
-        leading=12
-    ))
-    styles.add(ParagraphStyle(
-        name='ChSmall', fontName=font_name, fontSize=8,
-        leading=10
-    ))
-    return styles
+    return {
+        'ChTitle': ParagraphStyle(name='ChTitle', fontName=font_name, fontSize=16,
+                                  leading=20, alignment=1, spaceAfter=6),
+        'ChSubTitle': ParagraphStyle(name='ChSubTitle', fontName=font_name, fontSize=10,
+                                     leading=14, alignment=1, spaceAfter=4),
+        'ChNormal': ParagraphStyle(name='ChNormal', fontName=font_name, fontSize=9,
+                                   leading=12),
+        'ChSmall': ParagraphStyle(name='ChSmall', fontName=font_name, fontSize=8,
+                                  leading=10),
+    }
 
 
-def generate_quotation_pdf(filepath, quotation, items, client_name=''):
-    """生成報價單 PDF"""
+@lru_cache(maxsize=4)
+def _info_table_style(font_name):
+    return TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+        ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ])
+
+
+@lru_cache(maxsize=16)
+def _item_table_style(font_name, qty_col, price_col, total_rows=3):
+    """品項表格樣式：qty_col 為數量欄、price_col 為單價欄（其後為小計欄），最後 total_rows 列為合計"""
+    amount_col = price_col + 1
+    return TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B9BD5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('ALIGN', (qty_col, 1), (qty_col, -1), 'RIGHT'),
+        ('ALIGN', (price_col, 1), (amount_col, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1 - total_rows), 0.5, colors.grey),
+        ('LINEABOVE', (price_col, -total_rows), (amount_col, -total_rows), 1, colors.black),
+        ('LINEABOVE', (price_col, -1), (amount_col, -1), 1.5, colors.black),
+        ('FONTSIZE', (price_col, -total_rows), (amount_col, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+
+@lru_cache(maxsize=4)
+def _packing_table_style(font_name, qty_col=3):
+    """裝箱單表格樣式：無金額欄，最後一列為數量合計"""
+    return TableStyle([
+        ('FONTNAME', (0, 0), (-1, -1), font_name),
+        ('FONTSIZE', (0, 0), (-1, -1), 8),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B9BD5')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('ALIGN', (qty_col, 1), (qty_col, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -2), 0.5, colors.grey),
+        ('LINEABOVE', (qty_col - 1, -1), (qty_col + 1, -1), 1.5, colors.black),
+        ('ALIGN', (qty_col - 1, -1), (qty_col - 1, -1), 'RIGHT'),
+        ('FONTSIZE', (qty_col - 1, -1), (qty_col + 1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+        ('TOPPADDING', (0, 0), (-1, -1), 3),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ])
+
+
+# ===== 頁面框架 =====
+
+class _PageDecor:
+    """每頁的表頭與頁尾：靜態部分於文件第一頁繪製為 form XObject，之後各頁只引用"""
+
+    def __init__(self, title, font_name, footer=''):
+        self.title = title
+        self.font_name = font_name
+        self.footer = footer
+
+    def _compile(self, canv, doc):
+        width, height = doc.pagesize
+        left, right = doc.leftMargin, width - doc.rightMargin
+        top = height - 1.2 * cm
+        canv.beginForm(_PAGE_FORM)
+        canv.setFont(self.font_name, 16)
+        canv.drawCentredString(width / 2, top - 16, COMPANY_NAME)
+        canv.setFont(self.font_name, 10)
+        canv.drawCentredString(width / 2, top - 32, self.title)
+        canv.setLineWidth(0.8)
+        canv.line(left, top - 40, right, top - 40)
+        canv.setLineWidth(0.3)
+        canv.line(left, 1.2 * cm, right, 1.2 * cm)
+        if self.footer:
+            canv.setFont(self.font_name, 7)
+            canv.drawString(left, 0.8 * cm, self.footer)
+        canv.endForm()
+
+    def __call__(self, canv, doc):
+        if not canv.hasForm(_PAGE_FORM):
+            self._compile(canv, doc)
+        canv.doForm(_PAGE_FORM)
+        canv.setFont(self.font_name, 7)
+        canv.drawRightString(doc.pagesize[0] - doc.rightMargin, 0.8 * cm, f'第 {doc.page} 頁')
+
+
+def build_document(target, title, info_data, item_data, col_widths, item_style, notes=''):
+    """以共用框架輸出一份業務文件
+
+    Args:
+        target: 檔案路徑或可寫入的檔案物件（例如 BytesIO）
+        title: 文件名稱（表頭第二行）
+        info_data: 基本資訊表格（兩欄）
+        item_data: 品項表格（第一列為欄名）
+        col_widths: 品項表格欄寬
+        item_style: 品項表格的 TableStyle
+        notes: 備註
+    """
     if not HAS_REPORTLAB:
         raise RuntimeError("需要安裝 reportlab 套件才能生成 PDF")
 
     font_name = _register_font()
     styles = _get_styles(font_name)
-    doc = SimpleDocTemplate(filepath, pagesize=A4,
-                            topMargin=1.5*cm, bottomMargin=1.5*cm,
-                            leftMargin=1.5*cm, rightMargin=1.5*cm)
-    elements = []
+    doc = SimpleDocTemplate(target, pagesize=A4,
+                            topMargin=3*cm, bottomMargin=1.8*cm,
+                            leftMargin=1.5*cm, rightMargin=1.5*cm,
+                            title=title, author=COMPANY_NAME)
+    decor = _PageDecor(title, font_name,
+                       footer=f'{COMPANY_NAME}　列印時間：{datetime.now():%Y-%m-%d %H:%M}')
+
+    info_table = Table(info_data, colWidths=[doc.width/2]*2)
+    info_table.setStyle(_info_table_style(font_name))
+    item_table = Table(item_data, colWidths=col_widths, repeatRows=1)
+    item_table.setStyle(item_style)
+    elements = [info_table, Spacer(1, 4*mm), item_table]
+
+    if notes:
+        elements.append(Spacer(1, 6*mm))
+        elements.append(Paragraph(f'備註：{notes}', styles['ChNormal']))
 
-    # 表頭
-    elements.append(Paragraph(COMPANY_NAME, styles['ChTitle']))
-    elements.append(Paragraph('報 價 單', styles['ChSubTitle']))
-    elements.append(Spacer(1, 4*mm))
+    doc.build(elements, onFirstPage=decor, onLaterPages=decor)
+    return target
+
+
+# ===== 業務文件 =====
+
+def generate_quotation_pdf(filepath, quotation, items, client_name=''):
+    """生成報價單 PDF（filepath 可為路徑或檔案物件）"""
+    if not HAS_REPORTLAB:
+        raise RuntimeError("需要安裝 reportlab 套件才能生成 PDF")
 
     # 基本資訊表格
     info_data = [
@@ -86,15 +218,6 @@ def generate_quotation_pdf(filepath, quotation, items, client_name=''):
         [f'付款條件：{quotation.get("payment_terms", "") or ""}',
          f'交貨條件：{quotation.get("delivery_terms", "") or ""}'],
     ]
-    info_table = Table(info_data, colWidths=[doc.width/2]*2)
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 4*mm))
 
     # 品項表格
     header = ['項次', '料號', '品名規格', '數量', '單位', '單價', '小計']
@@ -127,50 +250,16 @@ def generate_quotation_pdf(filepath, quotation, items, client_name=''):
     item_data.append(['', '', '', '', '', '合計', f'{grand_total:,.2f}'])
 
     col_widths = [30, 60, 180, 50, 35, 60, 70]
-    item_table = Table(item_data, colWidths=col_widths, repeatRows=1)
-    item_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B9BD5')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('ALIGN', (3, 1), (3, -1), 'RIGHT'),
-        ('ALIGN', (5, 1), (6, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -4), 0.5, colors.grey),
-        ('LINEABOVE', (5, -3), (6, -3), 1, colors.black),
-        ('LINEABOVE', (5, -1), (6, -1), 1.5, colors.black),
-        ('FONTSIZE', (5, -3), (6, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-    ]))
-    elements.append(item_table)
-
-    # 備註
-    if quotation.get('notes'):
-        elements.append(Spacer(1, 6*mm))
-        elements.append(Paragraph(f'備註：{quotation["notes"]}', styles['ChNormal']))
-
-    doc.build(elements)
-    return filepath
+    return build_document(filepath, '報 價 單', info_data, item_data, col_widths,
+                          _item_table_style(_register_font(), 3, 5),
+                          notes=quotation.get('notes') or '')
 
 
 def generate_invoice_pdf(filepath, invoice, items, client_name=''):
-    """生成發票 PDF"""
+    """生成發票 PDF（filepath 可為路徑或檔案物件）"""
     if not HAS_REPORTLAB:
         raise RuntimeError("需要安裝 reportlab 套件才能生成 PDF")
 
-    font_name = _register_font()
-    styles = _get_styles(font_name)
-    doc = SimpleDocTemplate(filepath, pagesize=A4,
-                            topMargin=1.5*cm, bottomMargin=1.5*cm,
-                            leftMargin=1.5*cm, rightMargin=1.5*cm)
-    elements = []
-
-    elements.append(Paragraph(COMPANY_NAME, styles['ChTitle']))
-    elements.append(Paragraph('發 票', styles['ChSubTitle']))
-    elements.append(Spacer(1, 4*mm))
-
     info_data = [
         [f'發票號碼：{invoice["invoice_number"]}',
          f'開票日期：{invoice.get("invoice_date", "")}'],
@@ -179,15 +268,6 @@ def generate_invoice_pdf(filepath, invoice, items, client_name=''):
         [f'到期日：{invoice.get("due_date", "") or ""}',
          f'付款狀態：{invoice.get("payment_status", "未付")}'],
     ]
-    info_table = Table(info_data, colWidths=[doc.width/2]*2)
-    info_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-        ('TOPPADDING', (0, 0), (-1, -1), 2),
-    ]))
-    elements.append(info_table)
-    elements.append(Spacer(1, 4*mm))
 
     header = ['項次', '品名規格', '數量', '單位', '單價', '小計']
     item_data = [header]
@@ -213,26 +293,104 @@ def generate_invoice_pdf(filepath, invoice, items, client_name=''):
     item_data.append(['', '', '', '', '合計', f'{total:,.2f}'])
 
     col_widths = [35, 210, 55, 40, 65, 75]
-    item_table = Table(item_data, colWidths=col_widths, repeatRows=1)
-    item_table.setStyle(TableStyle([
-        ('FONTNAME', (0, 0), (-1, -1), font_name),
-        ('FONTSIZE', (0, 0), (-1, -1), 8),
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#5B9BD5')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
-        ('ALIGN', (4, 1), (5, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -4), 0.5, colors.grey),
-        ('LINEABOVE', (4, -3), (5, -3), 1, colors.black),
-        ('LINEABOVE', (4, -1), (5, -1), 1.5, colors.black),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-    ]))
-    elements.append(item_table)
+    return build_document(filepath, '發 票', info_data, item_data, col_widths,
+                          _item_table_style(_register_font(), 2, 4),
+                          notes=invoice.get('notes') or '')
 
-    if invoice.get('notes'):
-        elements.append(Spacer(1, 6*mm))
-        elements.append(Paragraph(f'備註：{invoice["notes"]}', styles['ChNormal']))
 
-    doc.build(elements)
-    return filepath
+# ===== 出口文件 =====
+
+def _shipping_rows(shipping):
+    """出口文件共用的運送資訊列"""
+    s = shipping or {}
+    return [
+        [f'目的國：{s.get("destination_country") or ""}',
+         f'運輸方式：{s.get("shipping_method") or ""}'],
+        [f'船名/航班：{s.get("vessel_name") or ""}',
+         f'出貨日期：{s.get("shipping_date") or ""}'],
+        [f'提單號：{s.get("bl_number") or ""}',
+         f'貨櫃號：{s.get("container_number") or ""}'],
+    ]
+
+
+def _item_description(item):
+    desc = item['description'] or ''
+    if item.get('specification'):
+        desc += f"\n{item['specification']}"
+    return desc
+
+
+def generate_commercial_invoice_pdf(filepath, doc_number, order, items, shipping=None,
+                                    issue_date=''):
+    """生成出口商業發票 PDF（items 為發票或訂單明細；出口零稅率，不列稅金）"""
+    if not HAS_REPORTLAB:
+        raise RuntimeError("需要安裝 reportlab 套件才能生成 PDF")
+
+    info_data = [
+        [f'發票號碼：{doc_number}', f'日期：{issue_date}'],
+        [f'客戶名稱：{order.get("client_name") or ""}',
+         f'幣別：{order.get("currency") or "TWD"}'],
+        [f'訂單號：{order["order_number"]}', f'客戶 PO：{order.get("po_number") or ""}'],
+        [f'付款條件：{order.get("payment_terms") or ""}',
+         f'交貨條件：{order.get("delivery_terms") or ""}'],
+    ] + _shipping_rows(shipping)
+
+    header = ['項次', '料號', '品名規格', '數量', '單位', '單價', '金額']
+    item_data = [header]
+    total = 0
+    for item in items:
+        qty = float(item['quantity'] or 0)
+        price = float(item['unit_price'] or 0)
+        amount = qty * price
+        total += amount
+        item_data.append([
+            str(item['item_no']),
+            item.get('part_number', '') or '',
+            _item_description(item),
+            f'{qty:,.2f}',
+            item.get('unit') or 'PCS',
+            f'{price:,.2f}',
+            f'{amount:,.2f}',
+        ])
+    item_data.append(['', '', '', '', '', '合計', f'{total:,.2f}'])
+
+    col_widths = [30, 60, 180, 50, 35, 60, 70]
+    return build_document(filepath, 'COMMERCIAL INVOICE 商業發票', info_data, item_data,
+                          col_widths, _item_table_style(_register_font(), 3, 5, total_rows=1),
+                          notes=order.get('notes') or '')
+
+
+def generate_packing_list_pdf(filepath, doc_number, order, items, shipping=None,
+                              issue_date=''):
+    """生成出口裝箱單 PDF（數量依單位分別合計）"""
+    if not HAS_REPORTLAB:
+        raise RuntimeError("需要安裝 reportlab 套件才能生成 PDF")
+
+    info_data = [
+        [f'裝箱單號：{doc_number}', f'日期：{issue_date}'],
+        [f'客戶名稱：{order.get("client_name") or ""}',
+         f'訂單號：{order["order_number"]}'],
+    ] + _shipping_rows(shipping)
+
+    header = ['項次', '料號', '品名規格', '數量', '單位', '備註']
+    item_data = [header]
+    totals = {}
+    for item in items:
+        qty = float(item['quantity'] or 0)
+        unit = item.get('unit') or 'PCS'
+        totals[unit] = totals.get(unit, 0) + qty
+        item_data.append([
+            str(item['item_no']),
+            item.get('part_number', '') or '',
+            _item_description(item),
+            f'{qty:,.2f}',
+            unit,
+            item.get('notes') or '',
+        ])
+    item_data.append(['', '', '合計',
+                      '\n'.join(f'{q:,.2f}' for q in totals.values()),
+                      '\n'.join(totals), ''])
+
+    col_widths = [30, 70, 200, 55, 40, 90]
+    return build_document(filepath, 'PACKING LIST 裝箱單', info_data, item_data,
+                          col_widths, _packing_table_style(_register_font()))
@@ -0,0 +1,171 @@
+"""非同步查詢執行器 — 在背景執行緒執行資料庫查詢，結果回到 Tk 主執行緒
+
+每個查詢以 key 分組（例如 'invoice_list'），同一 key 只保留最新一次請求的結果：
+使用者快速切換篩選或點選時，較舊的結果會被丟棄，不會覆蓋畫面。
+
+工作執行緒不直接碰觸 Tk；結果先放入佇列，再由主執行緒以 root.after 輪詢取出。
+
+用法：
+    executor = get_query_executor(self)
+    executor.submit('invoice_list', bq.get_all_invoices,
+                    payment_status=status, on_done=self._fill_list)
+
+長時間的維護工作（版次差異壓縮、彙總重算等）改用 get_background_executor：
+單一工作執行緒，不佔用介面查詢的執行緒，也不觸發狀態列的載入指示。
+"""
+import queue
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+class QueryExecutor:
+    """背景查詢執行器（每個應用程式一個實例）"""
+
+    def __init__(self, root, max_workers=4, poll_ms=30, thread_name_prefix='db-query'):
+        self._root = root
+        self._poll_ms = poll_ms
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix=thread_name_prefix)
+        self._results = queue.Queue()
+        self._tickets = itertools.count(1)
+        self._lock = threading.Lock()
+        self._latest = {}       # key -> ticket
+        self._futures = {}      # key -> Future
+        self._callbacks = {}    # ticket -> (on_done, on_error)
+        self._listeners = []    # fn(key, loading)
+        self._polling = False
+
+    # ----- 公開 API -----
+
+    def submit(self, key, fn, *args, on_done=None, on_error=None, **kwargs):
+        """送出查詢；同 key 的舊請求會被取消或丟棄。回傳請求編號"""
+        ticket = next(self._tickets)
+        with self._lock:
+            prev = self._futures.get(key)
+            if prev is not None:
+                prev.cancel()
+            self._latest[key] = ticket
+            self._callbacks[ticket] = (on_done, on_error)
+            self._futures[key] = self._pool.submit(
+                self._run, key, ticket, fn, args, kwargs)
+        self._notify(key, True)
+        self._ensure_polling()
+        return ticket
+
+    def cancel(self, key):
+        """取消指定 key 的進行中請求（結果不會回呼）"""
+        with self._lock:
+            ticket = self._latest.pop(key, None)
+            future = self._futures.pop(key, None)
+            if ticket is not None:
+                self._callbacks.pop(ticket, None)
+        if future is not None:
+            future.cancel()
+        if ticket is not None:
+            self._notify(key, False)
+
+    def is_loading(self, key):
+        with self._lock:
+            return key in self._latest
+
+    def add_loading_listener(self, fn):
+        """註冊載入狀態監聽：fn(key, loading)，於主執行緒呼叫"""
+        self._listeners.append(fn)
+
+    def remove_loading_listener(self, fn):
+        if fn in self._listeners:
+            self._listeners.remove(fn)
+
+    def shutdown(self):
+        with self._lock:
+            self._latest.clear()
+            self._futures.clear()
+            self._callbacks.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    # ----- 內部 -----
+
+    def _run(self, key, ticket, fn, args, kwargs):
+        """（工作執行緒）執行查詢並把結果放入佇列"""
+        try:
+            result = fn(*args, **kwargs)
+            self._results.put((key, ticket, True, result))
+        except Exception as e:
+            self._results.put((key, ticket, False, e))
+
+    def _ensure_polling(self):
+        if not self._polling:
+            self._polling = True
+            self._root.after(self._poll_ms, self._poll)
+
+    def _poll(self):
+        """（主執行緒）取出已完成的結果並回呼"""
+        while True:
+            try:
+                key, ticket, ok, payload = self._results.get_nowait()
+            except queue.Empty:
+                break
+
+            with self._lock:
+                callbacks = self._callbacks.pop(ticket, None)
+                is_latest = self._latest.get(key) == ticket
+                if is_latest:
+                    del self._latest[key]
+                    self._futures.pop(key, None)
+            if not is_latest or callbacks is None:
+                continue  # 已被較新的請求取代或已取消
+
+            self._notify(key, False)
+            on_done, on_error = callbacks
+            try:
+                if ok:
+                    if on_done:
+                        on_done(payload)
+                elif on_error:
+                    on_error(payload)
+                else:
+                    print(f"[查詢失敗] {key} → {payload}")
+            except Exception as e:
+                # 元件可能已被銷毀
+                print(f"[查詢回呼失敗] {key} → {e}")
+
+        with self._lock:
+            pending = bool(self._latest)
+        if pending:
+            self._root.after(self._poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def _notify(self, key, loading):
+        for fn in list(self._listeners):
+            try:
+                fn(key, loading)
+            except Exception:
+                pass
+
+
+# 全域執行器實例
+_global_executor = None
+_background_executor = None
+
+
+def get_query_executor(widget=None):
+    """取得全域查詢執行器；第一次呼叫需傳入任一 Tk 元件"""
+    global _global_executor
+    if _global_executor is None:
+        if widget is None:
+            raise RuntimeError("第一次取得查詢執行器時需傳入 Tk 元件")
+        _global_executor = QueryExecutor(widget._root())
+    return _global_executor
+
+
+def get_background_executor(widget=None):
+    """取得背景維護工作執行器（單一執行緒）；第一次呼叫需傳入任一 Tk 元件"""
+    global _background_executor
+    if _background_executor is None:
+        if widget is None:
+            raise RuntimeError("第一次取得背景執行器時需傳入 Tk 元件")
+        _background_executor = QueryExecutor(widget._root(), max_workers=1,
+                                             thread_name_prefix='db-background')
+    return _background_executor
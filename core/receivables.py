@@ -0,0 +1,43 @@
+"""應收帳款 — 帳齡分析與逾期偵測
+
+帳齡：business_queries.get_ar_aging 以一次分組查詢計算每客戶 × 幣別的分桶金額
+逾期：refresh_overdue 以單一 UPDATE 將過了到期日的未付發票標為逾期
+      （主視窗啟動時及每 AR_OVERDUE_CHECK_MINUTES 分鐘執行）
+總額：ar_summary 由 invoices 觸發器增量維護，儀表板讀取不需掃描發票
+"""
+from db import business_queries as bq
+
+# 帳齡分桶上限（天），超過最後一個上限者歸入最後一桶
+AGING_BOUNDS = (30, 60, 90)
+AGING_LABELS = ('0-30', '31-60', '61-90', '90+')
+
+
+def refresh_overdue(as_of=None):
+    """將過期未付的發票標為逾期，回傳更新筆數"""
+    return bq.mark_overdue_invoices(as_of)
+
+
+def aging_report(as_of=None, client_id=None):
+    """每客戶 × 幣別的帳齡分桶（未到期的發票歸入 0-30）
+
+    Returns:
+        [{'client_id', 'client_name', 'currency', 'count', 'total', 'max_days',
+          'buckets': {'0-30': 金額, '31-60': …, '61-90': …, '90+': …}}]
+    """
+    report = []
+    for r in bq.get_ar_aging(AGING_BOUNDS, as_of, client_id):
+        report.append({
+            'client_id': r['client_id'],
+            'client_name': r['client_name'],
+            'currency': r['currency'],
+            'count': r['invoice_count'],
+            'total': r['total_amount'],
+            'max_days': r['max_days'],
+            'buckets': {label: r[f'b{i}'] for i, label in enumerate(AGING_LABELS)},
+        })
+    return report
+
+
+def summary():
+    """每客戶 × 幣別的未收款與逾期總額（觸發器維護的彙總表）"""
+    return [dict(r) for r in bq.get_ar_summary()]
@@ -0,0 +1,277 @@
+"""版次差異比對 — 將兩個版次渲染成圖片、對齊後以顏色標示增刪的線條
+
+流程：
+  1. 渲染：以 thumbnail_manager 的 _image_from_file 讀取兩個版次的檔案（舊版次先由檔案庫還原）
+  2. 同比例與對齊：裁掉白邊後，以逐欄／逐列墨跡投影的一維相關（FFT）求出新版的縮放比例與位移，
+     兩張圖貼到相同大小的畫布
+  3. 疊圖（NumPy 陣列運算）：只在舊版出現的線條標紅（刪除）、只在新版出現的標綠（新增）、
+     共同的線條淡化；比對時容許 1 像素誤差（以膨脹後的遮罩判斷），避免反鋸齒或取整造成整條線被標示
+
+渲染結果與比對結果皆以檔案雜湊命名快取於 DIFF_CACHE_DIR：
+CAD 渲染只做一次，同一對版次再次比對直接讀檔。
+"""
+import os
+import json
+
+import numpy as np
+from PIL import Image
+from config import DIFF_CACHE_DIR, DIFF_MAX_SIDE, DIFF_CACHE_MAX_FILES
+
+# 快取格式版本（比對演算法變更時遞增，舊快取自然失效）
+_VERSION = 1
+# 灰階低於此值視為墨跡
+_INK_LEVEL = 200
+
+REMOVED_COLOR = (220, 40, 40)
+ADDED_COLOR = (20, 150, 60)
+
+
+# ===== 影像處理 =====
+
+def _gray_array(img):
+    if img.mode in ('RGBA', 'LA', 'P'):
+        img = img.convert('RGBA')
+        background = Image.new('RGBA', img.size, (255, 255, 255, 255))
+        img = Image.alpha_composite(background, img)
+    return np.asarray(img.convert('L'))
+
+
+def _crop_to_ink(gray):
+    """裁掉白邊；整張空白時原樣回傳"""
+    ink = gray < _INK_LEVEL
+    rows = np.flatnonzero(ink.any(axis=1))
+    cols = np.flatnonzero(ink.any(axis=0))
+    if not len(rows):
+        return gray
+    return gray[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def _resize(gray, scale):
+    if scale == 1.0:
+        return gray
+    h, w = gray.shape
+    size = (max(1, round(w * scale)), max(1, round(h * scale)))
+    return np.asarray(Image.fromarray(gray).resize(size, Image.LANCZOS))
+
+
+def _profile(ink, axis):
+    """墨跡投影（每欄或每列的墨跡像素數），平滑後去平均"""
+    p = np.convolve(ink.sum(axis=axis).astype(np.float64), np.ones(5) / 5, 'same')
+    return p - p.mean()
+
+
+def _fit_axis(pa, pb, scales):
+    """一維投影的縮放與平移：回傳 (相關分數, 縮放, 位移)，b 的座標 x 對應 a 的 x * 縮放 + 位移"""
+    best = (-np.inf, 1.0, 0)
+    norm_a = np.linalg.norm(pa) or 1.0
+    n = len(pa)
+    for scale in scales:
+        m = max(2, round(len(pb) * scale))
+        rb = np.interp(np.arange(m) / scale, np.arange(len(pb)), pb)
+        size = n + m
+        corr = np.fft.irfft(np.fft.rfft(pa, size) * np.conj(np.fft.rfft(rb, size)), size)
+        k = int(np.argmax(corr))
+        score = corr[k] / (norm_a * (np.linalg.norm(rb) or 1.0))
+        if score > best[0]:
+            best = (score, scale, k if k < n else k - size)
+    return best
+
+
+def _fit_scale(pa, pb, guesses):
+    """在各初始猜測的 ±20% 內粗搜、再於最佳值附近細搜縮放比例"""
+    coarse = np.unique(np.concatenate([g * np.geomspace(0.8, 1.25, 41) for g in guesses]))
+    _, scale, _ = _fit_axis(pa, pb, coarse)
+    return _fit_axis(pa, pb, scale * np.geomspace(0.99, 1.01, 27))
+
+
+def align(gray_a, gray_b):
+    """將兩張灰階圖對齊到同一畫布：回傳 (a 畫布, b 畫布, b 的縮放比例, b 的位移 (dx, dy))
+
+    以 a 裁白邊後的尺寸為基準（長邊不超過 DIFF_MAX_SIDE），b 的縮放比例與位移由墨跡投影的
+    一維相關求得；先以「兩者渲染解析度相同」與「裁白邊後寬度相同」兩種猜測為起點搜尋，
+    圖框大小改變或外側多出標註時仍能對齊。
+    """
+    a = _crop_to_ink(gray_a)
+    same_dpi = min(1.0, DIFF_MAX_SIDE / max(a.shape))
+    a = _resize(a, same_dpi)
+    b = _crop_to_ink(gray_b)
+    ink_a, ink_b = a < _INK_LEVEL, b < _INK_LEVEL
+
+    col_a, col_b = _profile(ink_a, 0), _profile(ink_b, 0)
+    row_a, row_b = _profile(ink_a, 1), _profile(ink_b, 1)
+    base = a.shape[1] / b.shape[1] if b.shape[1] else 1.0
+    guesses = [base, same_dpi, a.shape[0] / b.shape[0] if b.shape[0] else 1.0]
+    fit_x = _fit_scale(col_a, col_b, guesses)
+    fit_y = _fit_scale(row_a, row_b, guesses)
+    # 圖面為等比例縮放：取相關較高的軸的比例，另一軸以相同比例重新求位移
+    scale = fit_x[1] if fit_x[0] >= fit_y[0] else fit_y[1]
+    if abs(scale / same_dpi - 1) < 1e-3:
+        scale = same_dpi        # 相同解析度渲染時不重新取樣，保持線條銳利
+    _, _, dx = _fit_axis(col_a, col_b, [scale])
+    _, _, dy = _fit_axis(row_a, row_b, [scale])
+
+    b = _resize(b, scale)
+    margin = max(4, a.shape[1] // 50)
+    left, top = min(0, dx), min(0, dy)
+    right = max(a.shape[1], dx + b.shape[1])
+    bottom = max(a.shape[0], dy + b.shape[0])
+    shape = (bottom - top + 2 * margin, right - left + 2 * margin)
+    canvases = []
+    for g, (x, y) in ((a, (0, 0)), (b, (dx, dy))):
+        canvas = np.full(shape, 255, np.uint8)
+        x, y = x - left + margin, y - top + margin
+        canvas[y:y + g.shape[0], x:x + g.shape[1]] = g
+        canvases.append(canvas)
+    return canvases[0], canvases[1], float(scale), (int(dx), int(dy))
+
+
+def _dilate(mask):
+    """3×3 膨脹"""
+    padded = np.pad(mask, 1)
+    h, w = mask.shape
+    out = np.zeros_like(mask)
+    for y in range(3):
+        for x in range(3):
+            out |= padded[y:y + h, x:x + w]
+    return out
+
+
+def _drop_specks(mask, min_count=3):
+    """移除 3×3 鄰域內變更像素少於 min_count 的零星點（線寬取整造成的雜訊）"""
+    padded = np.pad(mask, 1).astype(np.uint8)
+    h, w = mask.shape
+    count = np.zeros(mask.shape, np.uint8)
+    for y in range(3):
+        for x in range(3):
+            count += padded[y:y + h, x:x + w]
+    return mask & (count >= min_count)
+
+
+def diff_images(img_a, img_b):
+    """比對兩張圖片（舊、新）
+
+    Returns:
+        {'overlay', 'old', 'new': 對齊後同尺寸的 PIL Image,
+         'removed', 'added': 標示的像素數, 'changed_ratio': 變更像素佔墨跡比例,
+         'scale', 'shift': 新版相對舊版的縮放比例與位移 (dx, dy), 'bbox': 變更範圍 (left, top, right, bottom) 或 None}
+    """
+    gray_a, gray_b, scale, shift = align(_gray_array(img_a), _gray_array(img_b))
+
+    ink_a = gray_a < _INK_LEVEL
+    ink_b = gray_b < _INK_LEVEL
+    removed = _drop_specks(ink_a & ~_dilate(ink_b))
+    added = _drop_specks(ink_b & ~_dilate(ink_a))
+
+    # 共同內容淡化為淺灰，再疊上增刪的顏色
+    faded = (255 - (255 - np.minimum(gray_a, gray_b)) * 0.3).astype(np.uint8)
+    overlay = np.repeat(faded[:, :, None], 3, axis=2)
+    overlay[removed] = REMOVED_COLOR
+    overlay[added] = ADDED_COLOR
+
+    changed = removed | added
+    rows = np.flatnonzero(changed.any(axis=1))
+    cols = np.flatnonzero(changed.any(axis=0))
+    bbox = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1) if len(rows) else None
+    ink_total = int(np.count_nonzero(ink_a | ink_b))
+    return {
+        'overlay': Image.fromarray(overlay),
+        'old': Image.fromarray(gray_a),
+        'new': Image.fromarray(gray_b),
+        'removed': int(np.count_nonzero(removed)),
+        'added': int(np.count_nonzero(added)),
+        'changed_ratio': int(np.count_nonzero(changed)) / ink_total if ink_total else 0.0,
+        'scale': scale,
+        'shift': shift,
+        'bbox': bbox,
+    }
+
+
+# ===== 版次渲染與快取 =====
+
+def _cache_path(name):
+    return os.path.join(DIFF_CACHE_DIR, name)
+
+
+def _prune_cache():
+    """只保留最近使用的 DIFF_CACHE_MAX_FILES 個快取檔案"""
+    try:
+        entries = sorted(os.scandir(DIFF_CACHE_DIR), key=lambda e: e.stat().st_mtime,
+                         reverse=True)
+    except FileNotFoundError:
+        return
+    for entry in entries[DIFF_CACHE_MAX_FILES:]:
+        try:
+            os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _revision_source(rev):
+    """版次的 (內容雜湊, 檔案路徑)"""
+    from core.blob_store import file_sha256
+    if rev['file_hash']:
+        from core.revision_store import materialize_revision
+        return rev['file_hash'], materialize_revision(rev['id'])
+    path = rev['file_path']
+    if not path or not os.path.exists(path):
+        return None, None
+    return file_sha256(path), path
+
+
+def render_revision(rev):
+    """渲染版次為 PIL Image（依內容雜湊快取）；回傳 (雜湊, 圖片)"""
+    from core.thumbnail_manager import _image_from_file
+    file_hash, path = _revision_source(rev)
+    if not file_hash or not path:
+        raise ValueError(f"找不到版次 {rev['rev_code']} 的檔案")
+
+    cached = _cache_path(f"render_{file_hash[:24]}.png")
+    if os.path.exists(cached):
+        os.utime(cached)
+        with Image.open(cached) as img:
+            return file_hash, img.copy()
+
+    img = _image_from_file(path)
+    if img is None:
+        raise ValueError(f"無法渲染版次 {rev['rev_code']}（{os.path.splitext(path)[1]}）")
+    os.makedirs(DIFF_CACHE_DIR, exist_ok=True)
+    img = img.convert('RGB') if img.mode not in ('RGB', 'L') else img
+    img.save(cached, 'PNG')
+    return file_hash, img
+
+
+def diff_revisions(old_revision_id, new_revision_id, use_cache=True):
+    """比對兩個版次，回傳 diff_images 的結果（另含 'old_rev'、'new_rev' 版次列與 'cached'）"""
+    from db import queries
+    old_rev = queries.get_revision(old_revision_id)
+    new_rev = queries.get_revision(new_revision_id)
+    if not old_rev or not new_rev:
+        raise ValueError("版次不存在")
+
+    old_hash, old_img = render_revision(old_rev)
+    new_hash, new_img = render_revision(new_rev)
+    key = f"diff_v{_VERSION}_{old_hash[:16]}_{new_hash[:16]}"
+    names = {part: _cache_path(f"{key}_{part}.png") for part in ('overlay', 'old', 'new')}
+    stats_path = _cache_path(f"{key}.json")
+
+    if use_cache and os.path.exists(stats_path) and all(map(os.path.exists, names.values())):
+        with open(stats_path, encoding='utf-8') as f:
+            result = json.load(f)
+        result['shift'] = tuple(result['shift'])
+        result['bbox'] = tuple(result['bbox']) if result['bbox'] else None
+        for part, path in names.items():
+            os.utime(path)
+            with Image.open(path) as img:
+                result[part] = img.copy()
+        result.update(old_rev=old_rev, new_rev=new_rev, cached=True)
+        return result
+
+    result = diff_images(old_img, new_img)
+    os.makedirs(DIFF_CACHE_DIR, exist_ok=True)
+    for part, path in names.items():
+        result[part].save(path, 'PNG')
+    with open(stats_path, 'w', encoding='utf-8') as f:
+        json.dump({k: v for k, v in result.items() if k not in names}, f)
+    _prune_cache()
+    result.update(old_rev=old_rev, new_rev=new_rev, cached=False)
+    return result
@@ -0,0 +1,218 @@
+"""版次差異儲存 — DXF / IGES 等文字格式圖檔的舊版次改存壓縮差異
+
+最新版次在檔案庫保留完整內容；較舊的版次只保存「由下一個版次還原回來」
+的行差異（zlib 壓縮），開啟歷史版次時再依鏈逐步還原。
+
+差異以行雜湊比對：基準版次每個 _ANCHOR_LINES 行的視窗建索引（每個視窗最多保留
+_MAX_CANDIDATES 個位置），目標逐行優先延續上一段複製，否則由索引找最長的相符段；
+運算量與檔案行數成線性，重複行很多的 DXF 也不會退化為平方時間。
+
+差異格式（壓縮前）：
+  b'C' + <起始行, 行數>  — 從基準版次複製連續行
+  b'I' + <長度> + 資料    — 插入新內容
+"""
+import os
+import zlib
+import struct
+import hashlib
+from db import queries
+from config import (REVISION_DELTA_ENABLED, REVISION_DELTA_EXTENSIONS,
+                    REVISION_CACHE_DIR)
+from core.blob_store import blob_path, has_blob, remove_file
+
+# 差異需小於完整檔案的此比例才值得改存
+_MAX_DELTA_RATIO = 0.5
+
+
+def _is_delta_candidate(file_path):
+    ext = os.path.splitext(file_path or '')[1].lower()
+    return ext in REVISION_DELTA_EXTENSIONS
+
+
+# 比對錨點的行數與每個錨點保留的候選位置數
+_ANCHOR_LINES = 4
+_MAX_CANDIDATES = 8
+
+
+def make_delta(base, target):
+    """產生由 base 還原 target 的壓縮差異"""
+    base_lines = base.splitlines(keepends=True)
+    target_lines = target.splitlines(keepends=True)
+    nb, nt = len(base_lines), len(target_lines)
+
+    index = {}
+    for i in range(nb - _ANCHOR_LINES + 1):
+        positions = index.setdefault(tuple(base_lines[i:i + _ANCHOR_LINES]), [])
+        if len(positions) < _MAX_CANDIDATES:
+            positions.append(i)
+
+    def match_len(i, j):
+        n = 0
+        while i + n < nb and j + n < nt and base_lines[i + n] == target_lines[j + n]:
+            n += 1
+        return n
+
+    out = bytearray()
+    pending = []            # 待輸出的插入行
+    copy_start = copy_len = 0
+
+    def flush_copy():
+        nonlocal copy_len
+        if copy_len:
+            out.extend(b'C' + struct.pack('<II', copy_start, copy_len))
+            copy_len = 0
+
+    j = 0
+    expected = 0            # 上一段複製之後的基準位置
+    while j < nt:
+        best_i, best_len = -1, 0
+        if expected < nb and base_lines[expected] == target_lines[j]:
+            best_i, best_len = expected, match_len(expected, j)
+        if best_len < _ANCHOR_LINES:
+            for i in index.get(tuple(target_lines[j:j + _ANCHOR_LINES]), ()):
+                n = match_len(i, j)
+                if n > best_len:
+                    best_i, best_len = i, n
+        if not best_len:
+            flush_copy()
+            pending.append(target_lines[j])
+            j += 1
+            continue
+
+        if pending:
+            data = b''.join(pending)
+            out += b'I' + struct.pack('<I', len(data)) + data
+            pending = []
+        if copy_len and best_i == copy_start + copy_len:
+            copy_len += best_len
+        else:
+            flush_copy()
+            copy_start, copy_len = best_i, best_len
+        j += best_len
+        expected = best_i + best_len
+
+    flush_copy()
+    if pending:
+        data = b''.join(pending)
+        out += b'I' + struct.pack('<I', len(data)) + data
+    return zlib.compress(bytes(out), 9)
+
+
+def apply_delta(base, delta):
+    """將差異套用到 base，還原目標內容"""
+    raw = zlib.decompress(delta)
+    base_lines = base.splitlines(keepends=True)
+    parts = []
+    pos = 0
+    while pos < len(raw):
+        op = raw[pos:pos + 1]
+        pos += 1
+        if op == b'C':
+            start, count = struct.unpack_from('<II', raw, pos)
+            pos += 8
+            parts.extend(base_lines[start:start + count])
+        elif op == b'I':
+            (length,) = struct.unpack_from('<I', raw, pos)
+            pos += 4
+            parts.append(raw[pos:pos + length])
+            pos += length
+        else:
+            raise ValueError(f"差異資料格式錯誤（位置 {pos - 1}）")
+    return b''.join(parts)
+
+
+def read_revision(revision_id):
+    """讀取指定版次的完整內容（必要時沿差異鏈還原），無法取得時回傳 None"""
+    chain = []
+    current_id = revision_id
+    rev = None
+    while True:
+        rev = queries.get_revision(current_id)
+        if not rev or not rev['file_hash']:
+            return None
+        delta_row = queries.get_revision_delta(current_id)
+        if not delta_row:
+            break
+        if len(chain) > 1000 or current_id in (c[0] for c in chain):
+            raise ValueError("版次差異鏈異常（循環或過長）")
+        chain.append((current_id, rev['file_hash'], bytes(delta_row['delta'])))
+        current_id = delta_row['base_revision_id']
+
+    if not has_blob(rev['file_hash']):
+        return None
+    with open(blob_path(rev['file_hash']), 'rb') as f:
+        data = f.read()
+
+    for _, file_hash, delta in reversed(chain):
+        data = apply_delta(data, delta)
+        if hashlib.sha256(data).hexdigest() != file_hash:
+            raise ValueError("版次還原後內容校驗失敗")
+    return data
+
+
+def materialize_revision(revision_id):
+    """將歷史版次還原為暫存檔並回傳路徑（供開啟檔案使用）"""
+    rev = queries.get_revision(revision_id)
+    if not rev or not rev['file_hash']:
+        return None
+
+    ext = os.path.splitext(rev['file_path'] or '')[1]
+    dest_dir = os.path.join(REVISION_CACHE_DIR, str(rev['drawing_id']))
+    dest_path = os.path.join(dest_dir, f"rev_{rev['rev_code']}{ext}")
+
+    # 完整儲存的版次：由檔案庫複製為獨立檔案（已是相同內容時直接使用）
+    if not queries.get_revision_delta(revision_id):
+        from core.blob_store import copy_blob
+        return copy_blob(rev['file_hash'], dest_path)
+
+    # 差異儲存的版次：暫存檔與原內容相同時直接使用
+    if os.path.exists(dest_path):
+        with open(dest_path, 'rb') as f:
+            if hashlib.sha256(f.read()).hexdigest() == rev['file_hash']:
+                return dest_path
+
+    data = read_revision(revision_id)
+    if data is None:
+        return None
+    os.makedirs(dest_dir, exist_ok=True)
+    with open(dest_path, 'wb') as f:
+        f.write(data)
+    return dest_path
+
+
+def compact_drawing(drawing_id):
+    """將圖面的舊版次改存為差異（最新版次維持完整），回傳改存的版次數
+
+    僅處理 REVISION_DELTA_EXTENSIONS 格式，且差異明顯小於完整檔案時才改存。
+    """
+    if not REVISION_DELTA_ENABLED:
+        return 0
+
+    revisions = queries.get_stored_revisions(drawing_id)
+    compacted = 0
+    for older, newer in zip(revisions, revisions[1:]):
+        if older['base_revision_id'] is not None:
+            continue
+        if not (_is_delta_candidate(older['file_path'])
+                and _is_delta_candidate(newer['file_path'])):
+            continue
+        if not has_blob(older['file_hash']):
+            continue
+
+        try:
+            target = read_revision(older['id'])
+            base = read_revision(newer['id'])
+            if target is None or base is None:
+                continue
+            delta = make_delta(base, target)
+            if len(delta) > len(target) * _MAX_DELTA_RATIO:
+                continue
+            # 已無其他版次以完整檔案參照時，blobs 紀錄在同一交易內移除，再刪除實體
+            unused = queries.add_revision_delta(older['id'], newer['id'], delta, len(target),
+                                                older['file_hash'])
+            compacted += 1
+            if unused:
+                remove_file(blob_path(older['file_hash']))
+        except Exception as e:
+            print(f"[版次差異儲存失敗] 版次 {older['rev_code']} → {e}")
+    return compacted
@@ -0,0 +1,279 @@
+"""生產排程引擎 — 依 production_tasks.depends_on 計算要徑與浮時
+
+depends_on 格式：以逗號（或空白、分號）分隔的前置任務 ID，可跨生產單，例如 "12, 15"。
+相依關係一律視為「完工後開工」(finish-to-start)：前置任務結束日的隔天才可開始。
+
+日期以 date.toordinal() 的整數運算，排程計算皆為 O(V+E)：
+- 前推 (forward pass)：最早開始 ES = max(計畫開始日, 前置任務最早完工 EF + 1)
+- 後推 (backward pass)：最晚完工 LF = min(後續任務最晚開始 LS - 1)，浮時 = LS - ES；
+  終點為任務所屬群組（同一生產單或以相依關係相連的任務）自己的最晚完工日，
+  不相干的生產單不會互相影響要徑與浮時；未排定日期的任務不計入終點也不列入要徑
+- 單一任務延誤時只沿後續任務傳遞，日期不再變動的分支即停止
+
+用法：
+    schedule = ProductionSchedule(bq.get_all_production_tasks_for_gantt())
+    changes = schedule.shift_task(task_id, new_end='2025-03-20')
+    bq.update_production_task_dates(schedule.date_updates())
+"""
+import re
+import heapq
+from datetime import date
+
+# 已完成的任務以實際日期為準，不再被前置任務推移
+_FIXED_STATUS = ('已完成',)
+
+_ID_PATTERN = re.compile(r'\d+')
+
+
+def parse_depends_on(text):
+    """解析 depends_on 欄位，回傳前置任務 ID 清單"""
+    if not text:
+        return []
+    return [int(x) for x in _ID_PATTERN.findall(str(text))]
+
+
+def _to_ordinal(value):
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(str(value)[:10]).toordinal()
+    except ValueError:
+        return None
+
+
+def _to_iso(ordinal):
+    return date.fromordinal(ordinal).isoformat()
+
+
+class ProductionSchedule:
+    """生產任務相依圖與排程結果"""
+
+    def __init__(self, tasks):
+        """tasks: production_tasks 列（sqlite3.Row 或 dict），需含 id / start_date / end_date /
+        depends_on / status；可另含 actual_start / actual_end / production_order_id"""
+        self.tasks = {}         # id -> row
+        self.preds = {}         # id -> [前置任務 id]
+        self.succs = {}         # id -> [後續任務 id]
+        self.planned = {}       # id -> 計畫開始日（ordinal）
+        self.duration = {}      # id -> 工期（天，含頭尾）
+        self.fixed = set()      # 不受相依推移的任務
+        self.cycles = []        # 形成循環而無法排程的任務 id
+        self.missing = {}       # id -> 找不到的前置任務 id
+        self.undated = set()    # 尚未排定日期的任務（僅以今日暫代顯示，不寫回）
+
+        today = date.today().toordinal()
+        for t in tasks:
+            tid = t['id']
+            keys = t.keys()
+            start = None
+            end = None
+            if t['status'] in _FIXED_STATUS and 'actual_start' in keys:
+                start = _to_ordinal(t['actual_start'])
+                end = _to_ordinal(t['actual_end'])
+            start = start or _to_ordinal(t['start_date'])
+            end = end or _to_ordinal(t['end_date'])
+            if start is None and end is None:
+                self.undated.add(tid)
+            if start is None:
+                start = end if end is not None else today
+            if end is None or end < start:
+                end = start
+
+            self.tasks[tid] = t
+            self.planned[tid] = start
+            self.duration[tid] = end - start + 1
+            self.preds[tid] = []
+            self.succs.setdefault(tid, [])
+            if t['status'] in _FIXED_STATUS:
+                self.fixed.add(tid)
+
+        for tid, t in self.tasks.items():
+            for dep in parse_depends_on(t['depends_on']):
+                if dep == tid:
+                    continue
+                if dep not in self.tasks:
+                    self.missing.setdefault(tid, []).append(dep)
+                    continue
+                self.preds[tid].append(dep)
+                self.succs[dep].append(tid)
+
+        self.order = self._topological_order()
+        self.topo_index = {tid: i for i, tid in enumerate(self.order)}
+        self.group = self._groups()     # id -> 群組代表 id（後推終點以群組計算）
+        self.es = {}
+        self.ef = {}
+        self.ls = {}
+        self.lf = {}
+        self._forward_pass()
+        self._backward_pass()
+
+    # ----- 圖形 -----
+
+    def _topological_order(self):
+        """Kahn 演算法拓撲排序；循環中的任務忽略其相依關係並排在最後"""
+        indegree = {tid: len(p) for tid, p in self.preds.items()}
+        ready = [tid for tid, d in indegree.items() if d == 0]
+        heapq.heapify(ready)
+        order = []
+        while ready:
+            tid = heapq.heappop(ready)
+            order.append(tid)
+            for s in self.succs[tid]:
+                indegree[s] -= 1
+                if indegree[s] == 0:
+                    heapq.heappush(ready, s)
+
+        if len(order) < len(self.tasks):
+            placed = set(order)
+            self.cycles = sorted(tid for tid in self.tasks if tid not in placed)
+            cyclic = set(self.cycles)
+            # 斷開循環內部的邊，保留來自非循環任務的相依
+            for tid in self.cycles:
+                self.preds[tid] = [p for p in self.preds[tid] if p not in cyclic]
+                self.succs[tid] = [s for s in self.succs[tid] if s not in cyclic]
+            order.extend(self.cycles)
+        return order
+
+    def _groups(self):
+        """以 union-find 合併同一生產單及有相依關係的任務：{task_id: 群組代表 id}"""
+        parent = {tid: tid for tid in self.tasks}
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        def union(a, b):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+
+        first_of_order = {}
+        for tid, t in self.tasks.items():
+            order_id = t['production_order_id'] if 'production_order_id' in t.keys() else None
+            if order_id is not None:
+                union(tid, first_of_order.setdefault(order_id, tid))
+            for p in self.preds[tid]:
+                union(tid, p)
+        return {tid: find(tid) for tid in self.tasks}
+
+    # ----- 排程計算 -----
+
+    def _earliest_start(self, tid):
+        if tid in self.fixed:
+            return self.planned[tid]
+        es = self.planned[tid]
+        for p in self.preds[tid]:
+            es = max(es, self.ef[p] + 1)
+        return es
+
+    def _forward_pass(self):
+        for tid in self.order:
+            self.es[tid] = self._earliest_start(tid)
+            self.ef[tid] = self.es[tid] + self.duration[tid] - 1
+
+    def _backward_pass(self):
+        # 各群組以自己（已排定日期任務）的最晚完工日為終點
+        group_end = {}
+        for tid, g in self.group.items():
+            if tid not in self.undated:
+                group_end[g] = max(group_end.get(g, self.ef[tid]), self.ef[tid])
+        for tid in reversed(self.order):
+            lf = group_end.get(self.group[tid], self.ef[tid])
+            for s in self.succs[tid]:
+                if s not in self.undated:
+                    lf = min(lf, self.ls[s] - 1)
+            if tid in self.undated:
+                lf = max(lf, self.ef[tid])
+            self.lf[tid] = lf
+            self.ls[tid] = lf - self.duration[tid] + 1
+
+    def slack(self, tid):
+        return self.ls[tid] - self.es[tid]
+
+    def is_critical(self, tid):
+        return tid not in self.undated and self.slack(tid) <= 0
+
+    def critical_path(self):
+        """要徑上的任務 id（依拓撲順序）"""
+        return [tid for tid in self.order if self.is_critical(tid)]
+
+    # ----- 異動 -----
+
+    def shift_task(self, task_id, new_start=None, new_end=None):
+        """調整單一任務的計畫日期，並將延誤沿後續任務傳遞
+
+        只重新計算受影響的後續任務（依拓撲順序），日期不變的分支即停止傳遞。
+        浮時需要完整的後推，於傳遞完成後重算一次。
+
+        Returns:
+            {task_id: (start_iso, end_iso)}：最早開始/完工日期有變動的任務
+        """
+        if task_id not in self.tasks:
+            raise KeyError(task_id)
+
+        start = _to_ordinal(new_start) if new_start else self.planned[task_id]
+        if new_end:
+            end = _to_ordinal(new_end)
+        else:
+            end = start + self.duration[task_id] - 1
+        self.planned[task_id] = start
+        self.duration[task_id] = max(end - start + 1, 1)
+        self.undated.discard(task_id)
+
+        changes = {}
+        heap = [(self.topo_index[task_id], task_id)]
+        queued = {task_id}
+        while heap:
+            _, tid = heapq.heappop(heap)
+            es = self._earliest_start(tid)
+            ef = es + self.duration[tid] - 1
+            if tid != task_id and es == self.es[tid] and ef == self.ef[tid]:
+                continue
+            if (es != self.es[tid] or ef != self.ef[tid]) and tid not in self.undated:
+                changes[tid] = (_to_iso(es), _to_iso(ef))
+            self.es[tid] = es
+            self.ef[tid] = ef
+            for s in self.succs[tid]:
+                if s not in queued:
+                    queued.add(s)
+                    heapq.heappush(heap, (self.topo_index[s], s))
+
+        self._backward_pass()
+        return changes
+
+    def date_updates(self):
+        """與資料庫日期不同的任務：[(start_date, end_date, task_id)]，供批次寫回
+
+        尚未排定日期的任務不寫回，以免被填入今日日期。
+        """
+        updates = []
+        for tid in self.order:
+            if tid in self.fixed or tid in self.undated:
+                continue
+            t = self.tasks[tid]
+            start, end = _to_iso(self.es[tid]), _to_iso(self.ef[tid])
+            if start != t['start_date'] or end != t['end_date']:
+                updates.append((start, end, tid))
+        return updates
+
+    # ----- 甘特圖 -----
+
+    def gantt_rows(self, task_ids=None):
+        """轉為 GanttChart.update_chart 使用的資料（依排程後日期）"""
+        rows = []
+        ids = self.order if task_ids is None else [i for i in task_ids if i in self.tasks]
+        for tid in ids:
+            t = self.tasks[tid]
+            rows.append({
+                'label': f"{t['product_name']} - {t['task_name']}",
+                'start': _to_iso(self.es[tid]),
+                'end': _to_iso(self.ef[tid]),
+                'progress': t['progress_pct'] or 0,
+                'status': t['status'],
+                'group': t['product_name'],
+                'critical': self.is_critical(tid),
+                'slack': self.slack(tid),
+            })
+        return rows
@@ -0,0 +1,234 @@
+"""查詢 API 用戶端 — 以相同函式簽名呼叫遠端的 db.queries / db.business_queries
+
+install() 會以遠端代理取代 sys.modules 中的 db.queries 與 db.business_queries，
+之後 `from db import queries` 取得的函式簽名與說明都與本機版本相同，
+介面程式不需修改即可在本機檔案與 API 伺服器之間切換（需在匯入介面模組前呼叫）。
+
+唯讀函式以 GET 呼叫並保留 ETag，資料未變更時伺服器回 304，不重送內容。
+多個查詢可用 run_batch() 合併為一次往返；未啟用遠端模式時則直接在本機依序執行。
+"""
+import sys
+import gzip
+import json
+import sqlite3
+import builtins
+import threading
+import functools
+import importlib
+import http.client
+from collections import OrderedDict
+from urllib.parse import urlsplit, quote
+
+from db.api_protocol import API_MODULES, encode, decode, public_functions, is_read_function
+from config import API_SERVER_TOKEN, API_CLIENT_TIMEOUT
+
+# ETag 快取筆數上限
+ETAG_CACHE_SIZE = 512
+
+# 伺服器回傳的例外型別還原為本機例外（其餘以 RemoteQueryError 表示）
+_SQLITE_ERRORS = ('IntegrityError', 'OperationalError', 'DatabaseError', 'ProgrammingError')
+_BUILTIN_ERRORS = ('ValueError', 'KeyError', 'TypeError', 'IndexError', 'LookupError')
+
+
+class RemoteQueryError(RuntimeError):
+    """伺服器端執行失敗（無對應的本機例外型別）"""
+
+
+def _raise_remote(error):
+    kind, message = error.get('type', ''), error.get('message', '')
+    if kind in _SQLITE_ERRORS:
+        raise getattr(sqlite3, kind)(message)
+    if kind in _BUILTIN_ERRORS:
+        raise getattr(builtins, kind)(message)
+    raise RemoteQueryError(f"{kind}: {message}")
+
+
+class ApiClient:
+    """查詢 API 的 HTTP 用戶端（每個執行緒一條 keep-alive 連線）"""
+
+    def __init__(self, base_url, token=API_SERVER_TOKEN, timeout=API_CLIENT_TIMEOUT):
+        parts = urlsplit(base_url)
+        self._host = parts.hostname
+        self._port = parts.port or 80
+        self._prefix = parts.path.rstrip('/')
+        self._token = token
+        self._timeout = timeout
+        self._local = threading.local()
+        self._etags = OrderedDict()     # GET 路徑 -> (etag, payload)
+        self._etag_lock = threading.Lock()
+        self.stats = {'requests': 0, 'not_modified': 0, 'batches': 0}
+
+    # ----- 公開 API -----
+
+    def call(self, module, function, args=(), kwargs=None):
+        """呼叫遠端函式並回傳結果"""
+        kwargs = kwargs or {}
+        if is_read_function(function):
+            path = (f"{self._prefix}/api/{module}/{function}"
+                    f"?args={quote(self._dumps(encode(list(args))))}"
+                    f"&kwargs={quote(self._dumps(encode(kwargs)))}")
+            payload = self._get_cached(path)
+        else:
+            payload = self._request('POST', f"{self._prefix}/api/{module}/{function}",
+                                    {'args': encode(list(args)), 'kwargs': encode(kwargs)})[1]
+        if 'error' in payload:
+            _raise_remote(payload['error'])
+        return decode(payload['result'])
+
+    def batch(self, calls):
+        """一次往返執行多個呼叫
+
+        Args:
+            calls: [(module, function, args, kwargs), ...]
+        Returns:
+            依序的結果；任一筆失敗時拋出該筆的例外
+        """
+        body = {'calls': [{'module': m, 'function': f, 'args': encode(list(a)),
+                           'kwargs': encode(kw or {})} for m, f, a, kw in calls]}
+        self.stats['batches'] += 1
+        results = []
+        for item in self._request('POST', f"{self._prefix}/api/batch", body)[1]['results']:
+            if 'error' in item:
+                _raise_remote(item['error'])
+            results.append(decode(item['result']))
+        return results
+
+    def health(self):
+        return self._request('GET', f"{self._prefix}/api/health")[1]
+
+    def clear_cache(self):
+        with self._etag_lock:
+            self._etags.clear()
+
+    # ----- 內部 -----
+
+    @staticmethod
+    def _dumps(value):
+        return json.dumps(value, ensure_ascii=False, separators=(',', ':'))
+
+    def _get_cached(self, path):
+        with self._etag_lock:
+            cached = self._etags.get(path)
+        headers = {'If-None-Match': cached[0]} if cached else {}
+        status, payload, etag = self._request('GET', path, headers=headers, with_etag=True)
+        if status == 304 and cached:
+            self.stats['not_modified'] += 1
+            with self._etag_lock:
+                self._etags.move_to_end(path)
+            return cached[1]
+        if etag and 'error' not in payload:
+            with self._etag_lock:
+                self._etags[path] = (etag, payload)
+                self._etags.move_to_end(path)
+                while len(self._etags) > ETAG_CACHE_SIZE:
+                    self._etags.popitem(last=False)
+        return payload
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None, headers=None, with_etag=False):
+        send_headers = {'Accept-Encoding': 'gzip'}
+        if self._token:
+            send_headers['X-Api-Token'] = self._token
+        send_headers.update(headers or {})
+        data = None
+        if body is not None:
+            data = self._dumps(body).encode('utf-8')
+            send_headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        self.stats['requests'] += 1
+        # keep-alive 連線可能已被伺服器關閉，失敗時重新連線一次；
+        # POST 可能是寫入，請求送出後才失敗時不重送，以免重複執行
+        for attempt in (0, 1):
+            conn = self._connection()
+            sent = False
+            try:
+                conn.request(method, path, body=data, headers=send_headers)
+                sent = True
+                response = conn.getresponse()
+                raw = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt or (sent and method != 'GET'):
+                    raise
+
+        if response.status == 304:
+            payload = {}
+        else:
+            if response.getheader('Content-Encoding') == 'gzip':
+                raw = gzip.decompress(raw)
+            payload = json.loads(raw) if raw else {}
+            if response.status >= 400 and 'error' not in payload:
+                payload = {'error': {'type': 'HTTPError', 'message': f'HTTP {response.status}'}}
+        if with_etag:
+            return response.status, payload, response.getheader('ETag')
+        return response.status, payload
+
+
+class RemoteModule:
+    """遠端查詢模組代理：公開函式轉呼叫伺服器，其他屬性（常數等）沿用本機模組"""
+
+    def __init__(self, local_module, client):
+        self.__name__ = local_module.__name__
+        self.__doc__ = local_module.__doc__
+        self._local = local_module
+        self._module = local_module.__name__.rsplit('.', 1)[-1]
+        self._client = client
+        for name, fn in public_functions(local_module).items():
+            setattr(self, name, self._proxy(name, fn))
+
+    def _proxy(self, name, fn):
+        client, module = self._client, self._module
+
+        @functools.wraps(fn)
+        def remote(*args, **kwargs):
+            return client.call(module, name, args, kwargs)
+        remote.api_call = (module, name)
+        return remote
+
+    def __getattr__(self, name):
+        return getattr(self._local, name)
+
+
+# 目前啟用的用戶端（None 表示直接使用本機資料庫）
+_client = None
+
+
+def install(base_url):
+    """切換為遠端模式：以代理取代 db.queries 與 db.business_queries"""
+    global _client
+    import db
+    _client = ApiClient(base_url)
+    for name in API_MODULES:
+        remote = RemoteModule(importlib.import_module(f'db.{name}'), _client)
+        sys.modules[f'db.{name}'] = remote
+        setattr(db, name, remote)
+    return _client
+
+
+def get_client():
+    return _client
+
+
+def run_batch(calls):
+    """執行多個查詢：遠端模式合併為一次往返，本機模式依序直接呼叫
+
+    Args:
+        calls: [(函式, args), ...] 或 [(函式, args, kwargs), ...]，
+               函式為 queries / bq 的函式（本機或遠端代理皆可）
+    """
+    normalized = [(c[0], tuple(c[1]), c[2] if len(c) > 2 else {}) for c in calls]
+    if _client is None:
+        return [fn(*args, **kwargs) for fn, args, kwargs in normalized]
+    batch = []
+    for fn, args, kwargs in normalized:
+        module, name = getattr(fn, 'api_call', (fn.__module__.rsplit('.', 1)[-1], fn.__name__))
+        batch.append((module, name, args, kwargs))
+    return _client.batch(batch)
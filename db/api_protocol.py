@@ -0,0 +1,118 @@
+"""查詢 API 通訊協定 — 伺服器與用戶端共用的 JSON 編碼與函式白名單
+
+JSON 無法直接表示的型別以標記物件傳送：
+    sqlite3.Row  → {"__row__": [欄位名稱, 值]}（用戶端還原為 Row，支援 row['欄位'] 與 row[0]）
+    tuple        → {"__tuple__": [...]}
+    set          → {"__set__": [...]}
+    非字串鍵 dict → {"__dict__": [[鍵, 值], ...]}
+    bytes        → {"__bytes__": base64}
+    date/datetime → ISO 字串
+"""
+import base64
+import inspect
+import sqlite3
+from datetime import date, datetime
+
+# 對外提供的查詢模組
+API_MODULES = ('queries', 'business_queries')
+
+# 唯讀函式前綴：可用 GET 呼叫並以 ETag 快取
+READ_PREFIXES = ('get_', 'count_', 'search_', 'suggest_')
+
+
+class Row:
+    """與 sqlite3.Row 相容的唯讀列（欄位名稱不分大小寫）"""
+
+    __slots__ = ('_keys', '_values', '_index')
+
+    def __init__(self, keys, values):
+        self._keys = list(keys)
+        self._values = list(values)
+        self._index = {k.lower(): i for i, k in enumerate(self._keys)}
+
+    def keys(self):
+        return list(self._keys)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            try:
+                return self._values[self._index[key.lower()]]
+            except KeyError:
+                raise IndexError(f"No item with that key: {key}") from None
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._values)
+
+    def __len__(self):
+        return len(self._values)
+
+    def __eq__(self, other):
+        if isinstance(other, (Row, sqlite3.Row)):
+            return self.keys() == list(other.keys()) and list(self) == list(other)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((tuple(self._keys), tuple(self._values)))
+
+    def __repr__(self):
+        return f"Row({dict(zip(self._keys, self._values))!r})"
+
+
+def is_read_function(name):
+    return name.startswith(READ_PREFIXES)
+
+
+def public_functions(module):
+    """模組中可遠端呼叫的函式：{名稱: 函式}（僅限模組本身定義的公開函式）"""
+    return {name: obj for name, obj in vars(module).items()
+            if not name.startswith('_') and inspect.isfunction(obj)
+            and obj.__module__ == module.__name__}
+
+
+def encode(value):
+    """Python 值 → 可 JSON 序列化的值"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (sqlite3.Row, Row)):
+        return {'__row__': [list(value.keys()), [encode(v) for v in value]]}
+    if isinstance(value, list):
+        return [encode(v) for v in value]
+    if isinstance(value, tuple):
+        return {'__tuple__': [encode(v) for v in value]}
+    if isinstance(value, (set, frozenset)):
+        return {'__set__': [encode(v) for v in value]}
+    if isinstance(value, dict):
+        if all(isinstance(k, str) and not k.startswith('__') for k in value):
+            return {k: encode(v) for k, v in value.items()}
+        return {'__dict__': [[encode(k), encode(v)] for k, v in value.items()]}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {'__bytes__': base64.b64encode(bytes(value)).decode('ascii')}
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"無法編碼的型別：{type(value).__name__}")
+
+
+def decode(value):
+    """encode() 的反向轉換"""
+    if isinstance(value, list):
+        return [decode(v) for v in value]
+    if not isinstance(value, dict):
+        return value
+    if len(value) == 1:
+        tag, payload = next(iter(value.items()))
+        if tag == '__row__':
+            return Row(payload[0], [decode(v) for v in payload[1]])
+        if tag == '__tuple__':
+            return tuple(decode(v) for v in payload)
+        if tag == '__set__':
+            return {decode(v) for v in payload}
+        if tag == '__dict__':
+            return {_hashable(decode(k)): decode(v) for k, v in payload}
+        if tag == '__bytes__':
+            return base64.b64decode(payload)
+    return {k: decode(v) for k, v in value.items()}
+
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
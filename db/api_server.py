@@ -0,0 +1,230 @@
+"""查詢 API 伺服器 — 以 JSON over HTTP 提供 db.queries 與 db.business_queries
+
+多台工作站透過網路磁碟直接開啟同一個 SQLite 檔案既慢又有損毀風險；
+改由一台電腦執行本伺服器獨佔資料庫檔案，其他工作站以 db.api_client 呼叫。
+
+啟動：
+    python -m db.api_server [--port 8765]                       # 僅限本機
+    python -m db.api_server --host 0.0.0.0 --token <密鑰>       # 開放其他工作站
+
+伺服器開放所有公開查詢函式（含 update_/delete_ 等寫入函式），
+監聽非本機位址時必須設定 API_SERVER_TOKEN 或 --token，否則拒絕啟動。
+
+端點：
+    GET  /api/health
+    GET  /api/<module>/<function>?args=[...]&kwargs={...}
+         唯讀函式（get_/count_/search_/suggest_），回應帶 ETag；
+         If-None-Match 相同時回傳 304，不重送內容
+    POST /api/<module>/<function>    body {"args": [...], "kwargs": {...}}
+    POST /api/batch                  body {"calls": [{"module", "function", "args", "kwargs"}, ...]}
+         一次往返執行多個呼叫，依序回傳 {"result": ...} 或 {"error": {...}}
+
+參數與結果的編碼見 db.api_protocol。
+"""
+import gzip
+import json
+import hmac
+import hashlib
+import importlib
+import ipaddress
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from db.api_protocol import API_MODULES, encode, decode, public_functions, is_read_function
+from config import API_SERVER_HOST, API_SERVER_PORT, API_SERVER_TOKEN
+
+# 超過此大小且用戶端接受 gzip 時壓縮回應
+_GZIP_MIN_BYTES = 1024
+
+
+class ApiError(Exception):
+    """請求錯誤（對應 HTTP 狀態碼）"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _load_registry():
+    """{module: {function: 函式}}"""
+    return {name: public_functions(importlib.import_module(f'db.{name}'))
+            for name in API_MODULES}
+
+
+def _is_loopback(host):
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _error_payload(e):
+    return {'type': type(e).__name__, 'message': str(e)}
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """查詢 API 請求處理（ThreadingHTTPServer 每個連線一個執行緒）"""
+
+    protocol_version = 'HTTP/1.1'
+    server_version = 'DMSQueryAPI/1.0'
+
+    # ----- HTTP 方法 -----
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def log_message(self, format, *args):
+        pass    # 不逐筆輸出存取紀錄
+
+    # ----- 處理 -----
+
+    def _handle(self, handler):
+        try:
+            token = self.server.token
+            if token and not hmac.compare_digest(self.headers.get('X-Api-Token', ''), token):
+                raise ApiError(401, '未授權')
+            status, payload, cacheable = handler()
+        except ApiError as e:
+            status, payload, cacheable = e.status, {'error': _error_payload(e)}, False
+        except Exception as e:
+            print(f"[API 失敗] {self.path} → {e}")
+            status, payload, cacheable = 500, {'error': _error_payload(e)}, False
+        self._send_json(status, payload, cacheable)
+
+    def _route(self):
+        parts = [p for p in urlsplit(self.path).path.split('/') if p]
+        if not parts or parts[0] != 'api':
+            raise ApiError(404, f'找不到路徑：{self.path}')
+        return parts[1:]
+
+    def _lookup(self, module, function):
+        fn = self.server.registry.get(module, {}).get(function)
+        if fn is None:
+            raise ApiError(404, f'找不到函式：{module}.{function}')
+        return fn
+
+    def _get(self):
+        route = self._route()
+        if route == ['health']:
+            return 200, {'status': 'ok', 'modules': list(self.server.registry)}, False
+        if len(route) != 2:
+            raise ApiError(404, f'找不到路徑：{self.path}')
+        module, function = route
+        if not is_read_function(function):
+            raise ApiError(405, f'{function} 需以 POST 呼叫')
+        query = parse_qs(urlsplit(self.path).query)
+        try:
+            args = decode(json.loads(query.get('args', ['[]'])[0]))
+            kwargs = decode(json.loads(query.get('kwargs', ['{}'])[0]))
+        except ValueError as e:
+            raise ApiError(400, f'參數格式錯誤：{e}')
+        result = self._lookup(module, function)(*args, **kwargs)
+        return 200, {'result': encode(result)}, True
+
+    def _post(self):
+        route = self._route()
+        body = self._read_body()
+        if route == ['batch']:
+            return 200, {'results': [self._call_one(c) for c in body.get('calls', [])]}, False
+        if len(route) != 2:
+            raise ApiError(404, f'找不到路徑：{self.path}')
+        fn = self._lookup(*route)
+        result = fn(*decode(body.get('args', [])), **decode(body.get('kwargs', {})))
+        return 200, {'result': encode(result)}, False
+
+    def _call_one(self, call):
+        """批次中的單一呼叫；錯誤只影響該筆"""
+        try:
+            fn = self._lookup(call.get('module'), call.get('function'))
+            result = fn(*decode(call.get('args', [])), **decode(call.get('kwargs', {})))
+            return {'result': encode(result)}
+        except Exception as e:
+            return {'error': _error_payload(e)}
+
+    def _read_body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b'{}'
+        if self.headers.get('Content-Encoding') == 'gzip':
+            raw = gzip.decompress(raw)
+        try:
+            return json.loads(raw)
+        except ValueError as e:
+            raise ApiError(400, f'JSON 格式錯誤：{e}')
+
+    def _send_json(self, status, payload, cacheable):
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json; charset=utf-8'}
+
+        if cacheable:
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+            headers['ETag'] = etag
+            headers['Cache-Control'] = 'no-cache'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                for key, value in headers.items():
+                    if key != 'Content-Type':
+                        self.send_header(key, value)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+
+        if len(body) >= _GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body, compresslevel=5)
+            headers['Content-Encoding'] = 'gzip'
+
+        self.send_response(status)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def create_server(host=API_SERVER_HOST, port=API_SERVER_PORT, token=API_SERVER_TOKEN):
+    """建立（尚未啟動的）API 伺服器；port=0 時由系統指派
+
+    Raises:
+        ValueError: 監聽非本機位址卻未設定 token
+    """
+    if not token and not _is_loopback(host):
+        raise ValueError(f"監聽 {host or '所有介面'} 時必須設定 API_SERVER_TOKEN（或 --token）")
+    server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+    server.daemon_threads = True
+    server.token = token
+    server.registry = _load_registry()
+    return server
+
+
+def serve(host=API_SERVER_HOST, port=API_SERVER_PORT, token=API_SERVER_TOKEN):
+    """初始化資料庫並持續提供服務（Ctrl+C 結束）"""
+    try:
+        server = create_server(host, port, token)
+    except ValueError as e:
+        print(f"[API 伺服器啟動失敗] {e}")
+        return
+    from db.database import init_db
+    init_db()
+    count = sum(len(fns) for fns in server.registry.values())
+    print(f"查詢 API 伺服器啟動：http://{host}:{server.server_address[1]}/api/（{count} 個函式）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='查詢 API 伺服器')
+    parser.add_argument('--host', default=API_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=API_SERVER_PORT)
+    parser.add_argument('--token', default=API_SERVER_TOKEN,
+                        help='用戶端需以 X-Api-Token 標頭帶入；監聽非本機位址時必填')
+    opts = parser.parse_args()
+    serve(opts.host, opts.port, opts.token)
@@ -4,6 +4,9 @@
 """
 from datetime import datetime
 from db.database import get_connection
+from db.cache import cached, invalidates
+from db.write_coordinator import serialized_write, begin_write
+from config import AR_OPEN_STATUSES
 
 
 # ==================== 通用工具 ====================
@@ -39,6 +42,7 @@ def _today():
 
 # ==================== 供應商 ====================
 
+@cached('suppliers')
 def get_all_suppliers():
     conn = get_connection()
     try:
@@ -47,6 +51,7 @@ def get_all_suppliers():
         conn.close()
 
 
+@cached('suppliers')
 def get_supplier(supplier_id):
     conn = get_connection()
     try:
@@ -55,6 +60,7 @@ def get_supplier(supplier_id):
         conn.close()
 
 
+@invalidates('suppliers')
 def add_supplier(name, code=None, contact=None, phone=None, email=None,
                  address=None, payment_terms=None, notes=None):
     conn = get_connection()
@@ -70,6 +76,7 @@ def add_supplier(name, code=None, contact=None, phone=None, email=None,
         conn.close()
 
 
+@invalidates('suppliers')
 def update_supplier(supplier_id, **kwargs):
     conn = get_connection()
     try:
@@ -83,6 +90,7 @@ def update_supplier(supplier_id, **kwargs):
         conn.close()
 
 
+@invalidates('suppliers')
 def delete_supplier(supplier_id):
     conn = get_connection()
     try:
@@ -402,6 +410,7 @@ def get_customer_order(order_id):
         conn.close()
 
 
+@invalidates('customer_orders')
 def add_customer_order(order_number, client_id, order_date, quotation_id=None,
                        po_number=None, delivery_date=None, currency='TWD',
                        payment_terms=None, delivery_terms=None, status='新訂單',
@@ -422,6 +431,7 @@ def add_customer_order(order_number, client_id, order_date, quotation_id=None,
         conn.close()
 
 
+@invalidates('customer_orders')
 def update_customer_order(order_id, **kwargs):
     conn = get_connection()
     try:
@@ -435,6 +445,7 @@ def update_customer_order(order_id, **kwargs):
         conn.close()
 
 
+@invalidates('customer_orders')
 def delete_customer_order(order_id):
     conn = get_connection()
     try:
@@ -684,6 +695,155 @@ def recalculate_invoice(invoice_id, tax_rate=0.05):
         conn.close()
 
 
+# ==================== 應收帳款 ====================
+
+def mark_overdue_invoices(as_of=None):
+    """將過了到期日仍未付款的發票標為「逾期」（單一 UPDATE）
+
+    只更新狀態確實改變的發票（payment_status = '未付'），不重複寫入已逾期的發票，
+    也不會產生多餘的 change_log 紀錄；沒有需要更新的發票時不取得寫入鎖。
+    部分付款的發票保留原狀態，帳齡仍依到期日計算。
+    Returns: 更新筆數
+    """
+    as_of = as_of or _today()
+    conn = get_connection()
+    try:
+        if not conn.execute(
+                "SELECT 1 FROM invoices WHERE payment_status = '未付' AND due_date < ? LIMIT 1",
+                (as_of,)).fetchone():
+            return 0
+        cursor = conn.execute(
+            """UPDATE invoices SET payment_status = '逾期', updated_at = ?
+               WHERE payment_status = '未付' AND due_date < ?""",
+            (_now(), as_of)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def get_ar_aging(bucket_bounds, as_of=None, client_id=None):
+    """應收帳款帳齡：每客戶 × 幣別一次分組查詢
+
+    帳齡天數 = as_of − 到期日（無到期日時以開票日計），未到期者歸入第一桶。
+    bucket_bounds: 遞增的天數上限，例如 (30, 60, 90) → 0-30 / 31-60 / 61-90 / 90+
+    Returns:
+        [Row(client_id, client_name, currency, invoice_count, total_amount, max_days,
+             b0 … bN)]，bN 為超過最後一個上限的金額；依未收總額遞減排序
+    """
+    as_of = as_of or _today()
+    bucket_case = "CASE " + " ".join(
+        f"WHEN days <= ? THEN {i}" for i in range(len(bucket_bounds))
+    ) + f" ELSE {len(bucket_bounds)} END"
+    bucket_sums = ", ".join(
+        f"SUM(CASE WHEN bucket = {i} THEN amount ELSE 0 END) AS b{i}"
+        for i in range(len(bucket_bounds) + 1))
+    statuses = ', '.join('?' * len(AR_OPEN_STATUSES))
+    where = f"payment_status IN ({statuses})"
+    params = [as_of, *AR_OPEN_STATUSES]
+    if client_id:
+        where += " AND client_id = ?"
+        params.append(client_id)
+
+    conn = get_connection()
+    try:
+        return conn.execute(
+            f"""WITH d AS (
+                    SELECT client_id, COALESCE(currency, 'TWD') AS currency,
+                           COALESCE(total_amount, 0) AS amount,
+                           CAST(julianday(?) - julianday(COALESCE(due_date, invoice_date))
+                                AS INTEGER) AS days
+                    FROM invoices
+                    WHERE {where}
+                ),
+                b AS (SELECT d.*, {bucket_case} AS bucket FROM d)
+                SELECT b.client_id, c.name as client_name, b.currency,
+                       COUNT(*) AS invoice_count, SUM(amount) AS total_amount,
+                       MAX(days) AS max_days, {bucket_sums}
+                FROM b
+                LEFT JOIN clients c ON b.client_id = c.id
+                GROUP BY b.client_id, b.currency
+                ORDER BY total_amount DESC""",
+            params + list(bucket_bounds)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def get_ar_summary():
+    """每客戶 × 幣別的未收款與逾期總額（讀取觸發器維護的 ar_summary，不掃描發票）"""
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT s.*, c.name as client_name
+               FROM ar_summary s
+               LEFT JOIN clients c ON s.client_id = c.id
+               ORDER BY s.open_amount DESC"""
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+# ==================== 批次文件 ====================
+
+# 批次輸出的單據類型 → (表頭表, 單號欄, 明細表, 明細外鍵, 日期欄, 狀態欄)
+_BATCH_DOCUMENTS = {
+    'invoice': ('invoices', 'invoice_number', 'invoice_items', 'invoice_id',
+                'invoice_date', 'payment_status'),
+    'quotation': ('quotations', 'quotation_number', 'quotation_items', 'quotation_id',
+                  'created_at', 'status'),
+}
+
+
+def get_batch_documents(kind, date_from=None, date_to=None, client_id=None, status=None):
+    """批次輸出用：依期間、客戶、狀態取得單據表頭與全部明細（共兩次查詢，不逐張查詢）
+
+    Args:
+        kind: 'invoice' 或 'quotation'
+        date_from, date_to: 日期範圍 'YYYY-MM-DD'（含兩端；發票依開票日、報價單依建立日）
+    Returns:
+        (表頭列（含 client_name，依單號排序）, {單據 id: [明細列（依項次排序）]})
+    """
+    table, number_col, item_table, fk, date_col, status_col = _BATCH_DOCUMENTS[kind]
+    where, params = [], []
+    if date_from:
+        where.append(f"h.{date_col} >= ?")
+        params.append(date_from)
+    if date_to:
+        where.append(f"h.{date_col} < date(?, '+1 day')")
+        params.append(date_to)
+    if client_id:
+        where.append("h.client_id = ?")
+        params.append(client_id)
+    if status:
+        where.append(f"h.{status_col} = ?")
+        params.append(status)
+    where_sql = ' AND '.join(where) or '1=1'
+
+    conn = get_connection()
+    try:
+        headers = conn.execute(
+            f"""SELECT h.*, c.name as client_name
+                FROM {table} h
+                LEFT JOIN clients c ON h.client_id = c.id
+                WHERE {where_sql}
+                ORDER BY h.{number_col}""",
+            params
+        ).fetchall()
+        items = {}
+        if headers:
+            for row in conn.execute(
+                    f"""SELECT i.* FROM {item_table} i
+                        WHERE i.{fk} IN (SELECT h.id FROM {table} h WHERE {where_sql})
+                        ORDER BY i.{fk}, i.item_no""",
+                    params):
+                items.setdefault(row[fk], []).append(row)
+        return headers, items
+    finally:
+        conn.close()
+
+
 # ==================== 出口文件 ====================
 
 def get_all_export_documents(status=None, order_id=None):
@@ -767,6 +927,111 @@ def delete_export_document(doc_id):
         conn.close()
 
 
+def get_export_pack_data(order_id):
+    """出口文件組用：取得訂單（含客戶名稱）、訂單明細與該訂單最新的一張發票及其明細
+
+    Returns:
+        (訂單列, [訂單明細列], 發票列或 None, [發票明細列])，明細皆依項次排序；
+        訂單不存在時訂單列為 None
+    """
+    conn = get_connection()
+    try:
+        order = conn.execute(
+            """SELECT o.*, c.name as client_name
+               FROM customer_orders o
+               LEFT JOIN clients c ON o.client_id = c.id
+               WHERE o.id = ?""",
+            (order_id,)
+        ).fetchone()
+        if order is None:
+            return None, [], None, []
+        items = conn.execute(
+            "SELECT * FROM order_items WHERE order_id = ? ORDER BY item_no",
+            (order_id,)
+        ).fetchall()
+        invoice = conn.execute(
+            """SELECT * FROM invoices
+               WHERE order_id = ? AND payment_status != '已作廢'
+               ORDER BY invoice_date DESC, id DESC LIMIT 1""",
+            (order_id,)
+        ).fetchone()
+        invoice_items = []
+        if invoice is not None:
+            invoice_items = conn.execute(
+                "SELECT * FROM invoice_items WHERE invoice_id = ? ORDER BY item_no",
+                (invoice['id'],)
+            ).fetchall()
+        return order, items, invoice, invoice_items
+    finally:
+        conn.close()
+
+
+# 出口文件組寫入的欄位（doc_type、order_id 之外）
+_EXPORT_PACK_FIELDS = ('invoice_id', 'doc_number', 'issue_date', 'destination_country',
+                       'shipping_method', 'shipping_date', 'vessel_name', 'bl_number',
+                       'container_number', 'status', 'file_path')
+
+
+@serialized_write()
+def save_export_pack(order_id, docs):
+    """一次寫入一張訂單的整組出口文件（單一交易）
+
+    該訂單已有同類型文件時更新最新的一筆（值為 None 的欄位保留原值，
+    不會覆蓋手動附加的檔案），否則新增。狀態只在新增時寫入，
+    重新產生不會把已手動推進的狀態（已寄出、已歸檔）改回。
+
+    Args:
+        docs: [{'doc_type': ..., 欄位: 值}]，欄位見 _EXPORT_PACK_FIELDS
+    Returns:
+        {doc_type: 文件 id}
+    """
+    conn = get_connection()
+    try:
+        # 先取得寫入鎖再讀取既有文件，同時產生的兩組文件不會都判定為「新增」
+        begin_write(conn)
+        existing = {r['doc_type']: r['id'] for r in conn.execute(
+            """SELECT doc_type, MAX(id) as id FROM export_documents
+               WHERE order_id = ? GROUP BY doc_type""",
+            (order_id,)
+        )}
+        now = _now()
+        update_fields = [f for f in _EXPORT_PACK_FIELDS if f != 'status']
+        updates, inserts = [], []
+        for doc in docs:
+            if doc['doc_type'] in existing:
+                updates.append([doc.get(f) for f in update_fields]
+                               + [now, existing[doc['doc_type']]])
+            else:
+                inserts.append([order_id, doc['doc_type']]
+                               + [doc.get(f) for f in _EXPORT_PACK_FIELDS])
+
+        if updates:
+            fields = ', '.join(f"{f} = COALESCE(?, {f})" for f in update_fields)
+            conn.executemany(
+                f"UPDATE export_documents SET {fields}, updated_at = ? WHERE id = ?", updates
+            )
+        if inserts:
+            placeholders = ', '.join(
+                "COALESCE(?, '準備中')" if f == 'status' else '?' for f in _EXPORT_PACK_FIELDS)
+            conn.executemany(
+                f"""INSERT INTO export_documents
+                    (order_id, doc_type, {', '.join(_EXPORT_PACK_FIELDS)})
+                    VALUES (?, ?, {placeholders})""",
+                inserts
+            )
+        conn.commit()
+
+        types = [doc['doc_type'] for doc in docs]
+        return {r['doc_type']: r['id'] for r in conn.execute(
+            f"""SELECT doc_type, MAX(id) as id FROM export_documents
+                WHERE order_id = ? AND doc_type IN ({', '.join('?' * len(types))})
+                GROUP BY doc_type""",
+            [order_id] + types
+        )}
+    finally:
+        conn.close()
+
+
 # ==================== 生產管理 ====================
 
 def get_all_production_orders(status=None, order_id=None):
@@ -875,6 +1140,30 @@ def get_all_production_tasks_for_gantt(status_filter=None):
         conn.close()
 
 
+def get_production_task(task_id):
+    conn = get_connection()
+    try:
+        return conn.execute("SELECT * FROM production_tasks WHERE id = ?", (task_id,)).fetchone()
+    finally:
+        conn.close()
+
+
+def update_production_task_dates(updates):
+    """批次寫回排程日期。updates: [(start_date, end_date, task_id), ...]"""
+    if not updates:
+        return 0
+    conn = get_connection()
+    try:
+        conn.executemany(
+            "UPDATE production_tasks SET start_date = ?, end_date = ? WHERE id = ?",
+            updates
+        )
+        conn.commit()
+        return len(updates)
+    finally:
+        conn.close()
+
+
 def add_production_task(production_order_id, task_name, department=None,
                         assignee=None, start_date=None, end_date=None,
                         progress_pct=0, depends_on=None, status='待開始',
@@ -917,6 +1206,7 @@ def delete_production_task(task_id):
 
 # ==================== 機器 ====================
 
+@cached('machines')
 def get_all_machines(status=None, department=None):
     conn = get_connection()
     try:
@@ -934,6 +1224,7 @@ def get_all_machines(status=None, department=None):
         conn.close()
 
 
+@cached('machines')
 def get_machine(machine_id):
     conn = get_connection()
     try:
@@ -942,6 +1233,7 @@ def get_machine(machine_id):
         conn.close()
 
 
+@invalidates('machines')
 def add_machine(machine_code, machine_name, model=None, manufacturer=None,
                 purchase_date=None, location=None, department=None,
                 status='正常', notes=None):
@@ -961,6 +1253,7 @@ def add_machine(machine_code, machine_name, model=None, manufacturer=None,
         conn.close()
 
 
+@invalidates('machines')
 def update_machine(machine_id, **kwargs):
     conn = get_connection()
     try:
@@ -974,6 +1267,7 @@ def update_machine(machine_id, **kwargs):
         conn.close()
 
 
+@invalidates('machines')
 def delete_machine(machine_id):
     conn = get_connection()
     try:
@@ -1067,6 +1361,64 @@ def delete_maintenance_record(record_id):
         conn.close()
 
 
+# ==================== 產能負荷 ====================
+
+def get_tasks_for_capacity(start_date, end_date):
+    """取得與期間重疊、尚未完成的生產任務（產能負荷計算用）"""
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT department, start_date, end_date, progress_pct
+               FROM production_tasks
+               WHERE status NOT IN ('已完成', '已取消')
+                 AND department IS NOT NULL AND department != ''
+                 AND start_date IS NOT NULL AND end_date IS NOT NULL
+                 AND start_date <= ? AND end_date >= ?""",
+            (end_date, start_date)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def get_machine_counts_by_department():
+    """各部門可用機器數（排除已報廢、停用）"""
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT department, COUNT(*) as machine_count
+               FROM machines
+               WHERE status NOT IN ('已報廢', '停用')
+                 AND department IS NOT NULL AND department != ''
+               GROUP BY department"""
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def get_downtime_for_capacity(start_date, end_date):
+    """取得與期間重疊的停機紀錄，含機器部門與狀態
+
+    未完成的紀錄 completed_at 為 NULL，由呼叫端視為持續停機至今日。
+    """
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT m.department, m.status as machine_status,
+                      COALESCE(mr.started_at, mr.reported_at) as down_from,
+                      mr.completed_at as down_to,
+                      mr.downtime_hours, mr.status
+               FROM maintenance_records mr
+               JOIN machines m ON mr.machine_id = m.id
+               WHERE m.status NOT IN ('已報廢', '停用')
+                 AND m.department IS NOT NULL AND m.department != ''
+                 AND date(COALESCE(mr.started_at, mr.reported_at)) <= ?
+                 AND (mr.completed_at IS NULL OR date(mr.completed_at) >= ?)""",
+            (end_date, start_date)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
 # ==================== 儀表板統計 ====================
 
 def get_dashboard_stats():
@@ -1082,11 +1434,14 @@ def get_dashboard_stats():
             "SELECT COUNT(*) as c FROM customer_orders").fetchone()['c']
         stats['order_active'] = conn.execute(
             "SELECT COUNT(*) as c FROM customer_orders WHERE status IN ('新訂單', '生產中')").fetchone()['c']
-        stats['invoice_unpaid'] = conn.execute(
-            "SELECT COUNT(*) as c FROM invoices WHERE payment_status IN ('未付', '逾期')").fetchone()['c']
-        stats['invoice_unpaid_amount'] = conn.execute(
-            "SELECT COALESCE(SUM(total_amount), 0) as t FROM invoices WHERE payment_status IN ('未付', '逾期')"
-        ).fetchone()['t']
+        # 未收款沿用原定義（未付、逾期）；部分付款的發票只列在帳齡表，不以全額計入
+        ar = conn.execute(
+            """SELECT COUNT(*) as c, COALESCE(SUM(total_amount), 0) as t,
+                      COALESCE(SUM(payment_status = '逾期'), 0) as oc
+               FROM invoices WHERE payment_status IN ('未付', '逾期')""").fetchone()
+        stats['invoice_unpaid'] = ar['c']
+        stats['invoice_unpaid_amount'] = ar['t']
+        stats['invoice_overdue'] = ar['oc']
         stats['production_active'] = conn.execute(
             "SELECT COUNT(*) as c FROM production_orders WHERE status IN ('生產中', '待排程')").fetchone()['c']
         stats['maintenance_pending'] = conn.execute(
@@ -1106,6 +1461,7 @@ def get_dashboard_stats():
 
 # ==================== 客戶查詢（業務擴充） ====================
 
+@cached('clients')
 def get_all_clients_for_combo():
     """取得客戶清單供下拉選單使用"""
     conn = get_connection()
@@ -1115,6 +1471,7 @@ def get_all_clients_for_combo():
         conn.close()
 
 
+@cached('customer_orders')
 def get_all_orders_for_combo():
     """取得訂單清單供下拉選單使用"""
     conn = get_connection()
@@ -1148,6 +1505,7 @@ def get_all_invoices_for_combo():
         conn.close()
 
 
+@cached('machines')
 def get_all_machines_for_combo():
     """取得機器清單供下拉選單使用"""
     conn = get_connection()
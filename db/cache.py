@@ -0,0 +1,104 @@
+"""行程內實體快取 — 客戶、專案、部門、供應商、機器等少量且常用的查詢結果
+
+讀取函式以 @cached('實體') 標記，結果依 (函式, 參數) 快取；
+新增/修改/刪除函式以 @invalidates('實體', ...) 標記，寫入成功後遞增該實體版本並清除快取。
+
+載入期間若版本已變更（其他執行緒剛寫入），結果不會寫回快取，避免存入過期資料。
+多台電腦共用資料庫時，其他工作站的修改以 ENTITY_CACHE_TTL 秒為上限反映。
+"""
+import time
+import threading
+import functools
+from config import ENTITY_CACHE_TTL
+
+
+class EntityCache:
+    """以實體版本控制失效的查詢結果快取"""
+
+    def __init__(self, ttl=ENTITY_CACHE_TTL):
+        self.ttl = ttl
+        self.enabled = True
+        self._lock = threading.Lock()
+        self._versions = {}   # entity -> int
+        self._entries = {}    # (entity, key) -> (version, expires_at, value)
+        self._stats = {}      # entity -> {'hits': n, 'misses': n, 'invalidations': n}
+
+    def _stat(self, entity):
+        return self._stats.setdefault(entity, {'hits': 0, 'misses': 0, 'invalidations': 0})
+
+    def get_or_load(self, entity, key, loader):
+        if not self.enabled:
+            return loader()
+
+        now = time.monotonic()
+        with self._lock:
+            version = self._versions.get(entity, 0)
+            entry = self._entries.get((entity, key))
+            if entry and entry[0] == version and entry[1] > now:
+                self._stat(entity)['hits'] += 1
+                return entry[2]
+            self._stat(entity)['misses'] += 1
+
+        value = loader()
+
+        with self._lock:
+            if self._versions.get(entity, 0) == version:
+                self._entries[(entity, key)] = (version, now + self.ttl, value)
+        return value
+
+    def invalidate(self, *entities):
+        with self._lock:
+            for entity in entities:
+                self._versions[entity] = self._versions.get(entity, 0) + 1
+                self._stat(entity)['invalidations'] += 1
+            self._entries = {k: v for k, v in self._entries.items()
+                             if k[0] not in entities}
+
+    def clear(self):
+        with self._lock:
+            for entity in list(self._versions):
+                self._versions[entity] += 1
+            self._entries.clear()
+
+    def stats(self):
+        """取得各實體命中統計：{entity: {'hits', 'misses', 'invalidations', 'hit_rate'}}"""
+        with self._lock:
+            result = {}
+            for entity, s in self._stats.items():
+                total = s['hits'] + s['misses']
+                result[entity] = dict(s, hit_rate=(s['hits'] / total) if total else 0.0)
+            return result
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# 全域快取實例
+entity_cache = EntityCache()
+
+
+def cached(entity):
+    """讀取函式裝飾器：結果依實體版本快取"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, args, tuple(sorted(kwargs.items())))
+            value = entity_cache.get_or_load(entity, key, lambda: fn(*args, **kwargs))
+            # fetchall() 結果為 list，回傳副本避免呼叫端修改到快取內容
+            return list(value) if isinstance(value, list) else value
+        return wrapper
+    return decorator
+
+
+def invalidates(*entities):
+    """寫入函式裝飾器：執行完成後使相關實體快取失效"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                entity_cache.invalidate(*entities)
+        return wrapper
+    return decorator
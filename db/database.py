@@ -1,11 +1,11 @@
 import sqlite3
 import os
-from config import DB_PATH
+from config import DB_PATH, DB_BUSY_TIMEOUT_MS, AR_OPEN_STATUSES
 
 
 def get_connection():
-    """取得資料庫連線"""
-    conn = sqlite3.connect(DB_PATH)
+    """取得資料庫連線（其他工作站寫入中時最多等待 DB_BUSY_TIMEOUT_MS）"""
+    conn = sqlite3.connect(DB_PATH, timeout=DB_BUSY_TIMEOUT_MS / 1000)
     conn.row_factory = sqlite3.Row
     conn.execute("PRAGMA foreign_keys = ON")
     conn.execute("PRAGMA journal_mode = WAL")
@@ -72,6 +72,43 @@ def init_db():
             created_at  TEXT DEFAULT (datetime('now','localtime'))
         );
 
+        -- 內容定址檔案庫（以 SHA-256 為鍵，ref_count 由 revisions 觸發器維護）
+        CREATE TABLE IF NOT EXISTS blobs (
+            hash        TEXT PRIMARY KEY,
+            size        INTEGER NOT NULL DEFAULT 0,
+            ref_count   INTEGER NOT NULL DEFAULT 0,
+            created_at  TEXT DEFAULT (datetime('now','localtime'))
+        );
+
+        -- 版次差異儲存（舊版次以相對於較新版次的壓縮差異保存）
+        CREATE TABLE IF NOT EXISTS revision_deltas (
+            revision_id       INTEGER PRIMARY KEY REFERENCES revisions(id) ON DELETE CASCADE,
+            base_revision_id  INTEGER NOT NULL REFERENCES revisions(id) ON DELETE CASCADE,
+            delta             BLOB NOT NULL,
+            delta_size        INTEGER NOT NULL DEFAULT 0,
+            full_size         INTEGER NOT NULL DEFAULT 0,
+            created_at        TEXT DEFAULT (datetime('now','localtime'))
+        );
+
+        -- 圖檔文字內容索引（以檔案雜湊為鍵，相同內容只擷取一次；全文在 drawing_content_fts）
+        CREATE TABLE IF NOT EXISTS file_texts (
+            id            INTEGER PRIMARY KEY AUTOINCREMENT,
+            file_hash     TEXT NOT NULL UNIQUE,
+            extractor     TEXT,
+            char_count    INTEGER NOT NULL DEFAULT 0,
+            error         TEXT,
+            extracted_at  TEXT DEFAULT (datetime('now','localtime'))
+        );
+
+        -- 圖面縮圖感知雜湊（64 位元，以有號整數儲存；相似度搜尋用）
+        CREATE TABLE IF NOT EXISTS image_hashes (
+            drawing_id    INTEGER PRIMARY KEY REFERENCES drawings(id) ON DELETE CASCADE,
+            phash         INTEGER NOT NULL,
+            dhash         INTEGER NOT NULL,
+            thumb_mtime   REAL NOT NULL DEFAULT 0,
+            updated_at    TEXT DEFAULT (datetime('now','localtime'))
+        );
+
         -- 存取紀錄資料表
         CREATE TABLE IF NOT EXISTS access_logs (
             id          INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -130,6 +167,36 @@ def init_db():
             created_at    TEXT DEFAULT (datetime('now','localtime'))
         );
 
+        -- 發行時效彙總（依完成日、耗時分桶累加，儀表板不需重掃歷程）
+        CREATE TABLE IF NOT EXISTS circulation_sla_rollup (
+            flow_type     TEXT NOT NULL,
+            group_key     TEXT NOT NULL,
+            day           TEXT NOT NULL,
+            bucket        INTEGER NOT NULL,
+            count         INTEGER NOT NULL DEFAULT 0,
+            total_hours   REAL NOT NULL DEFAULT 0,
+            max_hours     REAL NOT NULL DEFAULT 0,
+            over_sla      INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (flow_type, group_key, day, bucket)
+        );
+
+        -- 增量彙總進度（已處理到的來源資料 id）
+        CREATE TABLE IF NOT EXISTS analytics_watermarks (
+            name          TEXT PRIMARY KEY,
+            last_id       INTEGER NOT NULL DEFAULT 0,
+            updated_at    TEXT
+        );
+
+        -- 資料異動紀錄（由觸發器寫入，seq 單調遞增；輪詢 seq > 上次位置即可取得新異動）
+        CREATE TABLE IF NOT EXISTS change_log (
+            seq           INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_name    TEXT NOT NULL,
+            row_id        INTEGER NOT NULL,
+            op            TEXT NOT NULL,
+            drawing_id    INTEGER,
+            changed_at    TEXT DEFAULT (datetime('now','localtime'))
+        );
+
         -- ==================== 供應商 ====================
 
         CREATE TABLE IF NOT EXISTS suppliers (
@@ -377,15 +444,22 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_projects_client ON projects(client_id);
         CREATE INDEX IF NOT EXISTS idx_drawings_project ON drawings(project_id);
         CREATE INDEX IF NOT EXISTS idx_revisions_drawing ON revisions(drawing_id);
+        CREATE INDEX IF NOT EXISTS idx_revision_deltas_base ON revision_deltas(base_revision_id);
         CREATE INDEX IF NOT EXISTS idx_drawings_number ON drawings(drawing_number);
+        -- 分面搜尋計數：覆蓋狀態/類型/建立日期，不必讀取圖面資料列
+        CREATE INDEX IF NOT EXISTS idx_drawings_facets ON drawings(project_id, status, drawing_type, created_at);
         CREATE INDEX IF NOT EXISTS idx_access_logs_drawing ON access_logs(drawing_id);
         CREATE INDEX IF NOT EXISTS idx_access_logs_user ON access_logs(user_name);
         CREATE INDEX IF NOT EXISTS idx_circulation_orders_drawing ON circulation_orders(drawing_id);
         CREATE INDEX IF NOT EXISTS idx_circulation_tasks_order ON circulation_tasks(order_id);
+        CREATE INDEX IF NOT EXISTS idx_circulation_tasks_status_dept ON circulation_tasks(status, department);
+        CREATE INDEX IF NOT EXISTS idx_circulation_tasks_assignee_status ON circulation_tasks(assignee, status);
+        CREATE INDEX IF NOT EXISTS idx_revisions_drawing_rev ON revisions(drawing_id, rev_code);
         CREATE INDEX IF NOT EXISTS idx_circulation_logs_order ON circulation_logs(order_id);
 
         -- 業務管理索引
         CREATE INDEX IF NOT EXISTS idx_quotations_client ON quotations(client_id);
+        CREATE INDEX IF NOT EXISTS idx_quotations_created ON quotations(created_at);
         CREATE INDEX IF NOT EXISTS idx_quotation_items_quotation ON quotation_items(quotation_id);
         CREATE INDEX IF NOT EXISTS idx_pr_items_pr ON pr_items(pr_id);
         CREATE INDEX IF NOT EXISTS idx_pr_items_supplier ON pr_items(supplier_id);
@@ -394,6 +468,9 @@ def init_db():
         CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items(order_id);
         CREATE INDEX IF NOT EXISTS idx_invoices_order ON invoices(order_id);
         CREATE INDEX IF NOT EXISTS idx_invoices_client ON invoices(client_id);
+        CREATE INDEX IF NOT EXISTS idx_invoices_date ON invoices(invoice_date);
+        -- 逾期檢查與帳齡分析：依付款狀態 + 到期日定位
+        CREATE INDEX IF NOT EXISTS idx_invoices_status_due ON invoices(payment_status, due_date);
         CREATE INDEX IF NOT EXISTS idx_invoice_items_invoice ON invoice_items(invoice_id);
         CREATE INDEX IF NOT EXISTS idx_export_docs_order ON export_documents(order_id);
         CREATE INDEX IF NOT EXISTS idx_export_docs_invoice ON export_documents(invoice_id);
@@ -450,6 +527,16 @@ def init_db():
     # 安全新增欄位（支援資料庫升級）
     _migrate_columns(conn)
 
+    # 依賴新增欄位的索引與觸發器
+    _create_post_migration_objects(conn)
+
+    # 全域搜尋索引、圖檔內容索引
+    _create_global_search(conn)
+    _create_content_search(conn)
+
+    # 應收帳款彙總
+    _create_ar_summary(conn)
+
     conn.close()
 
 
@@ -470,6 +557,8 @@ def _migrate_columns(conn):
         ("clients", "address", "TEXT"),
         ("clients", "tax_id", "TEXT"),
         ("clients", "fax", "TEXT"),
+        # revisions: 內容定址檔案雜湊
+        ("revisions", "file_hash", "TEXT"),
     ]
     for table, col, col_type in migrations:
         try:
@@ -477,3 +566,278 @@ def _migrate_columns(conn):
             conn.commit()
         except Exception:
             pass
+
+
+def _create_post_migration_objects(conn):
+    """建立依賴遷移欄位的索引與觸發器（欄位須先由 _migrate_columns 補齊）"""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS idx_revisions_file_hash ON revisions(file_hash)",
+        # 檔案庫參照計數
+        """CREATE TRIGGER IF NOT EXISTS revisions_blob_ai AFTER INSERT ON revisions
+           WHEN new.file_hash IS NOT NULL BEGIN
+            UPDATE blobs SET ref_count = ref_count + 1 WHERE hash = new.file_hash;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS revisions_blob_ad AFTER DELETE ON revisions
+           WHEN old.file_hash IS NOT NULL BEGIN
+            UPDATE blobs SET ref_count = ref_count - 1 WHERE hash = old.file_hash;
+        END""",
+    ]
+    statements.extend(_change_log_triggers())
+    for sql in statements:
+        try:
+            conn.execute(sql)
+        except Exception as e:
+            print(f"[索引/觸發器建立失敗] {e}")
+    conn.commit()
+
+
+# 寫入 change_log 的資料表 → 對應圖面 id 的運算式（{r} 為 new 或 old）
+_CHANGE_LOG_TABLES = {
+    'clients': None,
+    'projects': None,
+    'drawings': '{r}.id',
+    'revisions': '{r}.drawing_id',
+    'circulation_orders': '{r}.drawing_id',
+    'circulation_tasks': '(SELECT drawing_id FROM circulation_orders WHERE id = {r}.order_id)',
+    'suppliers': None,
+    'quotations': None,
+    'quotation_items': None,
+    'purchase_requisitions': None,
+    'pr_items': None,
+    'customer_orders': None,
+    'order_items': None,
+    'invoices': None,
+    'invoice_items': None,
+    'export_documents': None,
+    'production_orders': None,
+    'production_tasks': None,
+    'machines': None,
+    'maintenance_records': None,
+}
+
+
+def _change_log_triggers():
+    """產生各資料表新增/修改/刪除時寫入 change_log 的觸發器"""
+    statements = []
+    for table, drawing_expr in _CHANGE_LOG_TABLES.items():
+        for op, event, r in (('I', 'INSERT', 'new'), ('U', 'UPDATE', 'new'),
+                             ('D', 'DELETE', 'old')):
+            drawing_id = drawing_expr.format(r=r) if drawing_expr else 'NULL'
+            statements.append(
+                f"""CREATE TRIGGER IF NOT EXISTS {table}_cl_{op.lower()} AFTER {event} ON {table} BEGIN
+            INSERT INTO change_log (table_name, row_id, op, drawing_id)
+            VALUES ('{table}', {r}.id, '{op}', {drawing_id});
+        END""")
+    return statements
+
+
+# ===== 全域搜尋索引 =====
+
+# 納入 global_fts 的資料表 → (代碼, 標題欄位, 內文欄位, 上層文件 id 欄位)
+# global_fts 的 rowid = id * 16 + 代碼，修改/刪除時可直接以 rowid 定位
+_GLOBAL_SEARCH_TABLES = {
+    'drawings':            (1, ('drawing_number', 'title'), ('drawing_type', 'created_by'), None),
+    'suppliers':           (2, ('name', 'code'),
+                            ('contact', 'phone', 'email', 'address', 'notes'), None),
+    'quotations':          (3, ('quotation_number', 'subject'),
+                            ('payment_terms', 'delivery_terms', 'notes', 'created_by'), None),
+    'quotation_items':     (4, ('part_number', 'description'), ('specification', 'notes'),
+                            'quotation_id'),
+    'customer_orders':     (5, ('order_number', 'po_number'),
+                            ('payment_terms', 'delivery_terms', 'notes'), None),
+    'order_items':         (6, ('part_number', 'description'), ('specification', 'notes'),
+                            'order_id'),
+    'invoices':            (7, ('invoice_number',), ('notes',), None),
+    'export_documents':    (8, ('doc_number', 'doc_type'),
+                            ('destination_country', 'shipping_method', 'vessel_name',
+                             'bl_number', 'container_number', 'notes'), None),
+    'production_orders':   (9, ('product_name', 'po_number'), ('notes',), None),
+    'machines':            (10, ('machine_code', 'machine_name'),
+                            ('model', 'manufacturer', 'location', 'department', 'notes'), None),
+    'maintenance_records': (11, ('description',),
+                            ('maintenance_type', 'reported_by', 'assigned_to', 'cause',
+                             'solution', 'parts_used', 'notes'), 'machine_id'),
+}
+
+# 資料表 → global_fts rowid 的類型代碼（rowid % 16）
+GLOBAL_SEARCH_CODES = {table: spec[0] for table, spec in _GLOBAL_SEARCH_TABLES.items()}
+
+
+def _text_expr(columns, r):
+    return " || ' ' || ".join(f"coalesce({r}.{col}, '')" for col in columns)
+
+
+def _global_search_values(table, r):
+    """（內部）資料列 r 對應的 global_fts 欄位值（rowid, entity, parent_id, title, body）"""
+    code, title_cols, body_cols, parent_col = _GLOBAL_SEARCH_TABLES[table]
+    return (f"{r}.id * 16 + {code}, '{table}', {r}.{parent_col or 'id'}, "
+            f"{_text_expr(title_cols, r)}, {_text_expr(body_cols, r)}")
+
+
+def _global_search_triggers():
+    """產生各資料表同步 global_fts 的觸發器
+
+    修改觸發器只監聽被索引的欄位（UPDATE OF），狀態、金額等欄位的修改不會重寫索引。
+    """
+    statements = []
+    for table, (code, title_cols, body_cols, parent_col) in _GLOBAL_SEARCH_TABLES.items():
+        columns = ', '.join(title_cols + body_cols + ((parent_col,) if parent_col else ()))
+        insert = (f"INSERT INTO global_fts(rowid, entity, parent_id, title, body) "
+                  f"VALUES ({_global_search_values(table, 'new')});")
+        statements += [
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_gs_i AFTER INSERT ON {table} BEGIN
+            {insert}
+        END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_gs_u AFTER UPDATE OF {columns} ON {table} BEGIN
+            DELETE FROM global_fts WHERE rowid = old.id * 16 + {code};
+            {insert}
+        END""",
+            f"""CREATE TRIGGER IF NOT EXISTS {table}_gs_d AFTER DELETE ON {table} BEGIN
+            DELETE FROM global_fts WHERE rowid = old.id * 16 + {code};
+        END""",
+        ]
+    return statements
+
+
+def rebuild_global_search_index(conn):
+    """清空並由各資料表重建 global_fts（首次建立索引或資料修復時使用）"""
+    conn.execute("DELETE FROM global_fts")
+    for table in _GLOBAL_SEARCH_TABLES:
+        conn.execute(f"INSERT INTO global_fts(rowid, entity, parent_id, title, body) "
+                     f"SELECT {_global_search_values(table, 'r')} FROM {table} r")
+    conn.execute("INSERT INTO global_fts(global_fts) VALUES ('optimize')")
+    conn.commit()
+
+
+def _create_trigram_fts(conn, name, columns):
+    """建立 trigram 分詞的 FTS5 表（不支援 trigram 的舊版 SQLite 改用預設分詞）
+
+    trigram 可比對任意 3 字元以上的子字串（含中文與單號、料號片段）。
+    Returns:
+        True 表示此次新建，False 表示已存在或無法建立
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone():
+        return False
+    for tokenize in ("tokenize='trigram'", "tokenize='unicode61'"):
+        try:
+            conn.execute(f"CREATE VIRTUAL TABLE {name} USING fts5({columns}, {tokenize})")
+            return True
+        except sqlite3.OperationalError:
+            continue
+    return False
+
+
+def _create_global_search(conn):
+    """建立全域搜尋索引與同步觸發器；索引為新建時由既有資料回填"""
+    created = _create_trigram_fts(conn, 'global_fts',
+                                  'entity UNINDEXED, parent_id UNINDEXED, title, body')
+    for sql in _global_search_triggers():
+        try:
+            conn.execute(sql)
+        except Exception as e:
+            print(f"[全域搜尋觸發器建立失敗] {e}")
+    conn.commit()
+    if created:
+        rebuild_global_search_index(conn)
+
+
+def _create_content_search(conn):
+    """建立圖檔內容全文索引（rowid = file_texts.id，內容由 core.content_extractor 寫入）"""
+    _create_trigram_fts(conn, 'drawing_content_fts', 'content')
+    try:
+        conn.execute("""CREATE TRIGGER IF NOT EXISTS file_texts_ad AFTER DELETE ON file_texts BEGIN
+            DELETE FROM drawing_content_fts WHERE rowid = old.id;
+        END""")
+    except Exception as e:
+        print(f"[內容索引觸發器建立失敗] {e}")
+    conn.commit()
+
+
+# ===== 應收帳款彙總 =====
+
+def _ar_open_sql():
+    return ', '.join(f"'{s}'" for s in AR_OPEN_STATUSES)
+
+
+def _ar_summary_delta(r, sign):
+    """（內部）發票列 r 計入（sign=1）或移出（sign=-1）ar_summary 的 UPSERT"""
+    amount = f"COALESCE({r}.total_amount, 0)"
+    overdue = f"({r}.payment_status = '逾期')"
+    return f"""INSERT INTO ar_summary
+                (client_id, currency, open_count, open_amount, overdue_count, overdue_amount)
+            SELECT {r}.client_id, COALESCE({r}.currency, 'TWD'), {sign}, {sign} * {amount},
+                   {sign} * {overdue}, {sign} * {overdue} * {amount}
+            WHERE {r}.payment_status IN ({_ar_open_sql()})
+            ON CONFLICT (client_id, currency) DO UPDATE SET
+                open_count = open_count + excluded.open_count,
+                open_amount = open_amount + excluded.open_amount,
+                overdue_count = overdue_count + excluded.overdue_count,
+                overdue_amount = overdue_amount + excluded.overdue_amount;"""
+
+
+def _ar_summary_cleanup(r):
+    """（內部）移除已無未收款發票的彙總列（同時歸零浮點累加誤差）"""
+    return (f"DELETE FROM ar_summary WHERE client_id = {r}.client_id "
+            f"AND currency = COALESCE({r}.currency, 'TWD') AND open_count <= 0;")
+
+
+def _ar_summary_triggers():
+    """產生維護 ar_summary 的觸發器
+
+    修改觸發器只監聽客戶、幣別、金額與付款狀態；先移出舊值再計入新值。
+    """
+    return [
+        f"""CREATE TRIGGER IF NOT EXISTS invoices_ar_i AFTER INSERT ON invoices BEGIN
+            {_ar_summary_delta('new', 1)}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS invoices_ar_u
+            AFTER UPDATE OF client_id, currency, total_amount, payment_status ON invoices BEGIN
+            {_ar_summary_delta('old', -1)}
+            {_ar_summary_delta('new', 1)}
+            {_ar_summary_cleanup('old')}
+        END""",
+        f"""CREATE TRIGGER IF NOT EXISTS invoices_ar_d AFTER DELETE ON invoices BEGIN
+            {_ar_summary_delta('old', -1)}
+            {_ar_summary_cleanup('old')}
+        END""",
+    ]
+
+
+def rebuild_ar_summary(conn):
+    """清空並由 invoices 重建 ar_summary（首次建立或資料修復時使用）"""
+    conn.execute("DELETE FROM ar_summary")
+    conn.execute(
+        f"""INSERT INTO ar_summary
+                (client_id, currency, open_count, open_amount, overdue_count, overdue_amount)
+            SELECT client_id, COALESCE(currency, 'TWD'), COUNT(*),
+                   SUM(COALESCE(total_amount, 0)),
+                   SUM(payment_status = '逾期'),
+                   SUM(CASE WHEN payment_status = '逾期' THEN COALESCE(total_amount, 0) ELSE 0 END)
+            FROM invoices
+            WHERE payment_status IN ({_ar_open_sql()})
+            GROUP BY client_id, COALESCE(currency, 'TWD')"""
+    )
+    conn.commit()
+
+
+def _create_ar_summary(conn):
+    """建立每客戶 × 幣別的應收帳款彙總表與觸發器；新建時由既有發票回填"""
+    created = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'ar_summary'").fetchone()
+    conn.execute("""CREATE TABLE IF NOT EXISTS ar_summary (
+            client_id       INTEGER NOT NULL,
+            currency        TEXT NOT NULL,
+            open_count      INTEGER NOT NULL DEFAULT 0,
+            open_amount     REAL NOT NULL DEFAULT 0,
+            overdue_count   INTEGER NOT NULL DEFAULT 0,
+            overdue_amount  REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (client_id, currency)
+        )""")
+    for sql in _ar_summary_triggers():
+        try:
+            conn.execute(sql)
+        except Exception as e:
+            print(f"[應收帳款觸發器建立失敗] {e}")
+    conn.commit()
+    if created:
+        rebuild_ar_summary(conn)
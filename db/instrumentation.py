@@ -0,0 +1,308 @@
+"""查詢效能量測 — 各查詢函式的呼叫次數、延遲分佈、回傳筆數與連線次數
+
+enable() 會以量測包裝取代 db.queries 與 db.business_queries 的公開函式（模組屬性），
+disable() 還原原本的函式，停用時沒有任何額外成本。
+
+超過 SLOW_QUERY_MS 的呼叫寫入慢查詢紀錄（SLOW_QUERY_LOG），
+附上該次執行的 SQL（由連線的 trace callback 取得，已代入參數）與 EXPLAIN QUERY PLAN。
+
+檢視：
+    工具 → 查詢效能統計（ui/dialogs/query_stats_dialog.py）
+    python -m db.instrumentation [--slow 20]   讀取結束時寫出的統計與最近的慢查詢
+"""
+import os
+import json
+import time
+import atexit
+import sqlite3
+import threading
+import functools
+import importlib
+from collections import deque
+from datetime import datetime
+
+from db.api_protocol import API_MODULES, public_functions
+from config import SLOW_QUERY_MS, SLOW_QUERY_LOG, QUERY_STATS_FILE
+
+# 計算百分位數保留的最近延遲筆數
+_SAMPLE_SIZE = 1024
+# 同一函式的慢查詢紀錄最短間隔（秒），避免大量重複
+_SLOW_LOG_INTERVAL = 60
+# 每次慢查詢最多分析的 SQL 數；每次呼叫最多保留的 SQL 數（executemany 每列都會觸發）
+_MAX_EXPLAIN = 5
+_MAX_TRACE = 50
+
+
+class _FunctionStats:
+    __slots__ = ('calls', 'errors', 'total', 'max', 'rows', 'connections', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.rows = 0
+        self.connections = 0
+        self.samples = deque(maxlen=_SAMPLE_SIZE)
+
+
+class _Frame:
+    """一次函式呼叫的量測狀態（同執行緒內巢狀呼叫各自一個）"""
+    __slots__ = ('connections', 'sql')
+
+    def __init__(self):
+        self.connections = 0
+        self.sql = []
+
+    def trace(self, sql):
+        if len(self.sql) < _MAX_TRACE:
+            self.sql.append(sql)
+
+
+class QueryProfiler:
+    """查詢函式量測器"""
+
+    def __init__(self, slow_ms=SLOW_QUERY_MS, log_path=SLOW_QUERY_LOG):
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._stats = {}            # 'module.function' -> _FunctionStats
+        self._originals = {}        # (module, name) -> 原函式
+        self._last_slow_log = {}    # 'module.function' -> time
+        self._local = threading.local()
+
+    # ----- 啟用 / 停用 -----
+
+    def enable(self):
+        """包裝所有查詢函式與 get_connection"""
+        if self.enabled:
+            return
+        for module_name in API_MODULES:
+            module = importlib.import_module(f'db.{module_name}')
+            for name, fn in public_functions(module).items():
+                self._originals[(module, name)] = fn
+                setattr(module, name, self._wrap(f'{module_name}.{name}', fn))
+            if hasattr(module, 'get_connection'):
+                original = module.get_connection
+                self._originals[(module, 'get_connection')] = original
+                module.get_connection = self._wrap_connect(original)
+        self.enabled = True
+
+    def disable(self):
+        """還原原本的函式"""
+        for (module, name), fn in self._originals.items():
+            setattr(module, name, fn)
+        self._originals.clear()
+        self.enabled = False
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    # ----- 包裝 -----
+
+    def _frames(self):
+        frames = getattr(self._local, 'frames', None)
+        if frames is None:
+            frames = self._local.frames = []
+        return frames
+
+    def _wrap_connect(self, get_connection):
+        @functools.wraps(get_connection)
+        def counting_connection(*args, **kwargs):
+            conn = get_connection(*args, **kwargs)
+            frames = self._frames()
+            if frames:
+                frame = frames[-1]
+                frame.connections += 1
+                conn.set_trace_callback(frame.trace)
+            return conn
+        return counting_connection
+
+    def _wrap(self, key, fn):
+        @functools.wraps(fn)
+        def profiled(*args, **kwargs):
+            frames = self._frames()
+            frame = _Frame()
+            frames.append(frame)
+            started = time.perf_counter()
+            ok = False
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                ok = True
+                return result
+            finally:
+                elapsed = time.perf_counter() - started
+                frames.pop()
+                if frames:
+                    # 巢狀呼叫的連線也計入外層
+                    frames[-1].connections += frame.connections
+                self._record(key, elapsed, ok, result, frame)
+        return profiled
+
+    def _record(self, key, elapsed, ok, result, frame):
+        if isinstance(result, list):
+            rows = len(result)
+        elif result is None or isinstance(result, (int, float, str, bool)):
+            rows = 0
+        else:
+            rows = 1
+        with self._lock:
+            s = self._stats.get(key)
+            if s is None:
+                s = self._stats[key] = _FunctionStats()
+            s.calls += 1
+            s.errors += 0 if ok else 1
+            s.total += elapsed
+            s.max = max(s.max, elapsed)
+            s.rows += rows
+            s.connections += frame.connections
+            s.samples.append(elapsed)
+
+        if elapsed * 1000 >= self.slow_ms:
+            now = time.monotonic()
+            with self._lock:
+                last = self._last_slow_log.get(key, 0)
+                if now - last < _SLOW_LOG_INTERVAL:
+                    return
+                self._last_slow_log[key] = now
+            self._log_slow(key, elapsed, rows, frame)
+
+    # ----- 慢查詢紀錄 -----
+
+    def _log_slow(self, key, elapsed, rows, frame):
+        statements = []
+        for sql in frame.sql:
+            text = sql.strip()
+            if not text:
+                continue
+            if text.split(None, 1)[0].upper() in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT') \
+                    and text not in statements:
+                statements.append(text)
+        lines = [f"{datetime.now():%Y-%m-%d %H:%M:%S}  {key}  {elapsed * 1000:.1f} ms"
+                 f"  rows={rows}  connections={frame.connections}"]
+        for sql in statements[:_MAX_EXPLAIN]:
+            lines.append(f"  SQL: {' '.join(sql.split())}")
+            for detail in explain_query_plan(sql):
+                lines.append(f"    PLAN: {detail}")
+        try:
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n\n')
+        except Exception as e:
+            print(f"[慢查詢紀錄失敗] {key} → {e}")
+
+    # ----- 統計 -----
+
+    def snapshot(self):
+        """各函式統計，依總耗時排序
+
+        Returns:
+            [{'function', 'calls', 'errors', 'total_ms', 'avg_ms', 'p95_ms', 'max_ms',
+              'rows', 'connections'}]
+        """
+        with self._lock:
+            items = [(key, s.calls, s.errors, s.total, s.max, s.rows, s.connections,
+                      sorted(s.samples)) for key, s in self._stats.items()]
+        result = []
+        for key, calls, errors, total, max_, rows, connections, samples in items:
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0
+            result.append({
+                'function': key,
+                'calls': calls,
+                'errors': errors,
+                'total_ms': total * 1000,
+                'avg_ms': total * 1000 / calls if calls else 0,
+                'p95_ms': p95 * 1000,
+                'max_ms': max_ * 1000,
+                'rows': rows,
+                'connections': connections,
+            })
+        result.sort(key=lambda r: r['total_ms'], reverse=True)
+        return result
+
+    def dump(self, path=QUERY_STATS_FILE):
+        """寫出統計 JSON（程式結束時自動呼叫）"""
+        stats = self.snapshot()
+        if not stats:
+            return
+        try:
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'dumped_at': f"{datetime.now():%Y-%m-%d %H:%M:%S}",
+                           'functions': stats}, f, ensure_ascii=False, indent=1)
+        except Exception as e:
+            print(f"[寫出查詢統計失敗] {path} → {e}")
+
+
+def explain_query_plan(sql):
+    """以新連線執行 EXPLAIN QUERY PLAN，回傳各步驟說明（失敗時回傳錯誤訊息）"""
+    from db.database import get_connection
+    conn = get_connection()
+    try:
+        return [row['detail'] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+    except sqlite3.Error as e:
+        return [f"（無法分析：{e}）"]
+    finally:
+        conn.close()
+
+
+# 全域量測器
+profiler = QueryProfiler()
+
+
+def enable():
+    profiler.enable()
+
+
+def disable():
+    profiler.disable()
+
+
+def is_enabled():
+    return profiler.enabled
+
+
+def get_stats():
+    return profiler.snapshot()
+
+
+@atexit.register
+def _dump_at_exit():
+    if profiler.enabled:
+        profiler.dump()
+
+
+def format_stats(stats, limit=None):
+    """統計表格文字"""
+    lines = [f"{'函式':<44}{'次數':>8}{'總計ms':>11}{'平均':>9}{'p95':>9}{'最大':>9}"
+             f"{'筆數':>9}{'連線':>7}"]
+    for s in stats[:limit]:
+        lines.append(f"{s['function']:<46}{s['calls']:>8}{s['total_ms']:>11.1f}"
+                     f"{s['avg_ms']:>9.2f}{s['p95_ms']:>9.2f}{s['max_ms']:>9.2f}"
+                     f"{s['rows']:>9}{s['connections']:>7}")
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='顯示查詢效能統計與慢查詢紀錄')
+    parser.add_argument('--top', type=int, default=40, help='顯示前 N 個函式（依總耗時）')
+    parser.add_argument('--slow', type=int, default=10, help='顯示最近 N 筆慢查詢')
+    opts = parser.parse_args()
+
+    if os.path.exists(QUERY_STATS_FILE):
+        with open(QUERY_STATS_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+        print(f"查詢統計（{data['dumped_at']}）")
+        print(format_stats(data['functions'], opts.top))
+    else:
+        print(f"尚無統計：請在 config 設定 QUERY_PROFILING = True 後執行程式（{QUERY_STATS_FILE}）")
+
+    if opts.slow and os.path.exists(SLOW_QUERY_LOG):
+        with open(SLOW_QUERY_LOG, encoding='utf-8') as f:
+            entries = [e for e in f.read().split('\n\n') if e.strip()]
+        print(f"\n最近 {min(opts.slow, len(entries))} 筆慢查詢（{SLOW_QUERY_LOG}）")
+        for entry in entries[-opts.slow:]:
+            print(entry + '\n')
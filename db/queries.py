@@ -1,10 +1,15 @@
+import heapq
 import sqlite3
+from collections import defaultdict
 from datetime import datetime
-from db.database import get_connection
+from db.database import get_connection, rebuild_global_search_index, GLOBAL_SEARCH_CODES
+from db.cache import cached, invalidates
+from db.write_coordinator import serialized_write, begin_write
 
 
 # ===== 客戶 =====
 
+@invalidates('clients')
 def add_client(name, code='', contact='', phone='', notes=''):
     conn = get_connection()
     try:
@@ -17,6 +22,7 @@ def add_client(name, code='', contact='', phone='', notes=''):
     finally:
         conn.close()
 
+@invalidates('clients')
 def update_client(client_id, name, code='', contact='', phone='', notes=''):
     conn = get_connection()
     try:
@@ -29,6 +35,7 @@ def update_client(client_id, name, code='', contact='', phone='', notes=''):
     finally:
         conn.close()
 
+@invalidates('clients', 'projects')
 def delete_client(client_id):
     conn = get_connection()
     try:
@@ -37,6 +44,7 @@ def delete_client(client_id):
     finally:
         conn.close()
 
+@cached('clients')
 def get_all_clients():
     conn = get_connection()
     try:
@@ -44,6 +52,21 @@ def get_all_clients():
     finally:
         conn.close()
 
+def get_clients_with_project_counts():
+    """取得所有客戶及其專案數（單一查詢，供樹狀圖延遲展開）"""
+    conn = get_connection()
+    try:
+        return conn.execute("""
+            SELECT c.*, COUNT(p.id) AS project_count
+            FROM clients c
+            LEFT JOIN projects p ON p.client_id = c.id
+            GROUP BY c.id
+            ORDER BY c.name
+        """).fetchall()
+    finally:
+        conn.close()
+
+@cached('clients')
 def get_client(client_id):
     conn = get_connection()
     try:
@@ -54,6 +77,7 @@ def get_client(client_id):
 
 # ===== 專案 =====
 
+@invalidates('projects')
 def add_project(client_id, name, code='', notes=''):
     conn = get_connection()
     try:
@@ -66,6 +90,7 @@ def add_project(client_id, name, code='', notes=''):
     finally:
         conn.close()
 
+@invalidates('projects')
 def update_project(project_id, name, code='', notes=''):
     conn = get_connection()
     try:
@@ -78,6 +103,7 @@ def update_project(project_id, name, code='', notes=''):
     finally:
         conn.close()
 
+@invalidates('projects')
 def delete_project(project_id):
     conn = get_connection()
     try:
@@ -86,6 +112,7 @@ def delete_project(project_id):
     finally:
         conn.close()
 
+@cached('projects')
 def get_projects_by_client(client_id):
     conn = get_connection()
     try:
@@ -95,6 +122,7 @@ def get_projects_by_client(client_id):
     finally:
         conn.close()
 
+@cached('projects')
 def get_project(project_id):
     conn = get_connection()
     try:
@@ -163,6 +191,11 @@ def delete_drawing(drawing_id):
             conn.execute("DELETE FROM circulation_tasks WHERE order_id=?", (oid,))
         conn.execute("DELETE FROM circulation_orders WHERE drawing_id=?", (drawing_id,))
         conn.execute("DELETE FROM access_logs WHERE drawing_id=?", (drawing_id,))
+        conn.execute(
+            """DELETE FROM revision_deltas
+               WHERE revision_id IN (SELECT id FROM revisions WHERE drawing_id=?)""",
+            (drawing_id,)
+        )
         conn.execute("DELETE FROM revisions WHERE drawing_id=?", (drawing_id,))
 
         # 最後刪除圖面本身
@@ -184,6 +217,20 @@ def get_drawings_by_project(project_id):
     finally:
         conn.close()
 
+def get_drawings_by_client(client_id):
+    """取得客戶所有專案的圖面（單一 JOIN 查詢）"""
+    conn = get_connection()
+    try:
+        return conn.execute("""
+            SELECT d.*, p.name as project_name
+            FROM drawings d
+            JOIN projects p ON d.project_id = p.id
+            WHERE p.client_id=?
+            ORDER BY p.name, d.drawing_number
+        """, (client_id,)).fetchall()
+    finally:
+        conn.close()
+
 def get_drawing(drawing_id):
     conn = get_connection()
     try:
@@ -191,6 +238,21 @@ def get_drawing(drawing_id):
     finally:
         conn.close()
 
+def get_drawings_by_ids(drawing_ids):
+    """依 id 清單取得圖面（不存在的 id 不回傳；附專案名稱與所屬客戶 client_id）"""
+    if not drawing_ids:
+        return []
+    conn = get_connection()
+    try:
+        return _fetch_in(conn, """
+            SELECT d.*, p.name as project_name, p.client_id
+            FROM drawings d
+            LEFT JOIN projects p ON d.project_id = p.id
+            WHERE d.id IN ({})
+        """, list(drawing_ids))
+    finally:
+        conn.close()
+
 def get_all_drawings():
     conn = get_connection()
     try:
@@ -207,13 +269,19 @@ def get_all_drawings():
 
 # ===== 版次 =====
 
-def add_revision(drawing_id, rev_code, rev_date, saved_by, notes='', file_path=''):
+@serialized_write()
+def add_revision(drawing_id, rev_code, rev_date, saved_by, notes='', file_path='',
+                 file_hash=None, file_size=0):
     conn = get_connection()
     try:
+        begin_write(conn)
+        if file_hash:
+            _register_blob(conn, file_hash, file_size)
         conn.execute(
-            """INSERT INTO revisions (drawing_id, rev_code, rev_date, saved_by, notes, file_path)
-               VALUES (?, ?, ?, ?, ?, ?)""",
-            (drawing_id, rev_code, rev_date, saved_by, notes, file_path)
+            """INSERT INTO revisions
+               (drawing_id, rev_code, rev_date, saved_by, notes, file_path, file_hash)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (drawing_id, rev_code, rev_date, saved_by, notes, file_path, file_hash)
         )
         # 更新圖面目前版次
         conn.execute(
@@ -242,6 +310,28 @@ def get_revisions(drawing_id):
     finally:
         conn.close()
 
+def get_revision(revision_id):
+    conn = get_connection()
+    try:
+        return conn.execute("SELECT * FROM revisions WHERE id=?", (revision_id,)).fetchone()
+    finally:
+        conn.close()
+
+def get_stored_revisions(drawing_id):
+    """取得有檔案庫內容的版次（由舊到新），並標示是否已改存差異"""
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT r.*, rd.base_revision_id, rd.delta_size
+               FROM revisions r
+               LEFT JOIN revision_deltas rd ON rd.revision_id = r.id
+               WHERE r.drawing_id=? AND r.file_hash IS NOT NULL
+               ORDER BY r.id""",
+            (drawing_id,)
+        ).fetchall()
+    finally:
+        conn.close()
+
 def suggest_next_rev(current_rev):
     """建議下一個版次代號"""
     if not current_rev:
@@ -255,58 +345,372 @@ def suggest_next_rev(current_rev):
     return current_rev + '.1'
 
 
-# ===== 搜尋 =====
+# ===== 檔案庫 =====
 
-def search_drawings(keyword='', client_name='', project_name='', status='',
-                    drawing_type='', date_from='', date_to='', created_by=''):
-    """多條件搜尋圖面"""
+def _register_blob(conn, file_hash, size):
+    """（內部）在呼叫端的交易內登記檔案庫內容（已存在則略過，參照數由 revisions 觸發器維護）
+
+    須與參照它的版次在同一交易寫入，清理程序才不會在兩者之間看到參照數為 0 的紀錄。
+    紀錄曾因版次改存差異而移除時，參照數由現有版次重新計算，與觸發器的增減保持一致。
+    """
+    conn.execute(
+        """INSERT OR IGNORE INTO blobs (hash, size, ref_count)
+           VALUES (?, ?, (SELECT COUNT(*) FROM revisions WHERE file_hash = ?))""",
+        (file_hash, size, file_hash)
+    )
+
+def get_orphan_blobs():
+    """取得已無任何版次參照的檔案庫內容"""
     conn = get_connection()
     try:
-        conditions = []
-        params = []
+        return conn.execute(
+            "SELECT * FROM blobs WHERE ref_count <= 0 ORDER BY created_at"
+        ).fetchall()
+    finally:
+        conn.close()
 
-        if keyword:
-            # 同時使用 FTS5（英數）和 LIKE（中文）搜尋
-            conditions.append(
-                "(d.id IN (SELECT rowid FROM drawings_fts WHERE drawings_fts MATCH ?) "
-                "OR d.drawing_number LIKE ? OR d.title LIKE ?)"
-            )
-            params.append(f'"{keyword}"*')
-            params.append(f"%{keyword}%")
-            params.append(f"%{keyword}%")
+def delete_blob(file_hash):
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM blobs WHERE hash=?", (file_hash,))
+        conn.commit()
+    finally:
+        conn.close()
 
-        if client_name:
-            conditions.append("c.name LIKE ?")
-            params.append(f"%{client_name}%")
+def get_blob_stats():
+    """取得檔案庫統計：實際儲存量與去重前的邏輯容量"""
+    conn = get_connection()
+    try:
+        return conn.execute("""
+            SELECT COUNT(*) AS blob_count,
+                   COALESCE(SUM(size), 0) AS stored_bytes,
+                   COALESCE(SUM(size * MAX(ref_count, 1)), 0) AS logical_bytes
+            FROM blobs
+        """).fetchone()
+    finally:
+        conn.close()
 
-        if project_name:
-            conditions.append("p.name LIKE ?")
-            params.append(f"%{project_name}%")
 
-        if status:
-            conditions.append("d.status = ?")
-            params.append(status)
+# ===== 版次差異儲存 =====
 
-        if drawing_type:
-            conditions.append("d.drawing_type = ?")
-            params.append(drawing_type)
+def get_revision_delta(revision_id):
+    conn = get_connection()
+    try:
+        return conn.execute(
+            "SELECT * FROM revision_deltas WHERE revision_id=?", (revision_id,)
+        ).fetchone()
+    finally:
+        conn.close()
 
-        if date_from:
-            conditions.append("d.created_at >= ?")
-            params.append(date_from)
+def add_revision_delta(revision_id, base_revision_id, delta, full_size, file_hash):
+    """改存版次差異；同一交易內若已無版次以完整檔案保存 file_hash，移除其 blobs 紀錄
 
-        if date_to:
-            conditions.append("d.created_at <= ?")
-            params.append(date_to + ' 23:59:59')
+    Returns:
+        True 表示檔案庫實體已不再需要，呼叫端可刪除檔案
+    """
+    conn = get_connection()
+    try:
+        conn.execute(
+            """INSERT OR REPLACE INTO revision_deltas
+               (revision_id, base_revision_id, delta, delta_size, full_size)
+               VALUES (?, ?, ?, ?, ?)""",
+            (revision_id, base_revision_id, sqlite3.Binary(delta), len(delta), full_size)
+        )
+        remaining = conn.execute(
+            """SELECT COUNT(*) FROM revisions r
+               WHERE r.file_hash=?
+                 AND NOT EXISTS (SELECT 1 FROM revision_deltas rd WHERE rd.revision_id = r.id)""",
+            (file_hash,)
+        ).fetchone()[0]
+        if remaining == 0:
+            conn.execute("DELETE FROM blobs WHERE hash=?", (file_hash,))
+        conn.commit()
+        return remaining == 0
+    finally:
+        conn.close()
+
+
+# ===== 圖檔內容索引 =====
+
+# trigram 分詞可比對的最短字串；較短的詞改以 LIKE 篩選
+_TRIGRAM_MIN = 3
+
+
+def _content_rowids(keyword):
+    """（內部）內容符合 keyword 的 drawing_content_fts rowid 子查詢：回傳 (SQL, 參數)
+
+    短詞直接以 LIKE 掃描內容表；trigram 虛擬表上的 LIKE 在少於 3 個中文字時會漏掉結果。
+    """
+    if len(keyword) >= _TRIGRAM_MIN:
+        return ("SELECT rowid FROM drawing_content_fts WHERE drawing_content_fts MATCH ?",
+                '"' + keyword.replace('"', '""') + '"')
+    return "SELECT id FROM drawing_content_fts_content WHERE c0 LIKE ?", f"%{keyword}%"
 
-        if created_by:
-            conditions.append("d.created_by LIKE ?")
-            params.append(f"%{created_by}%")
 
-        where = " AND ".join(conditions) if conditions else "1=1"
+def get_pending_content_files(extensions, limit=None, retry_hours=24):
+    """取得尚未擷取文字的檔案內容（每個雜湊取最早的版次）
 
+    暫時性失敗（extractor 為 NULL，如缺少擷取套件、檔案庫找不到內容）
+    在 retry_hours 小時後重新列入待處理。
+
+    Args:
+        extensions: 可擷取的副檔名，如 ('.pdf', '.dxf')
+    Returns:
+        [Row(file_hash, revision_id, file_path)]
+    """
+    conn = get_connection()
+    try:
+        ext_cond = ' OR '.join("lower(r.file_path) LIKE ?" for _ in extensions)
         return conn.execute(f"""
-            SELECT d.*, p.name as project_name, c.name as client_name
+            SELECT r.file_hash, MIN(r.id) AS revision_id, r.file_path
+            FROM revisions r
+            WHERE r.file_hash IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM file_texts ft WHERE ft.file_hash = r.file_hash
+                    AND (ft.extractor IS NOT NULL
+                         OR ft.extracted_at > datetime('now', 'localtime', ?)))
+              AND ({ext_cond})
+            GROUP BY r.file_hash
+            ORDER BY revision_id DESC
+            LIMIT ?
+        """, [f'-{retry_hours} hours'] + [f'%{ext}' for ext in extensions]
+             + [-1 if limit is None else limit]).fetchall()
+    finally:
+        conn.close()
+
+
+def get_unhashed_revisions(extensions, limit=None):
+    """取得尚無檔案雜湊的舊版次（檔案庫啟用前建立）：[Row(id, file_path)]，新版次在前"""
+    conn = get_connection()
+    try:
+        ext_cond = ' OR '.join("lower(file_path) LIKE ?" for _ in extensions)
+        return conn.execute(f"""
+            SELECT id, file_path FROM revisions
+            WHERE file_hash IS NULL AND ({ext_cond})
+            ORDER BY id DESC
+            LIMIT ?
+        """, [f'%{ext}' for ext in extensions] + [-1 if limit is None else limit]).fetchall()
+    finally:
+        conn.close()
+
+
+@serialized_write()
+def set_revision_file_hash(revision_id, file_hash, file_size=0):
+    """補上舊版次的檔案雜湊，登記檔案庫並增加參照數（觸發器只在新增版次時計數）
+
+    Returns:
+        是否有更新（版次已有雜湊時不變更）
+    """
+    conn = get_connection()
+    try:
+        begin_write(conn)
+        _register_blob(conn, file_hash, file_size)
+        updated = conn.execute(
+            "UPDATE revisions SET file_hash = ? WHERE id = ? AND file_hash IS NULL",
+            (file_hash, revision_id)
+        ).rowcount
+        if updated:
+            conn.execute("UPDATE blobs SET ref_count = ref_count + 1 WHERE hash = ?", (file_hash,))
+        conn.commit()
+        return bool(updated)
+    finally:
+        conn.close()
+
+
+@serialized_write()
+def save_file_texts(results):
+    """寫入擷取結果（同一交易）；同一雜湊已有內容時取代
+
+    Args:
+        results: [(file_hash, extractor, text, error), ...]，失敗時 text 為空、error 為訊息
+    """
+    conn = get_connection()
+    try:
+        begin_write(conn)
+        for file_hash, extractor, text, error in results:
+            text_id = conn.execute("""
+                INSERT INTO file_texts (file_hash, extractor, char_count, error)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(file_hash) DO UPDATE SET
+                    extractor = excluded.extractor, char_count = excluded.char_count,
+                    error = excluded.error, extracted_at = datetime('now','localtime')
+                RETURNING id
+            """, (file_hash, extractor, len(text or ''), error)).fetchone()[0]
+            conn.execute("DELETE FROM drawing_content_fts WHERE rowid = ?", (text_id,))
+            if text:
+                conn.execute("INSERT INTO drawing_content_fts (rowid, content) VALUES (?, ?)",
+                             (text_id, text))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def prune_file_texts():
+    """刪除已無版次參照的檔案文字，回傳刪除筆數"""
+    conn = get_connection()
+    try:
+        deleted = conn.execute("""
+            DELETE FROM file_texts WHERE NOT EXISTS
+                (SELECT 1 FROM revisions r WHERE r.file_hash = file_texts.file_hash)
+        """).rowcount
+        conn.commit()
+        return deleted
+    finally:
+        conn.close()
+
+
+def clear_file_texts():
+    """清除所有擷取結果（下次擷取時全部重做）"""
+    conn = get_connection()
+    try:
+        conn.execute("DELETE FROM file_texts")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def get_content_index_stats(extensions, retry_hours=24):
+    """圖檔內容索引統計：{'indexed', 'failed', 'pending', 'chars'}"""
+    conn = get_connection()
+    try:
+        row = conn.execute("""
+            SELECT COUNT(*) AS total, COUNT(error) AS failed, COALESCE(SUM(char_count), 0) AS chars
+            FROM file_texts
+        """).fetchone()
+    finally:
+        conn.close()
+    return {'indexed': row['total'] - row['failed'], 'failed': row['failed'],
+            'pending': len(get_pending_content_files(extensions, retry_hours=retry_hours)),
+            'chars': row['chars']}
+
+
+def search_drawing_contents(keyword, limit=200):
+    """搜尋圖檔文字內容：回傳符合的版次（含圖面資訊與摘要），新版次在前"""
+    if len(keyword) >= _TRIGRAM_MIN:
+        hits = """SELECT rowid, snippet(drawing_content_fts, 0, '【', '】', '…', 12) AS snippet
+                  FROM drawing_content_fts WHERE drawing_content_fts MATCH ?"""
+        params = ['"' + keyword.replace('"', '""') + '"']
+    else:
+        hits = """SELECT id AS rowid,
+                         substr(c0, max(instr(lower(c0), lower(?)) - 20, 1), 60) AS snippet
+                  FROM drawing_content_fts_content WHERE c0 LIKE ?"""
+        params = [keyword, f"%{keyword}%"]
+    conn = get_connection()
+    try:
+        return conn.execute(f"""
+            WITH hits AS MATERIALIZED ({hits})
+            SELECT r.id AS revision_id, r.rev_code, d.id AS drawing_id, d.drawing_number,
+                   d.title, ft.extractor, hits.snippet
+            FROM hits
+            JOIN file_texts ft ON ft.id = hits.rowid
+            JOIN revisions r ON r.file_hash = ft.file_hash
+            JOIN drawings d ON d.id = r.drawing_id
+            ORDER BY r.id DESC
+            LIMIT ?
+        """, params + [limit]).fetchall()
+    finally:
+        conn.close()
+
+
+# ===== 圖面相似度 =====
+
+def get_image_hashes():
+    """取得所有圖面的感知雜湊：[Row(drawing_id, phash, dhash, thumb_mtime)]"""
+    conn = get_connection()
+    try:
+        return conn.execute(
+            "SELECT drawing_id, phash, dhash, thumb_mtime FROM image_hashes").fetchall()
+    finally:
+        conn.close()
+
+
+def save_image_hashes(rows):
+    """寫入感知雜湊（已刪除的圖面略過）
+
+    Args:
+        rows: [(drawing_id, phash, dhash, thumb_mtime), ...]，雜湊為有號 64 位元整數
+    """
+    conn = get_connection()
+    try:
+        conn.executemany("""
+            INSERT INTO image_hashes (drawing_id, phash, dhash, thumb_mtime)
+            SELECT ?1, ?2, ?3, ?4 WHERE EXISTS (SELECT 1 FROM drawings WHERE id = ?1)
+            ON CONFLICT(drawing_id) DO UPDATE SET
+                phash = excluded.phash, dhash = excluded.dhash,
+                thumb_mtime = excluded.thumb_mtime, updated_at = datetime('now','localtime')
+        """, rows)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+# ===== 搜尋 =====
+
+def _search_where(keyword='', client_name='', project_name='', status='',
+                  drawing_type='', date_from='', date_to='', created_by='', content=''):
+    """（內部）圖面搜尋條件：回傳 (WHERE 子句, 參數)；d/p/c 為 drawings/projects/clients 別名"""
+    conditions = []
+    params = []
+
+    if keyword:
+        # 同時使用 FTS5（英數）和 LIKE（中文）搜尋
+        conditions.append(
+            "(d.id IN (SELECT rowid FROM drawings_fts WHERE drawings_fts MATCH ?) "
+            "OR d.drawing_number LIKE ? OR d.title LIKE ?)"
+        )
+        params.append('"' + keyword.replace('"', '""') + '"*')
+        params.append(f"%{keyword}%")
+        params.append(f"%{keyword}%")
+
+    if content:
+        # 任一版次的圖檔文字（標題欄、料號、註記）符合
+        rowids, param = _content_rowids(content)
+        conditions.append(f"""d.id IN (
+            SELECT r.drawing_id FROM revisions r
+            JOIN file_texts ft ON ft.file_hash = r.file_hash
+            WHERE ft.id IN ({rowids}))""")
+        params.append(param)
+
+    if client_name:
+        conditions.append("c.name LIKE ?")
+        params.append(f"%{client_name}%")
+
+    if project_name:
+        conditions.append("p.name LIKE ?")
+        params.append(f"%{project_name}%")
+
+    if status:
+        conditions.append("d.status = ?")
+        params.append(status)
+
+    if drawing_type:
+        conditions.append("d.drawing_type = ?")
+        params.append(drawing_type)
+
+    if date_from:
+        conditions.append("d.created_at >= ?")
+        params.append(date_from)
+
+    if date_to:
+        conditions.append("d.created_at <= ?")
+        params.append(date_to + ' 23:59:59')
+
+    if created_by:
+        conditions.append("d.created_by LIKE ?")
+        params.append(f"%{created_by}%")
+
+    return (" AND ".join(conditions) if conditions else "1=1"), params
+
+
+def search_drawings(keyword='', client_name='', project_name='', status='',
+                    drawing_type='', date_from='', date_to='', created_by='', content=''):
+    """多條件搜尋圖面（content 為圖檔文字內容）"""
+    conn = get_connection()
+    try:
+        where, params = _search_where(keyword, client_name, project_name, status,
+                                      drawing_type, date_from, date_to, created_by, content)
+        return conn.execute(f"""
+            SELECT d.*, p.name as project_name, c.name as client_name, p.client_id
             FROM drawings d
             JOIN projects p ON d.project_id = p.id
             JOIN clients c ON p.client_id = c.id
@@ -317,6 +721,61 @@ def search_drawings(keyword='', client_name='', project_name='', status='',
         conn.close()
 
 
+# 分面統計欄位
+SEARCH_FACETS = ('status', 'drawing_type', 'client', 'year')
+
+
+def search_drawings_faceted(**filters):
+    """分面搜尋：一次取得符合總數與各分面計數
+
+    分面計數以單一 UNION ALL 分組查詢計算，符合的圖面只掃描一次
+    （MATERIALIZED CTE，僅讀取 idx_drawings_facets 覆蓋索引的欄位）。
+
+    Returns:
+        {'total': int,
+         'facets': {'status' / 'drawing_type' / 'year': [(值, 數量)],
+                    'client': [(client_id, 客戶名稱, 數量)]}}
+    """
+    conn = get_connection()
+    try:
+        where, params = _search_where(**filters)
+        facet_rows = conn.execute(f"""
+            WITH m AS MATERIALIZED (
+                SELECT d.status, d.drawing_type, p.client_id,
+                       substr(d.created_at, 1, 4) AS year
+                FROM drawings d
+                JOIN projects p ON d.project_id = p.id
+                JOIN clients c ON p.client_id = c.id
+                WHERE {where}
+            )
+            SELECT 'status' AS facet, status AS value, COUNT(*) AS n FROM m GROUP BY status
+            UNION ALL
+            SELECT 'drawing_type', drawing_type, COUNT(*) FROM m GROUP BY drawing_type
+            UNION ALL
+            SELECT 'client', client_id, COUNT(*) FROM m GROUP BY client_id
+            UNION ALL
+            SELECT 'year', year, COUNT(*) FROM m GROUP BY year
+        """, params).fetchall()
+
+        facets = {name: [] for name in SEARCH_FACETS}
+        for r in facet_rows:
+            facets[r['facet']].append((r['value'], r['n']))
+        total = sum(n for _, n in facets['status'])
+
+        # 客戶分面附上名稱
+        client_ids = [v for v, _ in facets['client']]
+        names = {r['id']: r['name'] for r in _fetch_in(
+            conn, "SELECT id, name FROM clients WHERE id IN ({})", client_ids)}
+        facets['client'] = sorted(((cid, names.get(cid, ''), n) for cid, n in facets['client']),
+                                  key=lambda f: f[1])
+        for name in ('status', 'drawing_type'):
+            facets[name].sort(key=lambda f: -f[1])
+        facets['year'].sort(key=lambda f: f[0] or '', reverse=True)
+        return {'total': total, 'facets': facets}
+    finally:
+        conn.close()
+
+
 def get_drawing_count():
     """取得圖面總數"""
     conn = get_connection()
@@ -326,6 +785,123 @@ def get_drawing_count():
         conn.close()
 
 
+# ===== 全域搜尋 =====
+
+# 明細類結果的上層文件編號：entity → (上層資料表, 編號欄位)
+_GLOBAL_SEARCH_REFS = {
+    'quotation_items': ('quotations', 'quotation_number'),
+    'order_items': ('customer_orders', 'order_number'),
+    'maintenance_records': ('machines', 'machine_code'),
+}
+
+
+def search_global(keyword, limit_per_entity=20, entities=None):
+    """全域搜尋：圖面與所有業務文件（global_fts），依類型分組並依相關度排序
+
+    以空白分隔的多個詞須同時符合；3 字元以上的詞走 FTS5 索引（bm25 排序，標題權重較高），
+    只有短詞時改為掃描索引內容（依新到舊排序）。
+    分組計數與排序只用 rowid（類型代碼為 rowid % 16）與 bm25，
+    只有每組前 limit_per_entity 筆才讀取內容與產生摘要（SQL 視窗函式排序大量結果反而較慢）。
+
+    Args:
+        keyword: 搜尋字串
+        limit_per_entity: 每種類型最多回傳筆數
+        entities: 限定的資料表名稱（None 表示全部）
+    Returns:
+        [{'entity': 資料表名稱, 'total': 符合總數,
+          'hits': [{'id', 'parent_id', 'ref', 'title', 'snippet', 'score'}]}]
+        依各組最佳相關度排序
+    """
+    terms = keyword.split()
+    if not terms:
+        return []
+    long_terms = [t for t in terms if len(t) >= _TRIGRAM_MIN]
+    short_terms = [t for t in terms if len(t) < _TRIGRAM_MIN]
+
+    conditions, params = [], []
+    if long_terms:
+        match = ' '.join('"' + t.replace('"', '""') + '"' for t in long_terms)
+        source, rowid = 'global_fts', 'rowid'
+        conditions.append("global_fts MATCH ?")
+        params.append(match)
+        score = "bm25(global_fts, 0, 0, 5.0, 1.0)"
+    else:
+        # 直接掃描 FTS5 內容表，比經由虛擬表快約一倍
+        source, rowid = 'global_fts_content', 'id'
+        score = "0"
+    # 短詞比對內容表的 c2 = title、c3 = body
+    # （trigram 虛擬表上的 LIKE 在少於 3 個中文字時會漏掉結果）
+    for t in short_terms:
+        if long_terms:
+            conditions.append("EXISTS (SELECT 1 FROM global_fts_content gc WHERE gc.id = "
+                              "global_fts.rowid AND (gc.c2 LIKE ? OR gc.c3 LIKE ?))")
+        else:
+            conditions.append("(c2 LIKE ? OR c3 LIKE ?)")
+        params += [f"%{t}%", f"%{t}%"]
+    if entities:
+        codes = [GLOBAL_SEARCH_CODES[e] for e in entities]
+        conditions.append(f"{rowid} % 16 IN ({','.join('?' * len(codes))})")
+        params += codes
+
+    conn = get_connection()
+    try:
+        # 依類型代碼分組，每組保留分數最佳（同分取較新）的前 limit_per_entity 筆
+        by_code = defaultdict(list)
+        for rid, rank in conn.execute(f"""
+            SELECT {rowid}, {score} FROM {source} WHERE {' AND '.join(conditions)}
+        """, params):
+            by_code[rid % 16].append((rank, -rid))
+        totals = {code: len(hits) for code, hits in by_code.items()}
+        scores = {-neg: rank for hits in by_code.values()
+                  for rank, neg in heapq.nsmallest(limit_per_entity, hits)}
+
+        # 只讀取要顯示的結果內容與摘要
+        if long_terms:
+            rows = _fetch_in(conn, """
+                SELECT rowid, entity, parent_id, title,
+                       snippet(global_fts, 3, '【', '】', '…', 12) AS snippet
+                FROM global_fts WHERE global_fts MATCH ? AND rowid IN ({})
+            """, list(scores), (match,))
+        else:
+            rows = _fetch_in(conn, """
+                SELECT id AS rowid, c0 AS entity, c1 AS parent_id, c2 AS title, c3 AS snippet
+                FROM global_fts_content WHERE id IN ({})
+            """, list(scores))
+
+        # 明細的上層文件編號
+        refs = {}
+        for entity, (table, column) in _GLOBAL_SEARCH_REFS.items():
+            parent_ids = list({r['parent_id'] for r in rows if r['entity'] == entity})
+            for p in _fetch_in(conn, f"SELECT id, {column} FROM {table} WHERE id IN ({{}})",
+                               parent_ids):
+                refs[(entity, p['id'])] = p[column]
+    finally:
+        conn.close()
+
+    groups = {}
+    for r in sorted(rows, key=lambda r: (scores[r['rowid']], -r['rowid'])):
+        group = groups.setdefault(r['entity'], {
+            'entity': r['entity'], 'total': totals[r['rowid'] % 16], 'hits': []})
+        group['hits'].append({
+            'id': r['rowid'] // 16,
+            'parent_id': r['parent_id'],
+            'ref': refs.get((r['entity'], r['parent_id']), ''),
+            'title': ' '.join(r['title'].split()),
+            'snippet': ' '.join(r['snippet'].split())[:80],
+            'score': scores[r['rowid']],
+        })
+    return sorted(groups.values(), key=lambda g: g['hits'][0]['score'])
+
+
+def rebuild_global_search():
+    """重建全域搜尋索引"""
+    conn = get_connection()
+    try:
+        rebuild_global_search_index(conn)
+    finally:
+        conn.close()
+
+
 # ===== 存取紀錄 =====
 
 def log_access(drawing_id, user_name, action='view'):
@@ -354,6 +930,7 @@ def get_access_logs(drawing_id, limit=50):
 
 # ===== 部門 =====
 
+@cached('departments')
 def get_departments():
     """取得所有部門"""
     conn = get_connection()
@@ -362,6 +939,7 @@ def get_departments():
     finally:
         conn.close()
 
+@invalidates('departments')
 def add_department(name):
     """新增部門"""
     conn = get_connection()
@@ -385,10 +963,12 @@ def _log_circulation(conn, order_id, action, operator, task_id=None,
         (order_id, task_id, action, operator, department, file_path, description)
     )
 
+@serialized_write()
 def create_circulation_order(drawing_id, rev_code, issued_by, departments, notes=''):
     """建立發行單，並為每個指定部門建立任務"""
     conn = get_connection()
     try:
+        begin_write(conn)
         conn.execute(
             """INSERT INTO circulation_orders (drawing_id, rev_code, issued_by, notes)
                VALUES (?, ?, ?, ?)""",
@@ -472,10 +1052,12 @@ def get_task(task_id):
     finally:
         conn.close()
 
+@serialized_write()
 def download_task(task_id, operator):
     """部門下載圖面（記錄下載動作）"""
     conn = get_connection()
     try:
+        begin_write(conn)
         task = conn.execute("SELECT * FROM circulation_tasks WHERE id=?", (task_id,)).fetchone()
         if not task:
             return
@@ -491,10 +1073,12 @@ def download_task(task_id, operator):
     finally:
         conn.close()
 
+@serialized_write()
 def upload_task(task_id, operator, file_path, description=''):
     """部門上傳修改後的檔案"""
     conn = get_connection()
     try:
+        begin_write(conn)
         task = conn.execute("SELECT * FROM circulation_tasks WHERE id=?", (task_id,)).fetchone()
         if not task:
             return
@@ -512,10 +1096,12 @@ def upload_task(task_id, operator, file_path, description=''):
     finally:
         conn.close()
 
+@serialized_write()
 def confirm_task(task_id, confirmed_by):
     """管理部確認收回某部門的任務"""
     conn = get_connection()
     try:
+        begin_write(conn)
         task = conn.execute("SELECT * FROM circulation_tasks WHERE id=?", (task_id,)).fetchone()
         if not task:
             return
@@ -561,10 +1147,12 @@ def confirm_task(task_id, confirmed_by):
     finally:
         conn.close()
 
+@serialized_write()
 def mark_client_sent(order_id, operator, notes=''):
     """標記已寄出客戶"""
     conn = get_connection()
     try:
+        begin_write(conn)
         conn.execute(
             """UPDATE circulation_orders
                SET client_sent=1, client_sent_at=datetime('now','localtime'), status='已完成'
@@ -586,10 +1174,12 @@ def mark_client_sent(order_id, operator, notes=''):
     finally:
         conn.close()
 
+@serialized_write()
 def cancel_order(order_id, operator, reason=''):
     """取消發行單"""
     conn = get_connection()
     try:
+        begin_write(conn)
         conn.execute(
             "UPDATE circulation_orders SET status='已取消' WHERE id=?",
             (order_id,)
@@ -661,6 +1251,7 @@ def get_all_flows_for_drawing(drawing_id):
 
 # ----- A流程：客戶圖面 -----
 
+@serialized_write()
 def create_flow_a(drawing_id, rev_code, issued_by, notes=''):
     """建立A流程：車工部整理→管理部寄客戶→客戶確認
 
@@ -668,6 +1259,7 @@ def create_flow_a(drawing_id, rev_code, issued_by, notes=''):
     """
     conn = get_connection()
     try:
+        begin_write(conn)
         from config import FLOW_A_STEPS
         conn.execute(
             """INSERT INTO circulation_orders
@@ -706,6 +1298,7 @@ def create_flow_a(drawing_id, rev_code, issued_by, notes=''):
         conn.close()
 
 
+@serialized_write()
 def advance_flow_a(order_id, operator, notes=''):
     """推進A流程到下一步
 
@@ -713,6 +1306,7 @@ def advance_flow_a(order_id, operator, notes=''):
     """
     conn = get_connection()
     try:
+        begin_write(conn)
         from config import FLOW_A_STEPS
         order = conn.execute(
             "SELECT * FROM circulation_orders WHERE id=?", (order_id,)
@@ -803,10 +1397,12 @@ def get_flow_a_status(order_id):
 
 # ----- B流程：劦佑圖面 -----
 
+@serialized_write()
 def create_flow_b(drawing_id, rev_code, issued_by, departments, notes=''):
     """建立B流程：管理部發行給多個部門，各部門需確認收到"""
     conn = get_connection()
     try:
+        begin_write(conn)
         conn.execute(
             """INSERT INTO circulation_orders
                (drawing_id, rev_code, issued_by, notes, flow_type)
@@ -837,10 +1433,12 @@ def create_flow_b(drawing_id, rev_code, issued_by, departments, notes=''):
         conn.close()
 
 
+@serialized_write()
 def confirm_receipt_b(task_id, received_by):
     """B流程：部門確認收到通知"""
     conn = get_connection()
     try:
+        begin_write(conn)
         task = conn.execute(
             "SELECT * FROM circulation_tasks WHERE id=?", (task_id,)
         ).fetchone()
@@ -890,6 +1488,7 @@ def confirm_receipt_b(task_id, received_by):
 
 # ----- C流程：修改發行 -----
 
+@serialized_write()
 def create_flow_c(drawing_id, rev_code, issued_by, dept_person_list, notes=''):
     """建立C流程：發行更改圖面給指定人員
 
@@ -897,6 +1496,7 @@ def create_flow_c(drawing_id, rev_code, issued_by, dept_person_list, notes=''):
     """
     conn = get_connection()
     try:
+        begin_write(conn)
         conn.execute(
             """INSERT INTO circulation_orders
                (drawing_id, rev_code, issued_by, notes, flow_type)
@@ -931,10 +1531,12 @@ def create_flow_c(drawing_id, rev_code, issued_by, dept_person_list, notes=''):
         conn.close()
 
 
+@serialized_write()
 def confirm_receipt_c(task_id, received_by):
     """C流程：指定人員確認收到更改圖面"""
     conn = get_connection()
     try:
+        begin_write(conn)
         task = conn.execute(
             "SELECT * FROM circulation_tasks WHERE id=?", (task_id,)
         ).fetchone()
@@ -980,3 +1582,565 @@ def confirm_receipt_c(task_id, received_by):
         conn.commit()
     finally:
         conn.close()
+
+
+# ----- 批次發行 -----
+
+_FLOW_A_TASKS = [
+    (1, '車工部整理', '車工部', '進行中'),
+    (2, '管理部寄客戶', '管理部', '待處理'),
+    (3, '客戶確認', '管理部', '待處理'),
+]
+
+
+@serialized_write()
+def create_flows_batch(flow_type, drawings, issued_by, departments=None,
+                       dept_person_list=None, notes='', skip_active=True):
+    """一次為多張圖面建立同類型流程（單一交易）
+
+    drawings: [(drawing_id, rev_code), ...]
+    departments: B流程發行部門；dept_person_list: C流程人員（格式同 create_flow_c）
+    skip_active: 圖面已有進行中的流程時略過
+
+    Returns:
+        {'orders': {drawing_id: order_id}, 'tasks': 任務數,
+         'skipped': [drawing_id, ...]}
+    """
+    from config import FLOW_A_STEPS
+    if flow_type == 'A':
+        task_specs = [(step, name, dept, None, status)
+                      for step, name, dept, status in _FLOW_A_TASKS]
+        action, description = '建立A流程', notes or '客戶圖面流程：車工部整理→管理部寄客戶→客戶確認'
+    elif flow_type == 'B':
+        task_specs = [(None, None, dept, None, '待通知') for dept in departments or []]
+        action, description = '建立B流程', notes or f'劦佑圖面發行至 {", ".join(departments or [])}'
+    elif flow_type == 'C':
+        task_specs = [(None, None, p['department'], p['assignee'], '待通知')
+                      for p in dept_person_list or []]
+        names = [f"{p['department']}-{p['assignee']}" for p in dept_person_list or []]
+        action, description = '建立C流程', notes or f'修改發行至 {", ".join(names)}'
+    else:
+        raise ValueError(f"未知的流程類型：{flow_type}")
+    if not task_specs:
+        raise ValueError("未指定發行部門或人員")
+
+    summary = {'orders': {}, 'tasks': 0, 'skipped': []}
+    conn = get_connection()
+    try:
+        # 取得寫入鎖，確保新建發行單的 id 連續且不與其他工作站交錯
+        begin_write(conn)
+
+        wanted = {}
+        for drawing_id, rev_code in drawings:
+            wanted.setdefault(drawing_id, rev_code)
+        existing = _fetch_in(conn, "SELECT id FROM drawings WHERE id IN ({})", list(wanted))
+        busy = set()
+        if skip_active:
+            busy = {r['drawing_id'] for r in _fetch_in(
+                conn,
+                "SELECT DISTINCT drawing_id FROM circulation_orders "
+                "WHERE status='發行中' AND drawing_id IN ({})", list(wanted))}
+        valid_ids = {r['id'] for r in existing}
+        targets = [(d, rev) for d, rev in wanted.items() if d in valid_ids and d not in busy]
+        summary['skipped'] = [d for d in wanted if d not in valid_ids or d in busy]
+        if not targets:
+            conn.rollback()
+            return summary
+
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM circulation_orders").fetchone()[0]
+        flow_a_step = FLOW_A_STEPS[0] if flow_type == 'A' else None
+        conn.executemany(
+            """INSERT INTO circulation_orders
+               (drawing_id, rev_code, issued_by, notes, flow_type, flow_a_step)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(d, rev, issued_by, notes, flow_type, flow_a_step) for d, rev in targets]
+        )
+        orders = conn.execute(
+            "SELECT id, drawing_id FROM circulation_orders WHERE id > ? ORDER BY id",
+            (last_id,)
+        ).fetchall()
+
+        conn.executemany(
+            """INSERT INTO circulation_tasks
+               (order_id, department, assignee, step_number, step_name, status)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(o['id'], dept, assignee, step, name, status)
+             for o in orders
+             for step, name, dept, assignee, status in task_specs]
+        )
+        conn.executemany(
+            """INSERT INTO circulation_logs (order_id, action, operator, description)
+               VALUES (?, ?, ?, ?)""",
+            [(o['id'], action, issued_by, description) for o in orders]
+        )
+        conn.execute(
+            """UPDATE drawings SET status='發行中', updated_at=datetime('now','localtime')
+               WHERE id IN (SELECT drawing_id FROM circulation_orders WHERE id > ?)""",
+            (last_id,)
+        )
+        conn.commit()
+
+        summary['orders'] = {o['drawing_id']: o['id'] for o in orders}
+        summary['tasks'] = len(orders) * len(task_specs)
+        return summary
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+@serialized_write()
+def confirm_receipts_batch(received_by, department=None, task_ids=None,
+                           order_ids=None, assignee=None):
+    """B/C流程批次確認收到（單一交易）
+
+    以 task_ids 指定任務，或以 department（可加 assignee / order_ids）
+    選取該部門所有「待通知」的任務。全部任務收到後的發行單與圖面自動完成。
+
+    Returns:
+        {'confirmed': 任務數, 'orders_completed': 發行單數,
+         'drawings_completed': [drawing_id, ...]}
+    """
+    summary = {'confirmed': 0, 'orders_completed': 0, 'drawings_completed': []}
+    if task_ids is None and department is None:
+        return summary
+
+    conn = get_connection()
+    try:
+        begin_write(conn)
+
+        sql = """SELECT ct.id, ct.order_id, ct.department, co.flow_type
+                 FROM circulation_tasks ct
+                 JOIN circulation_orders co ON ct.order_id = co.id
+                 WHERE ct.status = '待通知' AND co.flow_type IN ('B', 'C')
+                   AND co.status = '發行中'"""
+        params = []
+        if department:
+            sql += " AND ct.department = ?"
+            params.append(department)
+        if assignee:
+            sql += " AND ct.assignee = ?"
+            params.append(assignee)
+        tasks = []
+        if task_ids is not None:
+            tasks = _fetch_in(conn, sql + " AND ct.id IN ({})", list(task_ids), params)
+        elif order_ids is not None:
+            tasks = _fetch_in(conn, sql + " AND ct.order_id IN ({})", list(order_ids), params)
+        else:
+            tasks = conn.execute(sql, params).fetchall()
+        if not tasks:
+            conn.rollback()
+            return summary
+
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn.executemany(
+            """UPDATE circulation_tasks
+               SET status='已收到', received_by=?, received_at=?
+               WHERE id=?""",
+            [(received_by, now, t['id']) for t in tasks]
+        )
+        conn.executemany(
+            """INSERT INTO circulation_logs
+               (order_id, task_id, action, operator, department, description)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            [(t['order_id'], t['id'],
+              '收到通知' if t['flow_type'] == 'B' else '收到更改',
+              received_by, t['department'],
+              f"{t['department']} {received_by} 已收到"
+              + ('' if t['flow_type'] == 'B' else '更改圖面'))
+             for t in tasks]
+        )
+
+        # 已無待收任務的發行單 → 完成
+        flow_of = {t['order_id']: t['flow_type'] for t in tasks}
+        done = _fetch_in(
+            conn,
+            """SELECT co.id, co.drawing_id FROM circulation_orders co
+               WHERE co.id IN ({})
+                 AND NOT EXISTS (SELECT 1 FROM circulation_tasks ct
+                                 WHERE ct.order_id = co.id AND ct.status != '已收到')""",
+            list(flow_of))
+        if done:
+            conn.executemany(
+                "UPDATE circulation_orders SET status='已完成' WHERE id=?",
+                [(o['id'],) for o in done]
+            )
+            conn.executemany(
+                """UPDATE drawings SET status='已完成', updated_at=datetime('now','localtime')
+                   WHERE id=?""",
+                [(o['drawing_id'],) for o in done]
+            )
+            conn.executemany(
+                """INSERT INTO circulation_logs (order_id, action, operator, description)
+                   VALUES (?, ?, ?, ?)""",
+                [(o['id'],
+                  '全部收到' if flow_of[o['id']] == 'B' else '全部收到更改',
+                  received_by,
+                  '所有部門已確認收到' if flow_of[o['id']] == 'B'
+                  else '所有指定人員已確認收到更改圖面')
+                 for o in done]
+            )
+        conn.commit()
+
+        summary['confirmed'] = len(tasks)
+        summary['orders_completed'] = len(done)
+        summary['drawings_completed'] = [o['drawing_id'] for o in done]
+        return summary
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# ----- 待辦收件匣 -----
+
+# 等待部門/人員處理的任務狀態（A流程尚未輪到的「待處理」步驟除外）
+INBOX_STATUSES = ('待通知', '待處理', '進行中')
+
+_INBOX_SELECT = """
+    SELECT ct.*, co.drawing_id, co.rev_code, co.flow_type, co.flow_a_step,
+           co.issued_by, co.issued_at, co.notes AS order_notes,
+           d.drawing_number, d.title, d.status AS drawing_status,
+           r.id AS revision_id, r.file_path AS revision_file
+    FROM circulation_tasks ct
+    JOIN circulation_orders co ON ct.order_id = co.id
+    JOIN drawings d ON co.drawing_id = d.id
+    LEFT JOIN revisions r ON r.id = (
+        SELECT MAX(id) FROM revisions
+        WHERE drawing_id = co.drawing_id AND rev_code = co.rev_code)
+"""
+
+
+def _inbox_where(department, assignee):
+    """（內部）收件匣篩選條件；同時指定時為「指派給本人，或本部門未指派」"""
+    placeholders = ','.join('?' * len(INBOX_STATUSES))
+    where = [f"ct.status IN ({placeholders})",
+             "co.status = '發行中'",
+             "NOT (co.flow_type = 'A' AND ct.status = '待處理')"]
+    params = list(INBOX_STATUSES)
+    if department and assignee:
+        where.append("(ct.assignee = ? OR (ct.department = ? AND ct.assignee IS NULL))")
+        params += [assignee, department]
+    elif assignee:
+        where.append("ct.assignee = ?")
+        params.append(assignee)
+    elif department:
+        where.append("ct.department = ?")
+        params.append(department)
+    return where, params
+
+
+def get_inbox_tasks(department=None, assignee=None, limit=50, before_id=None):
+    """取得部門或人員待處理的發行任務（含圖面、版次、發行單資訊）
+
+    依任務 id 由新到舊，以 before_id 取下一頁（keyset 分頁，不隨歷史筆數變慢）。
+    """
+    where, params = _inbox_where(department, assignee)
+    if before_id is not None:
+        where.append("ct.id < ?")
+        params.append(before_id)
+    conn = get_connection()
+    try:
+        return conn.execute(
+            _INBOX_SELECT + " WHERE " + " AND ".join(where)
+            + " ORDER BY ct.id DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def count_inbox_tasks(department=None, assignee=None):
+    """待處理發行任務數量"""
+    where, params = _inbox_where(department, assignee)
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT COUNT(*) FROM circulation_tasks ct
+               JOIN circulation_orders co ON ct.order_id = co.id
+               WHERE """ + " AND ".join(where),
+            params
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_inbox_counts_by_department():
+    """各部門待處理發行任務數：{department: count}"""
+    where, params = _inbox_where(None, None)
+    conn = get_connection()
+    try:
+        rows = conn.execute(
+            """SELECT ct.department, COUNT(*) AS c FROM circulation_tasks ct
+               JOIN circulation_orders co ON ct.order_id = co.id
+               WHERE """ + " AND ".join(where) + " GROUP BY ct.department",
+            params
+        ).fetchall()
+        return {r['department']: r['c'] for r in rows}
+    finally:
+        conn.close()
+
+
+# ----- 發行時效統計 -----
+# 耗時定義：B/C流程為任務建立（發行）到收到；A流程每個步驟為上一步確認（或發行）到本步確認
+
+_LATENCY_CTE = """
+    WITH a_steps AS (
+        SELECT ct.step_name AS group_key, ct.confirmed_at AS done_at,
+               COALESCE(LAG(ct.confirmed_at) OVER (
+                   PARTITION BY ct.order_id ORDER BY ct.step_number), ct.created_at) AS start_at
+        FROM circulation_tasks ct
+        JOIN circulation_orders co ON ct.order_id = co.id
+        WHERE co.flow_type = 'A'
+    ),
+    durations AS (
+        SELECT 'A' AS flow_type, group_key, done_at,
+               (julianday(done_at) - julianday(start_at)) * 24 AS hours
+        FROM a_steps WHERE done_at IS NOT NULL
+        UNION ALL
+        SELECT co.flow_type, ct.department, ct.received_at,
+               (julianday(ct.received_at) - julianday(ct.created_at)) * 24
+        FROM circulation_tasks ct
+        JOIN circulation_orders co ON ct.order_id = co.id
+        WHERE co.flow_type IN ('B', 'C') AND ct.received_at IS NOT NULL
+    )
+"""
+
+
+def get_circulation_latency_stats(since=None):
+    """各流程 × 部門（A流程為步驟）的耗時分佈（小時），單一視窗函數查詢
+
+    Returns:
+        rows: flow_type, group_key, count, avg_hours, p50_hours, p95_hours, max_hours
+    """
+    conn = get_connection()
+    try:
+        return conn.execute(
+            _LATENCY_CTE + """,
+            ranked AS (
+                SELECT flow_type, group_key, hours,
+                       ROW_NUMBER() OVER (PARTITION BY flow_type, group_key
+                                          ORDER BY hours) AS rn,
+                       COUNT(*) OVER (PARTITION BY flow_type, group_key) AS cnt
+                FROM durations
+                WHERE ? IS NULL OR done_at >= ?
+            )
+            SELECT flow_type, group_key, cnt AS count,
+                   AVG(hours) AS avg_hours,
+                   MAX(CASE WHEN rn = (cnt * 50 + 99) / 100 THEN hours END) AS p50_hours,
+                   MAX(CASE WHEN rn = (cnt * 95 + 99) / 100 THEN hours END) AS p95_hours,
+                   MAX(hours) AS max_hours
+            FROM ranked
+            GROUP BY flow_type, group_key
+            ORDER BY flow_type, group_key""",
+            (since, since)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def get_overdue_circulation_tasks(sla_hours):
+    """超過時效標準仍未處理的發行任務
+
+    sla_hours: {'A': 時數, 'B': 時數, 'C': 時數}
+    Returns:
+        rows（依等待時數由長到短）：task_id, order_id, flow_type, department, assignee,
+        step_name, drawing_number, title, rev_code, waiting_hours, sla_hours
+    """
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """WITH pending AS (
+                   SELECT ct.id AS task_id, ct.order_id, co.flow_type, ct.department,
+                          ct.assignee, ct.step_name, ct.status, co.drawing_id, co.rev_code,
+                          CASE WHEN co.flow_type = 'A' THEN COALESCE(LAG(ct.confirmed_at) OVER (
+                                   PARTITION BY ct.order_id ORDER BY ct.step_number), ct.created_at)
+                               ELSE ct.created_at END AS start_at
+                   FROM circulation_tasks ct
+                   JOIN circulation_orders co ON ct.order_id = co.id
+                   WHERE co.status = '發行中'
+               ),
+               waiting AS (
+                   SELECT p.*, (julianday('now', 'localtime') - julianday(p.start_at)) * 24
+                               AS waiting_hours,
+                          CASE p.flow_type WHEN 'A' THEN ? WHEN 'B' THEN ? ELSE ? END AS sla_hours
+                   FROM pending p
+                   WHERE (p.flow_type = 'A' AND p.status = '進行中')
+                      OR (p.flow_type IN ('B', 'C') AND p.status = '待通知')
+               )
+               SELECT w.*, d.drawing_number, d.title
+               FROM waiting w
+               JOIN drawings d ON w.drawing_id = d.id
+               WHERE w.waiting_hours > w.sla_hours
+               ORDER BY w.waiting_hours DESC""",
+            (sla_hours['A'], sla_hours['B'], sla_hours['C'])
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+@serialized_write()
+def refresh_sla_rollup(bucket_bounds, sla_hours):
+    """將上次彙總後新增的收到/確認紀錄累加到 circulation_sla_rollup
+
+    以 circulation_logs.id 為進度標記，只處理新的歷程，不重掃全部資料。
+    bucket_bounds: 遞增的耗時分桶上限（小時），超過最後一個上限者歸入最後一桶
+    Returns: 本次涵蓋的歷程 id 範圍（0 表示沒有新資料）
+    """
+    bucket_case = "CASE " + " ".join(
+        f"WHEN hours < ? THEN {i}" for i in range(len(bucket_bounds))
+    ) + f" ELSE {len(bucket_bounds)} END"
+
+    conn = get_connection()
+    try:
+        begin_write(conn)
+        row = conn.execute(
+            "SELECT last_id FROM analytics_watermarks WHERE name = 'circulation_sla'"
+        ).fetchone()
+        last_id = row['last_id'] if row else 0
+        max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM circulation_logs").fetchone()[0]
+        if max_id <= last_id:
+            conn.rollback()
+            return 0
+
+        conn.execute(
+            """WITH src AS (
+                   SELECT ct.*, co.flow_type
+                   FROM circulation_logs l
+                   JOIN circulation_tasks ct ON ct.id = l.task_id
+                   JOIN circulation_orders co ON co.id = ct.order_id
+                   WHERE l.id > ? AND l.id <= ?
+                     AND (l.action IN ('收到通知', '收到更改') OR l.action LIKE '完成：%')
+               ),
+               d AS (
+                   SELECT flow_type,
+                          CASE WHEN flow_type = 'A' THEN COALESCE(step_name, '')
+                               ELSE department END AS group_key,
+                          CASE WHEN flow_type = 'A' THEN confirmed_at
+                               ELSE received_at END AS done_at,
+                          CASE WHEN flow_type = 'A' THEN COALESCE(
+                                   (SELECT p.confirmed_at FROM circulation_tasks p
+                                    WHERE p.order_id = src.order_id
+                                      AND p.step_number = src.step_number - 1),
+                                   src.created_at)
+                               ELSE src.created_at END AS start_at
+                   FROM src
+               ),
+               h AS (
+                   SELECT flow_type, group_key, date(done_at) AS day,
+                          (julianday(done_at) - julianday(start_at)) * 24 AS hours
+                   FROM d WHERE done_at IS NOT NULL
+               )
+               INSERT INTO circulation_sla_rollup
+                   (flow_type, group_key, day, bucket, count, total_hours, max_hours, over_sla)
+               SELECT flow_type, group_key, day, """ + bucket_case + """ AS bucket,
+                      COUNT(*), SUM(hours), MAX(hours),
+                      SUM(hours > CASE flow_type WHEN 'A' THEN ? WHEN 'B' THEN ? ELSE ? END)
+               FROM h
+               WHERE true
+               GROUP BY flow_type, group_key, day, bucket
+               ON CONFLICT (flow_type, group_key, day, bucket) DO UPDATE SET
+                   count = count + excluded.count,
+                   total_hours = total_hours + excluded.total_hours,
+                   max_hours = MAX(max_hours, excluded.max_hours),
+                   over_sla = over_sla + excluded.over_sla""",
+            [last_id, max_id] + list(bucket_bounds)
+            + [sla_hours['A'], sla_hours['B'], sla_hours['C']]
+        )
+        conn.execute(
+            """INSERT INTO analytics_watermarks (name, last_id, updated_at)
+               VALUES ('circulation_sla', ?, datetime('now','localtime'))
+               ON CONFLICT (name) DO UPDATE SET
+                   last_id = excluded.last_id, updated_at = excluded.updated_at""",
+            (max_id,)
+        )
+        conn.commit()
+        return max_id - last_id
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def get_sla_rollup(since=None):
+    """讀取時效彙總（跨日合併）：flow_type, group_key, bucket, count, total_hours, max_hours, over_sla"""
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT flow_type, group_key, bucket,
+                      SUM(count) AS count, SUM(total_hours) AS total_hours,
+                      MAX(max_hours) AS max_hours, SUM(over_sla) AS over_sla
+               FROM circulation_sla_rollup
+               WHERE ? IS NULL OR day >= ?
+               GROUP BY flow_type, group_key, bucket
+               ORDER BY flow_type, group_key, bucket""",
+            (since, since)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+# ===== 資料異動紀錄 =====
+
+def get_latest_change_seq():
+    """目前最新的異動序號（無紀錄時為 0）"""
+    conn = get_connection()
+    try:
+        return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def get_changes_since(since_seq, limit=1000):
+    """取得 seq > since_seq 的異動（依 seq 遞增，最多 limit 筆）
+
+    Returns:
+        [Row(seq, table_name, row_id, op, drawing_id, changed_at)]
+    """
+    conn = get_connection()
+    try:
+        return conn.execute(
+            """SELECT seq, table_name, row_id, op, drawing_id, changed_at
+               FROM change_log WHERE seq > ? ORDER BY seq LIMIT ?""",
+            (since_seq, limit)
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def prune_change_log(keep_days=7):
+    """刪除超過 keep_days 天的異動紀錄。回傳刪除筆數
+
+    seq 為 AUTOINCREMENT，刪除後序號不會重複使用，輪詢位置不受影響。
+    """
+    conn = get_connection()
+    try:
+        cur = conn.execute(
+            """DELETE FROM change_log
+               WHERE changed_at < datetime('now', 'localtime', ?)""",
+            (f'-{int(keep_days)} days',)
+        )
+        conn.commit()
+        return cur.rowcount
+    except Exception as e:
+        print(f"[清理異動紀錄失敗] {e}")
+        return 0
+    finally:
+        conn.close()
+
+
+# SQLite 預設參數上限為 999，IN 清單分段查詢
+_IN_CHUNK = 500
+
+
+def _fetch_in(conn, sql, ids, params=()):
+    """（內部）以 IN (...) 分段查詢，sql 需含一個 {} 佔位"""
+    rows = []
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[i:i + _IN_CHUNK]
+        rows.extend(conn.execute(sql.format(','.join('?' * len(chunk))),
+                                 list(params) + chunk).fetchall())
+    return rows
@@ -0,0 +1,232 @@
+"""寫入協調 — 多台工作站共用資料庫時的鎖定等待、重試與寫入序列化
+
+SQLite 同一時間只允許一個寫入者：
+- 連線的 busy timeout（DB_BUSY_TIMEOUT_MS）讓 SQLite 在鎖定時等待而非立即失敗
+- 先讀後寫的流程（例如 advance_flow_a）以 begin_write() 開始 BEGIN IMMEDIATE 交易，
+  一開始就取得寫入鎖，避免讀取後才升級為寫入時遇到無法等待的 SQLITE_BUSY
+- @serialized_write 在同一程序內以鎖排隊寫入（背景查詢執行緒不會互搶），
+  仍遇到「database is locked」時以隨機退避重試整個函式，並累計爭用統計
+
+被裝飾的函式必須可整段重新執行：失敗時交易尚未提交，連線關閉即回滾。
+
+壓力測試（於暫存資料庫模擬 N 個工作站同時寫入）：
+    python -m db.write_coordinator 8 200
+"""
+import time
+import random
+import sqlite3
+import threading
+import functools
+from config import DB_WRITE_RETRIES, DB_RETRY_BACKOFF
+
+# 同一程序內的寫入鎖（可重入：寫入函式內呼叫其他寫入函式不會自我阻塞）
+_write_lock = threading.RLock()
+
+
+class WriteStats:
+    """各寫入函式的爭用統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}    # name -> dict
+
+    def _stat(self, name):
+        return self._stats.setdefault(name, {
+            'calls': 0, 'busy': 0, 'retries': 0, 'failures': 0,
+            'wait_seconds': 0.0, 'max_wait': 0.0,
+        })
+
+    def record_call(self, name, waited, first=True):
+        with self._lock:
+            s = self._stat(name)
+            if first:
+                s['calls'] += 1
+            s['wait_seconds'] += waited
+            s['max_wait'] = max(s['max_wait'], waited)
+
+    def record_busy(self, name, retried):
+        with self._lock:
+            s = self._stat(name)
+            s['busy'] += 1
+            if retried:
+                s['retries'] += 1
+            else:
+                s['failures'] += 1
+
+    def snapshot(self):
+        """取得統計副本：{name: {'calls', 'busy', 'retries', 'failures', 'wait_seconds', 'max_wait'}}"""
+        with self._lock:
+            return {name: dict(s) for name, s in self._stats.items()}
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+
+# 全域統計實例
+write_stats = WriteStats()
+
+
+def is_lock_error(exc):
+    """是否為資料庫鎖定（其他連線正在寫入）造成的錯誤"""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    msg = str(exc).lower()
+    return 'locked' in msg or 'busy' in msg
+
+
+def begin_write(conn):
+    """開始 BEGIN IMMEDIATE 交易（立即取得寫入鎖，鎖定時依 busy timeout 等待）"""
+    conn.execute("BEGIN IMMEDIATE")
+
+
+def backoff_delay(attempt, base=DB_RETRY_BACKOFF[0], cap=DB_RETRY_BACKOFF[1]):
+    """第 attempt 次重試前的等待秒數（指數退避 + full jitter，避免多台同時重試）"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def serialized_write(name=None, retries=DB_WRITE_RETRIES):
+    """寫入函式裝飾器：程序內排隊寫入，鎖定錯誤時以隨機退避重試"""
+    def decorator(fn):
+        op = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            attempt = 0
+            while True:
+                started = time.perf_counter()
+                with _write_lock:
+                    write_stats.record_call(op, time.perf_counter() - started, attempt == 0)
+                    try:
+                        return fn(*args, **kwargs)
+                    except sqlite3.OperationalError as e:
+                        if not is_lock_error(e):
+                            raise
+                        retry = attempt < retries
+                        write_stats.record_busy(op, retry)
+                        if not retry:
+                            print(f"[寫入失敗] {op} 重試 {retries} 次仍被鎖定 → {e}")
+                            raise
+                # 退避時釋放程序內的鎖，讓其他執行緒先寫
+                time.sleep(backoff_delay(attempt))
+                attempt += 1
+        return wrapper
+    return decorator
+
+
+def get_write_stats():
+    return write_stats.snapshot()
+
+
+def reset_write_stats():
+    write_stats.reset()
+
+
+# ===== 壓力測試 =====
+
+def _stress_worker(args):
+    """（子程序）模擬一台工作站：反覆建立 B/A 流程、確認收到、推進步驟"""
+    db_path, worker_id, ops, drawing_ids = args
+    import db.database as database
+    database.DB_PATH = db_path
+    from db import queries
+    # 以 python -m 執行時本檔為 __main__，統計需取自 queries 使用的模組實例
+    from db.write_coordinator import get_write_stats as worker_stats
+
+    rng = random.Random(worker_id)
+    operator = f'壓測{worker_id}'
+    latencies = []
+    errors = 0
+    for _ in range(ops):
+        drawing_id = rng.choice(drawing_ids)
+        started = time.perf_counter()
+        try:
+            if rng.random() < 0.5:
+                order_id = queries.create_flow_b(drawing_id, 'A', operator, ['車工部', '管理部'])
+                for task in queries.get_circulation_tasks(order_id):
+                    queries.confirm_receipt_b(task['id'], operator)
+            else:
+                order_id = queries.create_flow_a(drawing_id, 'A', operator)
+                for _ in range(3):
+                    queries.advance_flow_a(order_id, operator)
+        except sqlite3.OperationalError as e:
+            if not is_lock_error(e):
+                raise
+            errors += 1
+        latencies.append(time.perf_counter() - started)
+    return {'latencies': latencies, 'errors': errors, 'stats': worker_stats()}
+
+
+def run_stress_test(writers=8, ops_per_writer=100, db_path=None):
+    """以 writers 個程序同時寫入同一個暫存資料庫，回傳彙總結果
+
+    每個程序有獨立連線與程序內鎖，等同多台工作站共用資料庫。
+    """
+    import os
+    import tempfile
+    from multiprocessing import Pool
+    import db.database as database
+
+    if db_path is None:
+        db_path = os.path.join(tempfile.mkdtemp(prefix='dms_stress_'), 'stress.db')
+    original = database.DB_PATH
+    database.DB_PATH = db_path
+    try:
+        database.init_db()
+        conn = database.get_connection()
+        try:
+            client_id = conn.execute(
+                "INSERT INTO clients (name) VALUES ('壓力測試')").lastrowid
+            project_id = conn.execute(
+                "INSERT INTO projects (client_id, name) VALUES (?, '壓力測試')",
+                (client_id,)).lastrowid
+            drawing_ids = [conn.execute(
+                """INSERT INTO drawings (project_id, drawing_number, title, current_rev)
+                   VALUES (?, ?, '壓力測試', 'A')""",
+                (project_id, f'STRESS-{i:03d}')).lastrowid for i in range(20)]
+            conn.commit()
+        finally:
+            conn.close()
+    finally:
+        database.DB_PATH = original
+
+    started = time.perf_counter()
+    with Pool(writers) as pool:
+        results = pool.map(_stress_worker, [(db_path, w, ops_per_writer, drawing_ids)
+                                            for w in range(writers)])
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(t for r in results for t in r['latencies'])
+    totals = {}
+    for r in results:
+        for op, s in r['stats'].items():
+            t = totals.setdefault(op, {'calls': 0, 'busy': 0, 'retries': 0, 'failures': 0,
+                                       'wait_seconds': 0.0, 'max_wait': 0.0})
+            for key in ('calls', 'busy', 'retries', 'failures', 'wait_seconds'):
+                t[key] += s[key]
+            t['max_wait'] = max(t['max_wait'], s['max_wait'])
+    return {
+        'db_path': db_path,
+        'writers': writers,
+        'operations': len(latencies),
+        'errors': sum(r['errors'] for r in results),
+        'elapsed': elapsed,
+        'p50': latencies[len(latencies) // 2] if latencies else 0,
+        'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+        'max': latencies[-1] if latencies else 0,
+        'stats': totals,
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    n_writers = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    n_ops = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    result = run_stress_test(n_writers, n_ops)
+    print(f"{result['writers']} 個寫入者、{result['operations']} 次操作，"
+          f"耗時 {result['elapsed']:.1f} 秒，失敗 {result['errors']} 次")
+    print(f"每次操作 p50 {result['p50'] * 1000:.0f} ms / p95 {result['p95'] * 1000:.0f} ms"
+          f" / 最大 {result['max'] * 1000:.0f} ms")
+    for op, s in sorted(result['stats'].items()):
+        print(f"  {op:<22} 呼叫 {s['calls']:>6}  鎖定 {s['busy']:>4}  重試 {s['retries']:>4}"
+              f"  放棄 {s['failures']:>3}")
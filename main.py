@@ -7,14 +7,24 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 import tkinter.font as tkfont
 import ttkbootstrap as ttk
 from db.database import init_db
-from ui.main_window import MainWindow
-from ui.styles import apply_styles
-from config import get_icon_path, FONT_FAMILY, COMPANY_NAME
+from config import get_icon_path, FONT_FAMILY, COMPANY_NAME, API_SERVER_URL, QUERY_PROFILING
 
 
 def main():
-    # 初始化資料庫
-    init_db()
+    if API_SERVER_URL:
+        # 用戶端模式：查詢改由 API 伺服器執行（需在匯入介面模組前切換）
+        from db.api_client import install
+        install(API_SERVER_URL)
+    else:
+        # 初始化資料庫
+        init_db()
+
+    if QUERY_PROFILING:
+        from db import instrumentation
+        instrumentation.enable()
+
+    from ui.main_window import MainWindow
+    from ui.styles import apply_styles
 
     # 建立主視窗
     root = ttk.Window(
@@ -49,4 +59,7 @@ def main():
 
 
 if __name__ == '__main__':
+    # 打包為執行檔時，程序池（圖檔文字擷取、批次 PDF）的子程序需要
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
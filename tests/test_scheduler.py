@@ -0,0 +1,34 @@
+"""core.scheduler 要徑與浮時計算"""
+from core.scheduler import ProductionSchedule
+
+
+def _task(tid, order_id, start, end, depends_on=None, status='待處理'):
+    return {'id': tid, 'production_order_id': order_id, 'start_date': start,
+            'end_date': end, 'depends_on': depends_on, 'status': status}
+
+
+def test_independent_orders_keep_own_critical_path():
+    tasks = [
+        # 生產單 1：1 → 2 為要徑，3 有浮時
+        _task(1, 1, '2025-01-01', '2025-01-05'),
+        _task(2, 1, '2025-01-06', '2025-01-10', '1'),
+        _task(3, 1, '2025-01-01', '2025-01-03'),
+        # 生產單 2：較晚結束，不應影響生產單 1
+        _task(4, 2, '2025-03-01', '2025-03-10'),
+        _task(5, 2, '2025-03-11', '2025-03-31', '4'),
+    ]
+    schedule = ProductionSchedule(tasks)
+    assert set(schedule.critical_path()) == {1, 2, 4, 5}
+    assert schedule.slack(3) == 7
+    assert schedule.slack(1) == 0 and schedule.slack(4) == 0
+
+
+def test_undated_task_does_not_shift_critical_path():
+    tasks = [
+        _task(1, 1, '2025-01-01', '2025-01-05'),
+        _task(2, 1, '2025-01-06', '2025-01-10', '1'),
+        _task(3, 1, None, None, '2'),
+    ]
+    schedule = ProductionSchedule(tasks)
+    assert schedule.critical_path() == [1, 2]
+    assert schedule.date_updates() == []
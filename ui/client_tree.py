@@ -5,6 +5,7 @@ from db import queries
 from ui.dialogs.client_dialog import ClientDialog
 from ui.dialogs.project_dialog import ProjectDialog
 from config import FONT_FAMILY
+from core.query_executor import get_query_executor
 
 
 class ClientTree(ttk.Frame):
@@ -36,6 +37,7 @@ class ClientTree(ttk.Frame):
         scrollbar.pack(side=RIGHT, fill=Y)
 
         self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<<TreeviewOpen>>', self._on_open)
         self.tree.bind('<Button-3>', self._on_right_click)
 
         # 按鈕列
@@ -48,10 +50,16 @@ class ClientTree(ttk.Frame):
         self.context_menu = Menu(self, tearoff=0)
 
     def refresh(self):
-        """重新載入樹狀圖"""
-        self.tree.delete(*self.tree.get_children())
+        """重新載入樹狀圖（背景查詢，專案於展開時才載入）"""
+        get_query_executor(self).submit(
+            'client_tree', queries.get_clients_with_project_counts,
+            on_done=self._populate)
+
+    def _populate(self, clients):
+        # 記住已展開的客戶，重新載入後還原
+        expanded = [iid for iid in self.tree.get_children() if self.tree.item(iid, 'open')]
 
-        clients = queries.get_all_clients()
+        self.tree.delete(*self.tree.get_children())
         for client in clients:
             client_node = self.tree.insert(
                 '', 'end',
@@ -59,13 +67,37 @@ class ClientTree(ttk.Frame):
                 text=f"📁 {client['name']}",
                 open=False
             )
-            projects = queries.get_projects_by_client(client['id'])
-            for project in projects:
-                self.tree.insert(
-                    client_node, 'end',
-                    iid=f"p_{project['id']}",
-                    text=f"📋 {project['name']}"
-                )
+            if client['project_count']:
+                # 佔位子節點，讓客戶節點顯示展開符號
+                self.tree.insert(client_node, 'end', iid=f"ph_{client['id']}", text="…")
+
+        for iid in expanded:
+            if self.tree.exists(iid):
+                self._load_projects(iid, then_open=True)
+
+    def _on_open(self, event):
+        item = self.tree.focus()
+        if item.startswith('c_'):
+            self._load_projects(item)
+
+    def _load_projects(self, client_node, then_open=False):
+        """展開客戶時載入其專案（已載入則略過）"""
+        placeholder = f"ph_{client_node.split('_')[1]}"
+        if not self.tree.exists(placeholder):
+            if then_open:
+                self.tree.item(client_node, open=True)
+            return
+        client_id = int(client_node.split('_')[1])
+        projects = queries.get_projects_by_client(client_id)
+        self.tree.delete(placeholder)
+        for project in projects:
+            self.tree.insert(
+                client_node, 'end',
+                iid=f"p_{project['id']}",
+                text=f"📋 {project['name']}"
+            )
+        if then_open:
+            self.tree.item(client_node, open=True)
 
     def _on_select(self, event):
         selection = self.tree.selection()
@@ -98,6 +130,7 @@ class ClientTree(ttk.Frame):
         elif item.startswith('p_'):
             project_id = int(item.split('_')[1])
             self.context_menu.add_command(label="編輯專案", command=lambda: self._edit_project(project_id))
+            self.context_menu.add_command(label="批次發行圖面...", command=lambda: self._batch_issue(project_id))
             self.context_menu.add_separator()
             self.context_menu.add_command(label="刪除專案", command=lambda: self._delete_project(project_id))
 
@@ -149,6 +182,12 @@ class ClientTree(ttk.Frame):
         if dialog.result:
             self.refresh()
 
+    def _batch_issue(self, project_id):
+        from ui.dialogs.circulation_dialog import BatchIssueDialog
+        dialog = BatchIssueDialog(self.winfo_toplevel(), project_id)
+        if dialog.result and self.on_project_selected:
+            self.on_project_selected(project_id)
+
     def _delete_project(self, project_id):
         project = queries.get_project(project_id)
         if not project:
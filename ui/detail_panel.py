@@ -5,10 +5,14 @@ from tkinter import filedialog
 from db import queries
 from core.thumbnail_manager import save_thumbnail_full, load_full_image
 from core.file_manager import open_file
+from core.image_hash import similarity_index
+from core.query_executor import get_query_executor
 from config import IMAGE_FILETYPES, DEFAULT_OPERATOR
 from ui.dialogs.revision_dialog import RevisionDialog
 from ui.dialogs.drawing_dialog import DrawingDialog
 from ui.dialogs.circulation_dialog import CirculationFlowPanel
+from ui.dialogs.similar_drawings_dialog import SimilarDrawingsDialog
+from ui.dialogs.revision_diff_dialog import RevisionDiffDialog
 from ui.widgets.zoomable_viewer import ZoomableImageViewer
 
 
@@ -57,6 +61,10 @@ class DetailPanel(ttk.Frame):
                                                command=self._read_from_drawing_file,
                                                bootstyle=SUCCESS+OUTLINE, width=10)
         self.btn_thumb_from_file.pack(side=LEFT, padx=2)
+        self.btn_similar = ttk.Button(thumb_btn_frame, text="相似圖面",
+                                      command=self._find_similar,
+                                      bootstyle=SECONDARY+OUTLINE, width=10)
+        self.btn_similar.pack(side=LEFT, padx=2)
 
         # 圖片預覽（佔據剩餘空間）
         self.image_viewer = ZoomableImageViewer(preview_inner, height=220)
@@ -137,8 +145,18 @@ class DetailPanel(ttk.Frame):
         rev_frame = ttk.Frame(rev_outer, padding=5)
         rev_frame.pack(fill=BOTH, expand=True)
 
+        rev_btn_frame = ttk.Frame(rev_frame)
+        rev_btn_frame.pack(side=TOP, fill=X, pady=(0, 3))
+        self.btn_rev_diff = ttk.Button(rev_btn_frame, text="比較版次",
+                                       command=self._compare_revisions,
+                                       bootstyle=INFO+OUTLINE, width=10)
+        self.btn_rev_diff.pack(side=LEFT, padx=2)
+        ttk.Label(rev_btn_frame, text="選一個版次與前一版比較，或按 Ctrl 選兩個版次",
+                  foreground='#888888').pack(side=LEFT, padx=4)
+
         rev_cols = ('rev_code', 'rev_date', 'saved_by', 'notes')
-        self.rev_tree = ttk.Treeview(rev_frame, columns=rev_cols, show='headings', height=4)
+        self.rev_tree = ttk.Treeview(rev_frame, columns=rev_cols, show='headings', height=4,
+                                     selectmode='extended')
         self.rev_tree.heading('rev_code', text='版次')
         self.rev_tree.heading('rev_date', text='日期')
         self.rev_tree.heading('saved_by', text='儲存者')
@@ -151,6 +169,7 @@ class DetailPanel(ttk.Frame):
         self.rev_tree.configure(yscrollcommand=rev_scroll.set)
         self.rev_tree.pack(side=LEFT, fill=BOTH, expand=True)
         rev_scroll.pack(side=RIGHT, fill=Y)
+        self.rev_tree.bind('<Double-1>', self._open_revision)
 
         records_pw.add(rev_outer, minsize=80, stretch='always')
 
@@ -179,8 +198,8 @@ class DetailPanel(ttk.Frame):
         # 初始時停用按鈕
         self._set_buttons_state(DISABLED)
 
-    def load_drawing(self, drawing_id):
-        """載入指定圖面的詳細資訊"""
+    def load_drawing(self, drawing_id, log_access=True):
+        """載入指定圖面的詳細資訊；log_access=False 用於資料異動後的重新載入"""
         self._current_drawing_id = drawing_id
         drawing = queries.get_drawing(drawing_id)
         if not drawing:
@@ -200,12 +219,21 @@ class DetailPanel(ttk.Frame):
         self._load_preview(drawing_id)
         self._load_revisions(drawing_id)
 
-        queries.log_access(drawing_id, DEFAULT_OPERATOR, '檢視')
+        if log_access:
+            queries.log_access(drawing_id, DEFAULT_OPERATOR, '檢視')
         self._load_access_logs(drawing_id)
 
         self.circulation_panel.load(drawing_id, drawing['current_rev'] or 'A')
         self._set_buttons_state(NORMAL)
 
+    def reload(self):
+        """重新載入目前圖面（不新增檢視紀錄）"""
+        if self._current_drawing_id:
+            self.load_drawing(self._current_drawing_id, log_access=False)
+
+    def get_current_drawing_id(self):
+        return self._current_drawing_id
+
     def clear(self):
         self._current_drawing_id = None
         for var in self._info_vars.values():
@@ -224,7 +252,7 @@ class DetailPanel(ttk.Frame):
         self.rev_tree.delete(*self.rev_tree.get_children())
         revisions = queries.get_revisions(drawing_id)
         for rev in revisions:
-            self.rev_tree.insert('', 'end', values=(
+            self.rev_tree.insert('', 'end', iid=str(rev['id']), values=(
                 rev['rev_code'], rev['rev_date'],
                 rev['saved_by'], rev['notes'] or '',
             ))
@@ -240,7 +268,8 @@ class DetailPanel(ttk.Frame):
 
     def _set_buttons_state(self, state):
         for btn in [self.btn_open, self.btn_rev, self.btn_edit, self.btn_delete,
-                    self.btn_thumb_upload, self.btn_thumb_from_file]:
+                    self.btn_thumb_upload, self.btn_thumb_from_file, self.btn_similar,
+                    self.btn_rev_diff]:
             btn.config(state=state)
 
     def _open_file(self):
@@ -259,6 +288,58 @@ class DetailPanel(ttk.Frame):
         else:
             ttk.dialogs.Messagebox.show_info("尚未設定檔案路徑", title="提示", parent=self.winfo_toplevel())
 
+    def _open_revision(self, event=None):
+        """雙擊版次紀錄：開啟該版次檔案（差異儲存的舊版次會先還原）"""
+        selection = self.rev_tree.selection()
+        if not selection or not self._current_drawing_id:
+            return
+        rev = queries.get_revision(int(selection[0]))
+        if not rev:
+            return
+
+        if not rev['file_hash']:
+            self._open_revision_file(rev, rev['file_path'])
+            return
+
+        # 差異儲存的版次需沿差異鏈還原，在背景執行不阻塞畫面
+        from core.revision_store import materialize_revision
+        get_query_executor(self).submit(
+            f'open_revision:{id(self)}', materialize_revision, rev['id'],
+            on_done=lambda path: self._open_revision_file(rev, path or rev['file_path']),
+            on_error=lambda e: ttk.dialogs.Messagebox.show_error(
+                f"版次還原失敗：{e}", title="錯誤", parent=self.winfo_toplevel()))
+
+    def _open_revision_file(self, rev, path):
+        """開啟版次檔案並記錄存取（還原完成時使用者可能已切換到其他圖面）"""
+        if path and open_file(path):
+            queries.log_access(rev['drawing_id'], DEFAULT_OPERATOR,
+                               f'開啟版次 {rev["rev_code"]}')
+            if self._current_drawing_id == rev['drawing_id']:
+                self._load_access_logs(rev['drawing_id'])
+        else:
+            ttk.dialogs.Messagebox.show_warning(
+                f"找不到版次 {rev['rev_code']} 的檔案", title="檔案不存在",
+                parent=self.winfo_toplevel()
+            )
+
+    def _compare_revisions(self):
+        """比較選取的兩個版次；只選一個時與其前一版次比較"""
+        order = list(self.rev_tree.get_children())     # 新到舊
+        selection = sorted(self.rev_tree.selection(), key=order.index)
+        if len(selection) == 1:
+            pos = order.index(selection[0])
+            if pos + 1 >= len(order):
+                ttk.dialogs.Messagebox.show_info("這是最早的版次，沒有前一版可比較",
+                                                  title="提示", parent=self.winfo_toplevel())
+                return
+            selection.append(order[pos + 1])
+        if len(selection) != 2:
+            ttk.dialogs.Messagebox.show_info("請選擇一個或兩個版次", title="提示",
+                                              parent=self.winfo_toplevel())
+            return
+        newer, older = selection
+        RevisionDiffDialog(self.winfo_toplevel(), int(older), int(newer))
+
     def _upload_thumbnail(self):
         if not self._current_drawing_id:
             return
@@ -290,6 +371,7 @@ class DetailPanel(ttk.Frame):
         thumb_path = save_thumbnail_full(source_path, self._current_drawing_id)
         if thumb_path:
             queries.update_drawing_thumbnail(self._current_drawing_id, thumb_path)
+            similarity_index.invalidate()
             self._load_preview(self._current_drawing_id)
             ttk.dialogs.Messagebox.show_info("縮圖已更新", title="成功",
                                               parent=self.winfo_toplevel())
@@ -299,6 +381,12 @@ class DetailPanel(ttk.Frame):
                 title="讀取失敗", parent=self.winfo_toplevel()
             )
 
+    def _find_similar(self):
+        if not self._current_drawing_id:
+            return
+        SimilarDrawingsDialog(self.winfo_toplevel(), self._current_drawing_id,
+                              on_open=self.load_drawing)
+
     def _add_revision(self):
         if not self._current_drawing_id:
             return
@@ -358,6 +446,11 @@ class DetailPanel(ttk.Frame):
                         os.remove(thumb)
 
                 queries.delete_drawing(self._current_drawing_id)
+
+                # 清除已無版次參照的檔案庫內容
+                from core.blob_store import gc_blobs
+                gc_blobs()
+
                 self.clear()
                 if self.on_refresh:
                     self.on_refresh()
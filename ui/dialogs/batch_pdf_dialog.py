@@ -0,0 +1,170 @@
+"""批次匯出 PDF — 依期間、客戶、狀態一次匯出多張發票或報價單"""
+import threading
+from datetime import date, timedelta
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from tkinter import filedialog
+from db import business_queries as bq
+from core.batch_pdf import generate_batch, DOCUMENT_KINDS, OUTPUT_MODES
+from config import INVOICE_STATUS, QUOTATION_STATUS
+
+_STATUS_OPTIONS = {'invoice': INVOICE_STATUS, 'quotation': QUOTATION_STATUS}
+
+
+def _last_month():
+    """上個月的 (第一天, 最後一天)"""
+    last_day = date.today().replace(day=1) - timedelta(days=1)
+    return last_day.replace(day=1).isoformat(), last_day.isoformat()
+
+
+class BatchPdfDialog(ttk.Toplevel):
+    """批次匯出對話框；產生在背景執行緒進行，進度每 100 毫秒更新一次"""
+
+    def __init__(self, parent, kind):
+        super().__init__(parent)
+        self.kind = kind
+        label = DOCUMENT_KINDS[kind][0]
+        self.title(f"批次匯出{label} PDF")
+        self.geometry("460x330")
+        self.resizable(False, False)
+        self.transient(parent)
+
+        self._clients = {'全部': None}
+        for c in bq.get_all_clients_for_combo():
+            self._clients[c['name']] = c['id']
+        self._thread = None
+        self._cancel = threading.Event()
+        self._progress = (0, 0)
+        self._result = None
+
+        self._create_widgets()
+        self.protocol('WM_DELETE_WINDOW', self._on_close)
+
+    def _create_widgets(self):
+        frame = ttk.Frame(self, padding=15)
+        frame.pack(fill=BOTH, expand=True)
+        date_from, date_to = _last_month()
+
+        ttk.Label(frame, text="起日：").grid(row=0, column=0, sticky=W, pady=3)
+        self.e_from = ttk.Entry(frame, width=14)
+        self.e_from.insert(0, date_from)
+        self.e_from.grid(row=0, column=1, sticky=W, pady=3)
+        ttk.Label(frame, text="迄日：").grid(row=0, column=2, sticky=W, padx=(10, 0), pady=3)
+        self.e_to = ttk.Entry(frame, width=14)
+        self.e_to.insert(0, date_to)
+        self.e_to.grid(row=0, column=3, sticky=W, pady=3)
+
+        ttk.Label(frame, text="客戶：").grid(row=1, column=0, sticky=W, pady=3)
+        self.c_client = ttk.Combobox(frame, values=list(self._clients), state='readonly')
+        self.c_client.set('全部')
+        self.c_client.grid(row=1, column=1, columnspan=3, sticky=EW, pady=3)
+
+        ttk.Label(frame, text="狀態：").grid(row=2, column=0, sticky=W, pady=3)
+        self.c_status = ttk.Combobox(frame, values=['全部'] + _STATUS_OPTIONS[self.kind],
+                                     width=12, state='readonly')
+        self.c_status.set('全部')
+        self.c_status.grid(row=2, column=1, sticky=W, pady=3)
+
+        ttk.Label(frame, text="輸出：").grid(row=3, column=0, sticky=NW, pady=3)
+        self.mode_var = ttk.StringVar(value='zip')
+        mode_frame = ttk.Frame(frame)
+        mode_frame.grid(row=3, column=1, columnspan=3, sticky=W, pady=3)
+        for mode, text in OUTPUT_MODES.items():
+            ttk.Radiobutton(mode_frame, text=text, value=mode,
+                            variable=self.mode_var).pack(anchor=W)
+
+        self.progress = ttk.Progressbar(frame, mode='determinate')
+        self.progress.grid(row=4, column=0, columnspan=4, sticky=EW, pady=(12, 3))
+        self.status_var = ttk.StringVar(value="")
+        ttk.Label(frame, textvariable=self.status_var).grid(row=5, column=0, columnspan=4, sticky=W)
+        frame.columnconfigure(3, weight=1)
+
+        btn_frame = ttk.Frame(self, padding=(15, 0, 15, 12))
+        btn_frame.pack(fill=X)
+        self.btn_cancel = ttk.Button(btn_frame, text="關閉", command=self._on_close,
+                                     bootstyle=SECONDARY, width=8)
+        self.btn_cancel.pack(side=RIGHT, padx=3)
+        self.btn_start = ttk.Button(btn_frame, text="開始匯出", command=self._start,
+                                    bootstyle=PRIMARY, width=10)
+        self.btn_start.pack(side=RIGHT, padx=3)
+
+    def _ask_output(self, mode):
+        label = DOCUMENT_KINDS[self.kind][0]
+        initial = f"{label}_{self.e_from.get().strip()}_{self.e_to.get().strip()}"
+        if mode == 'files':
+            return filedialog.askdirectory(title="選擇輸出資料夾", parent=self)
+        ext, desc = ('.zip', "ZIP 檔案") if mode == 'zip' else ('.pdf', "PDF 檔案")
+        return filedialog.asksaveasfilename(
+            title="儲存批次匯出檔", initialfile=initial + ext, defaultextension=ext,
+            filetypes=[(desc, f"*{ext}")], parent=self)
+
+    def _start(self):
+        mode = self.mode_var.get()
+        output = self._ask_output(mode)
+        if not output:
+            return
+        status = self.c_status.get()
+        kwargs = dict(
+            date_from=self.e_from.get().strip() or None,
+            date_to=self.e_to.get().strip() or None,
+            client_id=self._clients.get(self.c_client.get()),
+            status=None if status == '全部' else status,
+        )
+        self._cancel.clear()
+        self._result = None
+        self._progress = (0, 0)
+        self.btn_start.config(state=DISABLED)
+        self.btn_cancel.config(text="取消")
+        self.status_var.set("查詢單據中...")
+        self._thread = threading.Thread(target=self._run, args=(output, mode, kwargs),
+                                        daemon=True)
+        self._thread.start()
+        self.after(100, self._poll)
+
+    def _run(self, output, mode, kwargs):
+        """（背景執行緒）"""
+        try:
+            self._result = generate_batch(self.kind, output, mode, cancel_event=self._cancel,
+                                          progress=self._set_progress, **kwargs)
+            self._result['output'] = output
+        except Exception as e:
+            self._result = {'error': str(e)}
+
+    def _set_progress(self, done, total):
+        self._progress = (done, total)
+
+    def _poll(self):
+        done, total = self._progress
+        if total:
+            self.progress.config(maximum=total, value=done)
+            self.status_var.set(f"已產生 {done} / {total} 張")
+        if self._thread is not None and self._thread.is_alive():
+            self.after(100, self._poll)
+            return
+        self._thread = None
+        self.btn_start.config(state=NORMAL)
+        self.btn_cancel.config(text="關閉")
+        self._show_result(self._result or {})
+
+    def _show_result(self, result):
+        if 'error' in result:
+            self.status_var.set(f"匯出失敗：{result['error']}")
+            return
+        if not result.get('total'):
+            self.status_var.set("沒有符合條件的單據")
+            return
+        text = f"完成 {result['count']} / {result['total']} 張"
+        if result['failed']:
+            text += f"，失敗 {len(result['failed'])} 張（{result['failed'][0][0]} 等）"
+        if result['cancelled']:
+            text += "（已取消）"
+        self.status_var.set(text)
+        if result['count'] and not result['cancelled']:
+            ttk.dialogs.Messagebox.show_info(f"已匯出至：\n{result['output']}", parent=self)
+
+    def _on_close(self):
+        if self._thread is not None:
+            self._cancel.set()
+            self.status_var.set("取消中...")
+            return
+        self.destroy()
@@ -414,6 +414,138 @@ class FlowCIssueDialog(ttk.Toplevel):
             ttk.dialogs.Messagebox.show_error(f"發行失敗：{e}", title="錯誤", parent=self)
 
 
+# ============================================================
+# 批次發行對話框（專案內多張圖面）
+# ============================================================
+
+class BatchIssueDialog(ttk.Toplevel):
+    """一次為專案內勾選的圖面建立 A 或 B 流程"""
+
+    def __init__(self, parent, project_id):
+        super().__init__(parent)
+        self.result = None  # create_flows_batch 的摘要
+        self.project_id = project_id
+
+        self.title("批次發行")
+        self.geometry("620x560")
+        self.minsize(520, 460)
+        self.transient(parent)
+        self.grab_set()
+
+        self._create_widgets()
+        self.wait_window()
+
+    def _create_widgets(self):
+        frame = ttk.Frame(self, padding=15)
+        frame.pack(fill=BOTH, expand=True)
+        frame.rowconfigure(2, weight=1)
+        frame.columnconfigure(0, weight=1)
+
+        # 流程類型與發行人
+        top = ttk.Frame(frame)
+        top.grid(row=0, column=0, sticky=EW, pady=(0, 8))
+        self._flow_var = ttk.StringVar(value='B')
+        ttk.Radiobutton(top, text=f"B流程：{FLOW_TYPES['B']}", variable=self._flow_var,
+                        value='B', command=self._on_flow_changed).pack(side=LEFT, padx=(0, 10))
+        ttk.Radiobutton(top, text=f"A流程：{FLOW_TYPES['A']}", variable=self._flow_var,
+                        value='A', command=self._on_flow_changed).pack(side=LEFT)
+        self.issuer_var = ttk.StringVar(value=DEFAULT_OPERATOR)
+        ttk.Entry(top, textvariable=self.issuer_var, width=12).pack(side=RIGHT)
+        ttk.Label(top, text="發行人：").pack(side=RIGHT)
+
+        # 發行部門（B流程）
+        self.dept_lf = ttk.LabelFrame(frame, text="選擇發行部門")
+        self.dept_lf.grid(row=1, column=0, sticky=EW, pady=(0, 8))
+        dept_inner = ttk.Frame(self.dept_lf, padding=8)
+        dept_inner.pack(fill=X)
+        self._dept_vars = {}
+        for dept in queries.get_departments():
+            name = dept['name']
+            if name == '管理部':
+                continue
+            var = ttk.BooleanVar(value=True)
+            ttk.Checkbutton(dept_inner, text=name, variable=var).pack(side=LEFT, padx=(0, 10))
+            self._dept_vars[name] = var
+
+        # 圖面清單
+        list_lf = ttk.LabelFrame(frame, text="圖面（進行中流程的圖面會略過）")
+        list_lf.grid(row=2, column=0, sticky=NSEW, pady=(0, 8))
+        cols = ('number', 'title', 'rev', 'status')
+        self.tree = ttk.Treeview(list_lf, columns=cols, show='headings', selectmode='extended')
+        self.tree.heading('number', text='圖號')
+        self.tree.heading('title', text='名稱')
+        self.tree.heading('rev', text='版次')
+        self.tree.heading('status', text='狀態')
+        self.tree.column('number', width=130)
+        self.tree.column('title', width=220)
+        self.tree.column('rev', width=50, anchor=CENTER)
+        self.tree.column('status', width=70, anchor=CENTER)
+        scroll = ttk.Scrollbar(list_lf, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scroll.pack(side=RIGHT, fill=Y)
+
+        for d in queries.get_drawings_by_project(self.project_id):
+            self.tree.insert('', END, iid=str(d['id']), values=(
+                d['drawing_number'], d['title'], d['current_rev'] or 'A', d['status'] or ''))
+        # 預設全選
+        self.tree.selection_set(self.tree.get_children())
+
+        # 備註與按鈕
+        bottom = ttk.Frame(frame)
+        bottom.grid(row=3, column=0, sticky=EW)
+        ttk.Label(bottom, text="備註：").pack(side=LEFT)
+        self.notes_var = ttk.StringVar()
+        ttk.Entry(bottom, textvariable=self.notes_var).pack(side=LEFT, fill=X, expand=True, padx=(0, 10))
+        ttk.Button(bottom, text="發行", command=self._on_submit,
+                   bootstyle=SUCCESS, width=10).pack(side=LEFT, padx=3)
+        ttk.Button(bottom, text="取消", command=self.destroy,
+                   bootstyle=SECONDARY, width=10).pack(side=LEFT, padx=3)
+
+    def _on_flow_changed(self):
+        if self._flow_var.get() == 'B':
+            self.dept_lf.grid()
+        else:
+            self.dept_lf.grid_remove()
+
+    def _on_submit(self):
+        issuer = self.issuer_var.get().strip()
+        if not issuer:
+            ttk.dialogs.Messagebox.show_error("請輸入發行人", title="錯誤", parent=self)
+            return
+
+        selected = self.tree.selection()
+        if not selected:
+            ttk.dialogs.Messagebox.show_error("請至少選擇一張圖面", title="錯誤", parent=self)
+            return
+        drawings = [(int(iid), self.tree.set(iid, 'rev')) for iid in selected]
+
+        flow_type = self._flow_var.get()
+        departments = None
+        if flow_type == 'B':
+            departments = [name for name, var in self._dept_vars.items() if var.get()]
+            if not departments:
+                ttk.dialogs.Messagebox.show_error("請至少選擇一個部門", title="錯誤", parent=self)
+                return
+
+        try:
+            summary = queries.create_flows_batch(
+                flow_type, drawings, issuer, departments=departments,
+                notes=self.notes_var.get().strip())
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            ttk.dialogs.Messagebox.show_error(f"發行失敗：{e}", title="錯誤", parent=self)
+            return
+
+        msg = f"已發行 {len(summary['orders'])} 張圖面，建立 {summary['tasks']} 項任務"
+        if summary['skipped']:
+            msg += f"\n略過 {len(summary['skipped'])} 張（已有進行中的流程）"
+        ttk.dialogs.Messagebox.show_info(msg, title="批次發行", parent=self)
+        self.result = summary
+        self.destroy()
+
+
 # ============================================================
 # 收到確認對話框（B/C流程共用）
 # ============================================================
@@ -6,6 +6,7 @@ from datetime import date
 from config import STATUS_OPTIONS, DRAWING_TYPE_OPTIONS, CAD_FILETYPES, IMAGE_FILETYPES, DEFAULT_OPERATOR
 from core.thumbnail_manager import save_thumbnail_full
 from core.file_manager import backup_file
+from core.blob_store import store_blob
 
 
 class DrawingDialog(ttk.Toplevel):
@@ -189,6 +190,7 @@ class DrawingDialog(ttk.Toplevel):
         try:
             file_path = self.filepath_var.get().strip()
             rev_code = self.rev_var.get().strip() or 'A'
+            file_hash, file_size = None, 0
 
             # 取得客戶/專案名稱（備份用）
             project = self._projects[idx]
@@ -222,6 +224,9 @@ class DrawingDialog(ttk.Toplevel):
                     self.type_combo.get(),
                     creator
                 )
+                # 存入內容定址檔案庫（相同內容只存一份）
+                if file_path:
+                    file_hash, file_size = store_blob(file_path)
                 # 自動建立 A 版版次紀錄（說明=創建）
                 queries.add_revision(
                     drawing_id,
@@ -229,7 +234,9 @@ class DrawingDialog(ttk.Toplevel):
                     rev_date=date.today().isoformat(),
                     saved_by=creator,
                     notes='創建',
-                    file_path=file_path
+                    file_path=file_path,
+                    file_hash=file_hash,
+                    file_size=file_size
                 )
                 # 處理縮圖
                 if self.thumbnail_src:
@@ -240,7 +247,8 @@ class DrawingDialog(ttk.Toplevel):
 
             # 備份檔案到公司圖面目錄
             if file_path:
-                backup_file(file_path, client_name, proj_name, number, rev_code)
+                backup_file(file_path, client_name, proj_name, number, rev_code,
+                            file_hash=file_hash)
 
             self.destroy()
         except Exception as e:
@@ -0,0 +1,126 @@
+"""出口文件組 — 選擇訂單與運送資訊，一次產生商業發票、裝箱單與其餘出貨文件紀錄"""
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from db import business_queries as bq
+from core.export_pack import build_export_pack
+from core.query_executor import get_query_executor
+from config import EXPORT_DOC_TYPES, EXPORT_PACK_DOC_TYPES, SHIPPING_METHODS
+
+
+class ExportPackDialog(ttk.Toplevel):
+    """出口文件組對話框；產生完成後 result 為建立的文件清單"""
+
+    def __init__(self, parent, order_number=None):
+        super().__init__(parent)
+        self.result = None
+        self.title("產生出口文件組")
+        self.geometry("480x520")
+        self.resizable(False, False)
+        self.transient(parent)
+        self.grab_set()
+
+        orders = bq.get_all_orders_for_combo()
+        self.order_map = {o['order_number']: o['id'] for o in orders}
+
+        self._create_widgets()
+        if order_number in self.order_map:
+            self.e_order.set(order_number)
+        self.wait_window()
+
+    def _create_widgets(self):
+        frame = ttk.Frame(self, padding=15)
+        frame.pack(fill=BOTH, expand=True)
+
+        row = 0
+        ttk.Label(frame, text="客戶訂單：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_order = ttk.Combobox(frame, values=list(self.order_map), width=25, state='readonly')
+        self.e_order.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="目的國：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_dest = ttk.Entry(frame, width=20)
+        self.e_dest.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="運輸方式：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_ship = ttk.Combobox(frame, values=SHIPPING_METHODS, width=10)
+        self.e_ship.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="出貨日期：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_ship_date = ttk.DateEntry(frame, dateformat='%Y-%m-%d', width=12)
+        self.e_ship_date.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="船名/航班：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_vessel = ttk.Entry(frame, width=25)
+        self.e_vessel.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="提單號：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_bl = ttk.Entry(frame, width=25)
+        self.e_bl.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="貨櫃號：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_container = ttk.Entry(frame, width=25)
+        self.e_container.grid(row=row, column=1, sticky=W, pady=3)
+
+        row += 1
+        ttk.Label(frame, text="文件：").grid(row=row, column=0, sticky=NW, pady=3)
+        types_frame = ttk.Frame(frame)
+        types_frame.grid(row=row, column=1, sticky=W, pady=3)
+        self.type_vars = {}
+        for doc_type in EXPORT_DOC_TYPES[:-1]:
+            var = ttk.BooleanVar(value=doc_type in EXPORT_PACK_DOC_TYPES)
+            ttk.Checkbutton(types_frame, text=doc_type, variable=var).pack(anchor=W)
+            self.type_vars[doc_type] = var
+
+        row += 1
+        self.status_var = ttk.StringVar(value="商業發票與裝箱單會產生 PDF，其餘文件建立待補紀錄")
+        ttk.Label(frame, textvariable=self.status_var, bootstyle=SECONDARY).grid(
+            row=row, column=0, columnspan=2, sticky=W, pady=(8, 0))
+
+        row += 1
+        btn_frame = ttk.Frame(frame)
+        btn_frame.grid(row=row, column=0, columnspan=2, pady=10)
+        self.btn_ok = ttk.Button(btn_frame, text="產生", command=self._on_ok,
+                                 bootstyle=PRIMARY, width=10)
+        self.btn_ok.pack(side=LEFT, padx=5)
+        ttk.Button(btn_frame, text="取消", command=self.destroy,
+                   bootstyle=SECONDARY, width=10).pack(side=LEFT, padx=5)
+
+    def _on_ok(self):
+        order_id = self.order_map.get(self.e_order.get())
+        if not order_id:
+            ttk.dialogs.Messagebox.show_warning("請選擇客戶訂單", parent=self)
+            return
+        doc_types = [t for t, var in self.type_vars.items() if var.get()]
+        if not doc_types:
+            ttk.dialogs.Messagebox.show_warning("請至少選擇一種文件", parent=self)
+            return
+
+        shipping = dict(
+            destination_country=self.e_dest.get().strip() or None,
+            shipping_method=self.e_ship.get().strip() or None,
+            shipping_date=self.e_ship_date.entry.get().strip() or None,
+            vessel_name=self.e_vessel.get().strip() or None,
+            bl_number=self.e_bl.get().strip() or None,
+            container_number=self.e_container.get().strip() or None,
+        )
+        self.btn_ok.config(state=DISABLED)
+        self.status_var.set("產生中...")
+        get_query_executor(self).submit(
+            'export_pack', build_export_pack, order_id, shipping, doc_types,
+            on_done=self._on_done, on_error=self._on_error)
+
+    def _on_done(self, docs):
+        self.result = docs
+        lines = [f"{d['doc_type']}：{d['doc_number'] or ''}"
+                 + ("" if d['file_path'] else "（待補檔案）") for d in docs]
+        ttk.dialogs.Messagebox.show_info("已建立出口文件：\n" + "\n".join(lines), parent=self)
+        self.destroy()
+
+    def _on_error(self, error):
+        self.btn_ok.config(state=NORMAL)
+        self.status_var.set(f"產生失敗：{error}")
@@ -0,0 +1,111 @@
+"""全域搜尋 — 一個搜尋框同時搜尋圖面與所有業務文件，結果依類型分組"""
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from db import queries
+from core.query_executor import get_query_executor
+from config import SEARCH_DEBOUNCE_MS
+
+# 搜尋結果類型 → 顯示名稱
+ENTITY_LABELS = {
+    'drawings': '圖面',
+    'suppliers': '供應商',
+    'quotations': '報價單',
+    'quotation_items': '報價明細',
+    'customer_orders': '客戶訂單',
+    'order_items': '訂單明細',
+    'invoices': '發票',
+    'export_documents': '出口文件',
+    'production_orders': '生產工單',
+    'machines': '機器',
+    'maintenance_records': '維修紀錄',
+}
+
+# 每種類型顯示的筆數
+LIMIT_PER_ENTITY = 20
+
+
+class GlobalSearchDialog(ttk.Toplevel):
+    """全域搜尋視窗：輸入即搜尋，雙擊結果開啟對應模組"""
+
+    def __init__(self, parent, on_open=None):
+        super().__init__(parent)
+        self.title("全域搜尋")
+        self.geometry("820x520")
+        self.minsize(600, 350)
+        self.transient(parent)
+
+        self.on_open = on_open
+        self._hits = {}             # tree iid -> (entity, hit)
+        self._search_after = None
+
+        self._create_widgets()
+        self.entry.focus_set()
+
+    def _create_widgets(self):
+        toolbar = ttk.Frame(self, padding=8)
+        toolbar.pack(fill=X)
+        ttk.Label(toolbar, text="關鍵字：").pack(side=LEFT)
+        self.keyword_var = ttk.StringVar()
+        self.entry = ttk.Entry(toolbar, textvariable=self.keyword_var, width=40)
+        self.entry.pack(side=LEFT, padx=(0, 8), fill=X, expand=True)
+        self.entry.bind('<Return>', lambda e: self._search())
+        self.keyword_var.trace_add('write', self._on_typed)
+        self.count_var = ttk.StringVar(value="可搜尋單號、品名、料號、供應商、機器編號等")
+        ttk.Label(toolbar, textvariable=self.count_var, foreground='#888888').pack(side=LEFT)
+
+        tree_frame = ttk.Frame(self, padding=(8, 0, 8, 8))
+        tree_frame.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=('ref', 'snippet'), show='tree headings')
+        self.tree.heading('#0', text='標題')
+        self.tree.heading('ref', text='所屬文件')
+        self.tree.heading('snippet', text='內容')
+        self.tree.column('#0', width=300)
+        self.tree.column('ref', width=130)
+        self.tree.column('snippet', width=360)
+        scroll = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scroll.pack(side=RIGHT, fill=Y)
+        self.tree.bind('<Double-1>', self._on_open)
+        self.tree.bind('<Return>', self._on_open)
+
+    def _on_typed(self, *args):
+        if self._search_after:
+            self.after_cancel(self._search_after)
+        self._search_after = self.after(SEARCH_DEBOUNCE_MS, self._search)
+
+    def _search(self):
+        self._search_after = None
+        keyword = self.keyword_var.get().strip()
+        executor = get_query_executor(self)
+        if not keyword:
+            executor.cancel('global_search')
+            self._show([])
+            return
+        executor.submit('global_search', queries.search_global, keyword,
+                        limit_per_entity=LIMIT_PER_ENTITY, on_done=self._show)
+
+    def _show(self, groups):
+        self.tree.delete(*self.tree.get_children())
+        self._hits.clear()
+        for group in groups:
+            entity = group['entity']
+            shown = len(group['hits'])
+            more = f"，顯示前 {shown} 筆" if group['total'] > shown else ''
+            parent = self.tree.insert(
+                '', END, text=f"{ENTITY_LABELS.get(entity, entity)}（{group['total']}{more}）",
+                open=True)
+            for hit in group['hits']:
+                iid = self.tree.insert(parent, END, text=hit['title'],
+                                       values=(hit['ref'], hit['snippet']))
+                self._hits[iid] = (entity, hit)
+        if self.keyword_var.get().strip():
+            total = sum(g['total'] for g in groups)
+            self.count_var.set(f"共 {total} 筆，{len(groups)} 種類型")
+
+    def _on_open(self, event=None):
+        sel = self.tree.selection()
+        if not sel or sel[0] not in self._hits or not self.on_open:
+            return
+        entity, hit = self._hits[sel[0]]
+        self.on_open(entity, hit)
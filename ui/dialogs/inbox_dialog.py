@@ -0,0 +1,119 @@
+"""發行待辦收件匣 — 部門或人員等待處理的發行任務"""
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from db import queries
+from config import DEFAULT_OPERATOR, FLOW_TYPES
+from core.query_executor import get_query_executor
+
+# 每頁筆數
+PAGE_SIZE = 100
+
+
+class InboxDialog(ttk.Toplevel):
+    """依部門/人員列出待處理的發行任務，可批次確認收到（B/C流程）"""
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("發行待辦收件匣")
+        self.geometry("900x520")
+        self.minsize(700, 400)
+        self.transient(parent)
+
+        self._last_id = None
+        self._create_widgets()
+        self._reload()
+
+    def _create_widgets(self):
+        toolbar = ttk.Frame(self, padding=8)
+        toolbar.pack(fill=X)
+
+        ttk.Label(toolbar, text="部門：").pack(side=LEFT)
+        self.dept_var = ttk.StringVar(value='全部')
+        depts = ['全部'] + [d['name'] for d in queries.get_departments()]
+        dept_combo = ttk.Combobox(toolbar, textvariable=self.dept_var, values=depts,
+                                  width=10, state='readonly')
+        dept_combo.pack(side=LEFT, padx=(0, 10))
+        dept_combo.bind('<<ComboboxSelected>>', lambda e: self._reload())
+
+        ttk.Label(toolbar, text="人員：").pack(side=LEFT)
+        self.person_var = ttk.StringVar()
+        person_entry = ttk.Entry(toolbar, textvariable=self.person_var, width=12)
+        person_entry.pack(side=LEFT)
+        person_entry.bind('<Return>', lambda e: self._reload())
+
+        ttk.Button(toolbar, text="重新整理", command=self._reload,
+                   bootstyle=INFO+OUTLINE, width=8).pack(side=LEFT, padx=8)
+        self.count_var = ttk.StringVar()
+        ttk.Label(toolbar, textvariable=self.count_var).pack(side=LEFT, padx=10)
+
+        ttk.Button(toolbar, text="確認收到（選取項目）", command=self._confirm_selected,
+                   bootstyle=SUCCESS).pack(side=RIGHT)
+
+        cols = ('id', 'flow', 'number', 'title', 'rev', 'dept', 'assignee',
+                'status', 'issued_by', 'issued_at')
+        tree_frame = ttk.Frame(self, padding=(8, 0))
+        tree_frame.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings',
+                                 selectmode='extended')
+        headings = [('id', 'ID', 45), ('flow', '流程', 45), ('number', '圖號', 120),
+                    ('title', '名稱', 170), ('rev', '版次', 45), ('dept', '部門', 70),
+                    ('assignee', '指定人員', 70), ('status', '狀態', 60),
+                    ('issued_by', '發行人', 70), ('issued_at', '發行時間', 130)]
+        for key, text, width in headings:
+            self.tree.heading(key, text=text)
+            self.tree.column(key, width=width)
+        scroll = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scroll.pack(side=RIGHT, fill=Y)
+
+        bottom = ttk.Frame(self, padding=8)
+        bottom.pack(fill=X)
+        self.more_btn = ttk.Button(bottom, text="載入更多", command=self._load_more,
+                                   bootstyle=SECONDARY+OUTLINE, width=10)
+        self.more_btn.pack(side=LEFT)
+
+    def _filters(self):
+        dept = self.dept_var.get()
+        return (None if dept == '全部' else dept), (self.person_var.get().strip() or None)
+
+    def _reload(self):
+        self.tree.delete(*self.tree.get_children())
+        self._last_id = None
+        dept, person = self._filters()
+        executor = get_query_executor(self)
+        executor.submit('inbox_count', queries.count_inbox_tasks, dept, person,
+                        on_done=lambda n: self.count_var.set(f"共 {n} 項待處理"))
+        self._load_more()
+
+    def _load_more(self):
+        dept, person = self._filters()
+        get_query_executor(self).submit(
+            'inbox_page', queries.get_inbox_tasks, dept, person,
+            limit=PAGE_SIZE, before_id=self._last_id, on_done=self._append_rows)
+
+    def _append_rows(self, rows):
+        for r in rows:
+            self.tree.insert('', END, iid=str(r['id']), values=(
+                r['id'], r['flow_type'], r['drawing_number'], r['title'], r['rev_code'],
+                r['department'], r['assignee'] or '', r['status'],
+                r['issued_by'], r['issued_at'] or ''))
+        if rows:
+            self._last_id = rows[-1]['id']
+        self.more_btn.configure(state=NORMAL if len(rows) == PAGE_SIZE else DISABLED)
+
+    def _confirm_selected(self):
+        selected = self.tree.selection()
+        task_ids = [int(iid) for iid in selected if self.tree.set(iid, 'flow') in ('B', 'C')]
+        if not task_ids:
+            ttk.dialogs.Messagebox.show_info(
+                f"請選取{FLOW_TYPES['B']}或{FLOW_TYPES['C']}的任務", parent=self)
+            return
+
+        _, person = self._filters()
+        summary = queries.confirm_receipts_batch(person or DEFAULT_OPERATOR, task_ids=task_ids)
+        msg = f"已確認 {summary['confirmed']} 項"
+        if summary['orders_completed']:
+            msg += f"，{summary['orders_completed']} 張發行單已全部收到"
+        ttk.dialogs.Messagebox.show_info(msg, title="確認收到", parent=self)
+        self._reload()
@@ -0,0 +1,95 @@
+"""查詢效能統計 — 開發用面板，顯示各查詢函式的耗時與慢查詢紀錄"""
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from db import instrumentation
+from db.write_coordinator import get_write_stats
+from config import SLOW_QUERY_LOG, SLOW_QUERY_MS
+
+
+class QueryStatsDialog(ttk.Toplevel):
+    """各查詢函式的呼叫次數、平均/p95/最大耗時、回傳筆數與連線次數"""
+
+    COLUMNS = [
+        ('function', '函式', 260, 'w'),
+        ('calls', '次數', 70, 'e'),
+        ('total_ms', '總計 ms', 90, 'e'),
+        ('avg_ms', '平均 ms', 80, 'e'),
+        ('p95_ms', 'p95 ms', 80, 'e'),
+        ('max_ms', '最大 ms', 80, 'e'),
+        ('rows', '筆數', 80, 'e'),
+        ('connections', '連線', 60, 'e'),
+        ('errors', '錯誤', 50, 'e'),
+    ]
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.title("查詢效能統計")
+        self.geometry("950x520")
+        self.minsize(700, 350)
+        self.transient(parent)
+
+        self._create_widgets()
+        self._refresh()
+
+    def _create_widgets(self):
+        toolbar = ttk.Frame(self, padding=8)
+        toolbar.pack(fill=X)
+
+        self.enabled_var = ttk.BooleanVar(value=instrumentation.is_enabled())
+        ttk.Checkbutton(toolbar, text="啟用量測", variable=self.enabled_var,
+                        command=self._toggle, bootstyle='round-toggle').pack(side=LEFT)
+        ttk.Button(toolbar, text="重新整理", command=self._refresh,
+                   bootstyle=INFO+OUTLINE, width=8).pack(side=LEFT, padx=(12, 4))
+        ttk.Button(toolbar, text="重設", command=self._reset,
+                   bootstyle=SECONDARY+OUTLINE, width=6).pack(side=LEFT, padx=4)
+        ttk.Button(toolbar, text="開啟慢查詢紀錄", command=self._open_slow_log,
+                   bootstyle=WARNING+OUTLINE).pack(side=RIGHT)
+
+        tree_frame = ttk.Frame(self, padding=(8, 0))
+        tree_frame.pack(fill=BOTH, expand=True)
+        self.tree = ttk.Treeview(tree_frame, columns=[c[0] for c in self.COLUMNS],
+                                 show='headings')
+        for key, text, width, anchor in self.COLUMNS:
+            self.tree.heading(key, text=text)
+            self.tree.column(key, width=width, anchor=anchor)
+        scroll = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scroll.pack(side=RIGHT, fill=Y)
+
+        self.summary_var = ttk.StringVar()
+        ttk.Label(self, textvariable=self.summary_var, padding=8).pack(fill=X)
+
+    def _toggle(self):
+        if self.enabled_var.get():
+            instrumentation.enable()
+        else:
+            instrumentation.disable()
+        self._refresh()
+
+    def _reset(self):
+        instrumentation.profiler.reset()
+        self._refresh()
+
+    def _refresh(self):
+        self.tree.delete(*self.tree.get_children())
+        stats = instrumentation.get_stats()
+        for s in stats:
+            self.tree.insert('', END, values=(
+                s['function'], s['calls'], f"{s['total_ms']:,.1f}", f"{s['avg_ms']:.2f}",
+                f"{s['p95_ms']:.2f}", f"{s['max_ms']:.2f}", s['rows'], s['connections'],
+                s['errors']))
+
+        writes = get_write_stats().values()
+        busy = sum(w['busy'] for w in writes)
+        failures = sum(w['failures'] for w in writes)
+        state = "量測中" if instrumentation.is_enabled() else "未啟用"
+        self.summary_var.set(
+            f"{state}｜{len(stats)} 個函式、{sum(s['calls'] for s in stats)} 次呼叫"
+            f"｜慢查詢門檻 {SLOW_QUERY_MS} ms｜寫入鎖定 {busy} 次（放棄 {failures} 次）")
+
+    def _open_slow_log(self):
+        from core.file_manager import open_file
+        if not open_file(SLOW_QUERY_LOG):
+            ttk.dialogs.Messagebox.show_info(
+                f"尚無慢查詢紀錄：\n{SLOW_QUERY_LOG}", title="慢查詢紀錄", parent=self)
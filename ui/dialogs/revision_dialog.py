@@ -5,6 +5,8 @@ from datetime import date
 from db import queries
 from config import CAD_FILETYPES, DEFAULT_OPERATOR
 from core.file_manager import backup_file
+from core.blob_store import store_blob
+from core.query_executor import get_background_executor
 
 
 class RevisionDialog(ttk.Toplevel):
@@ -96,15 +98,25 @@ class RevisionDialog(ttk.Toplevel):
 
         try:
             file_path = self.filepath_var.get().strip()
+            # 存入內容定址檔案庫（相同內容只存一份）
+            file_hash, file_size = store_blob(file_path) if file_path else (None, 0)
             self.result = queries.add_revision(
                 self.drawing_id,
                 rev_code,
                 rev_date,
                 saved_by,
                 self.notes_text.get('1.0', 'end-1c').strip(),
-                file_path
+                file_path,
+                file_hash=file_hash,
+                file_size=file_size
             )
 
+            # 文字格式圖檔：舊版次在背景改存壓縮差異（大型 DXF 比對不阻塞畫面）
+            if file_hash:
+                from core.revision_store import compact_drawing
+                get_background_executor(self).submit(
+                    f'compact_drawing:{self.drawing_id}', compact_drawing, self.drawing_id)
+
             # 備份檔案到公司圖面目錄
             if file_path:
                 drawing = queries.get_drawing(self.drawing_id)
@@ -116,7 +128,8 @@ class RevisionDialog(ttk.Toplevel):
                         client_name=client['name'] if client else '',
                         project_name=project['name'] if project else '',
                         drawing_number=drawing['drawing_number'],
-                        rev_code=rev_code
+                        rev_code=rev_code,
+                        file_hash=file_hash
                     )
 
             self.destroy()
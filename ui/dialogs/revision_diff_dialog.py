@@ -0,0 +1,74 @@
+"""版次比對 — 兩個版次的疊圖（紅：刪除、綠：新增），可切換檢視舊版／新版"""
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from core.revision_diff import diff_revisions, REMOVED_COLOR, ADDED_COLOR
+from core.query_executor import get_query_executor
+from ui.widgets.zoomable_viewer import ZoomableImageViewer
+
+
+def _hex(rgb):
+    return '#%02x%02x%02x' % rgb
+
+
+class RevisionDiffDialog(ttk.Toplevel):
+    """比對 old_revision_id → new_revision_id；渲染與比對在背景執行"""
+
+    def __init__(self, parent, old_revision_id, new_revision_id):
+        super().__init__(parent)
+        self.title("版次比對")
+        self.geometry("1000x720")
+        self.minsize(600, 400)
+        self.transient(parent)
+
+        self._result = None
+        self._create_widgets()
+        get_query_executor(self).submit(
+            f'revision_diff:{id(self)}', diff_revisions, old_revision_id, new_revision_id,
+            on_done=self._show, on_error=self._show_error)
+
+    def _create_widgets(self):
+        toolbar = ttk.Frame(self, padding=8)
+        toolbar.pack(fill=X)
+
+        self.view_var = ttk.StringVar(value='overlay')
+        for value, text in [('overlay', '疊圖'), ('old', '舊版'), ('new', '新版')]:
+            ttk.Radiobutton(toolbar, text=text, value=value, variable=self.view_var,
+                            command=self._switch_view, bootstyle='toolbutton').pack(side=LEFT)
+        self.btn_changes = ttk.Button(toolbar, text="移至變更範圍", command=self._zoom_changes,
+                                      bootstyle=INFO+OUTLINE, state=DISABLED)
+        self.btn_changes.pack(side=LEFT, padx=(12, 0))
+
+        ttk.Label(toolbar, text="■ 刪除", foreground=_hex(REMOVED_COLOR)).pack(side=RIGHT, padx=4)
+        ttk.Label(toolbar, text="■ 新增", foreground=_hex(ADDED_COLOR)).pack(side=RIGHT, padx=4)
+
+        self.status_var = ttk.StringVar(value="渲染與比對中...")
+        ttk.Label(self, textvariable=self.status_var, padding=(8, 0)).pack(fill=X)
+
+        self.viewer = ZoomableImageViewer(self, height=560)
+        self.viewer.pack(fill=BOTH, expand=True, padx=8, pady=8)
+
+    def _show(self, result):
+        self._result = result
+        old_rev, new_rev = result['old_rev'], result['new_rev']
+        self.title(f"版次比對 — {old_rev['rev_code']} → {new_rev['rev_code']}")
+        if result['bbox'] is None:
+            summary = "兩個版次的圖面沒有差異"
+        else:
+            summary = (f"刪除 {result['removed']:,} 像素、新增 {result['added']:,} 像素"
+                       f"（佔線條 {result['changed_ratio']:.1%}）")
+            self.btn_changes.config(state=NORMAL)
+        if abs(result['scale'] - 1) > 0.005:
+            summary += f"；新版已縮放 {result['scale']:.3f} 倍對齊"
+        self.status_var.set(f"{old_rev['rev_code']} → {new_rev['rev_code']}：{summary}")
+        self._switch_view()
+
+    def _show_error(self, error):
+        self.status_var.set(f"比對失敗：{error}")
+
+    def _switch_view(self):
+        if self._result is not None:
+            self.viewer.set_image(self._result[self.view_var.get()], keep_view=True)
+
+    def _zoom_changes(self):
+        if self._result is not None and self._result['bbox']:
+            self.viewer.zoom_to_region(*self._result['bbox'])
@@ -1,17 +1,26 @@
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from config import STATUS_OPTIONS, DRAWING_TYPE_OPTIONS
+from core.faceted_search import FacetedSearch, FACET_LABELS
+from core.query_executor import get_query_executor
 
 
 class SearchDialog(ttk.Toplevel):
-    """進階搜尋對話框"""
+    """進階搜尋對話框（右側為分面計數，勾選分面值可在記憶體中精煉結果）
+
+    result 為搜尋條件；rows 為已在對話框中取得（並依分面精煉）的結果，
+    None 表示呼叫端需自行以 result 查詢。
+    """
 
     def __init__(self, parent):
         super().__init__(parent)
         self.result = None
+        self.rows = None
+        self._search = None
+        self._facet_items = {}      # tree iid -> (facet, value)
 
         self.title("進階搜尋")
-        self.geometry("450x400")
+        self.geometry("800x465")
         self.resizable(False, False)
         self.transient(parent)
         self.grab_set()
@@ -21,7 +30,8 @@ class SearchDialog(ttk.Toplevel):
 
     def _create_widgets(self):
         frame = ttk.Frame(self, padding=20)
-        frame.pack(fill=BOTH, expand=True)
+        frame.pack(side=LEFT, fill=Y)
+        self._create_facet_panel()
 
         row = 0
 
@@ -31,6 +41,12 @@ class SearchDialog(ttk.Toplevel):
         ttk.Entry(frame, textvariable=self.keyword_var, width=30).grid(row=row, column=1, pady=(0, 5))
         row += 1
 
+        # 圖檔內容
+        ttk.Label(frame, text="圖檔內容（料號/註記）").grid(row=row, column=0, sticky=W, pady=(0, 5))
+        self.content_var = ttk.StringVar()
+        ttk.Entry(frame, textvariable=self.content_var, width=30).grid(row=row, column=1, pady=(0, 5))
+        row += 1
+
         # 客戶名稱
         ttk.Label(frame, text="客戶名稱").grid(row=row, column=0, sticky=W, pady=(0, 5))
         self.client_var = ttk.StringVar()
@@ -75,12 +91,38 @@ class SearchDialog(ttk.Toplevel):
         # 按鈕
         btn_frame = ttk.Frame(frame)
         btn_frame.grid(row=row, column=0, columnspan=2, pady=(15, 0))
+        ttk.Button(btn_frame, text="分面統計", command=self._run_facets, bootstyle=INFO+OUTLINE, width=10).pack(side=LEFT, padx=5)
         ttk.Button(btn_frame, text="搜尋", command=self._on_search, bootstyle=SUCCESS, width=10).pack(side=LEFT, padx=5)
         ttk.Button(btn_frame, text="取消", command=self.destroy, bootstyle=SECONDARY, width=10).pack(side=LEFT, padx=5)
 
-    def _on_search(self):
-        self.result = {
+    def _create_facet_panel(self):
+        panel = ttk.Frame(self, padding=(0, 20, 20, 20))
+        panel.pack(side=LEFT, fill=BOTH, expand=True)
+
+        self.total_var = ttk.StringVar(value="按「分面統計」查看各條件的符合數量")
+        ttk.Label(panel, textvariable=self.total_var, bootstyle=INFO).pack(fill=X, pady=(0, 5))
+
+        tree_frame = ttk.Frame(panel)
+        tree_frame.pack(fill=BOTH, expand=True)
+        self.facet_tree = ttk.Treeview(tree_frame, columns=('count',), show='tree',
+                                       selectmode='none')
+        self.facet_tree.column('#0', width=220)
+        self.facet_tree.column('count', width=60, anchor='e')
+        scroll = ttk.Scrollbar(tree_frame, orient=VERTICAL, command=self.facet_tree.yview)
+        self.facet_tree.configure(yscrollcommand=scroll.set)
+        self.facet_tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scroll.pack(side=RIGHT, fill=Y)
+        self.facet_tree.bind('<Button-1>', self._on_facet_click)
+
+        ttk.Button(panel, text="清除勾選", command=self._clear_facets,
+                   bootstyle=SECONDARY+OUTLINE, width=10).pack(anchor=E, pady=(5, 0))
+
+    # ----- 分面 -----
+
+    def _filters(self):
+        return {
             'keyword': self.keyword_var.get().strip(),
+            'content': self.content_var.get().strip(),
             'client_name': self.client_var.get().strip(),
             'project_name': self.project_var.get().strip(),
             'status': self.status_combo.get().strip(),
@@ -89,4 +131,62 @@ class SearchDialog(ttk.Toplevel):
             'date_from': self.date_from_var.get().strip(),
             'date_to': self.date_to_var.get().strip(),
         }
+
+    def _run_facets(self):
+        """查詢分面計數，完整結果接著在背景載入以便精煉"""
+        self._search = None
+        self.total_var.set("統計中…")
+        executor = get_query_executor(self)
+        executor.submit('search_facets', FacetedSearch.run, self._filters(),
+                        on_done=self._on_facets)
+
+    def _on_facets(self, search):
+        self._search = search
+        self._show_facets()
+        get_query_executor(self).submit('search_facet_rows', search.load_rows,
+                                        on_done=lambda s: self._show_facets())
+
+    def _show_facets(self):
+        search = self._search
+        if search is None:
+            return
+        rows, counts = search.refine()
+        total = len(rows) if search.rows_loaded else search.total
+        self.total_var.set(f"共 {total} 筆符合" + ("" if search.rows_loaded else "（載入中…）"))
+
+        open_state = {iid: self.facet_tree.item(iid, 'open')
+                      for iid in self.facet_tree.get_children()}
+        self.facet_tree.delete(*self.facet_tree.get_children())
+        self._facet_items.clear()
+        for facet, title in FACET_LABELS.items():
+            parent = self.facet_tree.insert('', END, iid=facet, text=title,
+                                            open=open_state.get(facet, facet != 'client'))
+            for i, (value, label, n) in enumerate(counts[facet]):
+                mark = '☑' if value in search.selected[facet] else '☐'
+                iid = f"{facet}|{i}"
+                self._facet_items[iid] = (facet, value)
+                self.facet_tree.insert(parent, END, iid=iid, text=f"{mark} {label}",
+                                       values=(n,))
+
+    def _on_facet_click(self, event):
+        iid = self.facet_tree.identify_row(event.y)
+        if iid not in self._facet_items or self._search is None:
+            return
+        if not self._search.rows_loaded:
+            return  # 完整結果載入後才能精煉
+        facet, value = self._facet_items[iid]
+        self._search.toggle(facet, value)
+        self._show_facets()
+
+    def _clear_facets(self):
+        if self._search is not None:
+            self._search.clear_selection()
+            self._show_facets()
+
+    def _on_search(self):
+        self.result = self._filters()
+        # 條件未變更且已載入完整結果時直接使用（含分面精煉），不再查詢
+        search = self._search
+        if search is not None and search.rows_loaded and search.filters == self.result:
+            self.rows = search.refine()[0]
         self.destroy()
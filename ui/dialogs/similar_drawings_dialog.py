@@ -0,0 +1,110 @@
+"""相似圖面 — 以縮圖感知雜湊找出與目前圖面外觀相似的圖面（疑似重複建檔）"""
+import tkinter as tk
+import ttkbootstrap as ttk
+from ttkbootstrap.constants import *
+from db import queries
+from core.image_hash import similarity_index
+from core.thumbnail_manager import load_thumbnail_tk, get_thumbnail_path
+from core.query_executor import get_query_executor
+from config import SIMILARITY_MAX_DISTANCE
+
+# 預覽縮圖大小
+PREVIEW_SIZE = (260, 200)
+
+
+def _find_similar(drawing_id, max_distance):
+    """（工作執行緒）回傳 [(圖面列, pHash 距離)]，依距離排序"""
+    hits = similarity_index.find_similar(drawing_id, max_distance=max_distance)
+    rows = {r['id']: r for r in queries.get_drawings_by_ids([did for did, _, _ in hits])}
+    return [(rows[did], dist) for did, dist, _ in hits if did in rows]
+
+
+class SimilarDrawingsDialog(ttk.Toplevel):
+    """相似圖面清單：距離越小越相似（0 為幾乎相同），雙擊開啟該圖面"""
+
+    def __init__(self, parent, drawing_id, on_open=None):
+        super().__init__(parent)
+        drawing = queries.get_drawing(drawing_id)
+        self.title(f"相似圖面 — {drawing['drawing_number'] if drawing else drawing_id}")
+        self.geometry("820x420")
+        self.minsize(600, 300)
+        self.transient(parent)
+
+        self.drawing_id = drawing_id
+        self.on_open = on_open
+        self._preview_photo = None
+
+        self._create_widgets()
+        self._search()
+
+    def _create_widgets(self):
+        toolbar = ttk.Frame(self, padding=8)
+        toolbar.pack(fill=X)
+        ttk.Label(toolbar, text="最大差異：").pack(side=LEFT)
+        self.distance_var = ttk.IntVar(value=SIMILARITY_MAX_DISTANCE)
+        ttk.Spinbox(toolbar, from_=0, to=24, width=4, textvariable=self.distance_var,
+                    command=self._search).pack(side=LEFT)
+        ttk.Button(toolbar, text="重新搜尋", command=self._search,
+                   bootstyle=INFO+OUTLINE, width=8).pack(side=LEFT, padx=8)
+        self.count_var = ttk.StringVar(value="搜尋中...")
+        ttk.Label(toolbar, textvariable=self.count_var, foreground='#888888').pack(side=LEFT)
+
+        body = ttk.Frame(self, padding=(8, 0, 8, 8))
+        body.pack(fill=BOTH, expand=True)
+
+        self.preview = ttk.Label(body, text="（選取圖面以預覽）", anchor=CENTER,
+                                 width=36)
+        self.preview.pack(side=RIGHT, fill=Y, padx=(8, 0))
+
+        columns = ('drawing_number', 'title', 'status', 'distance')
+        self.tree = ttk.Treeview(body, columns=columns, show='headings')
+        for key, text, width, anchor in [('drawing_number', '圖號', 150, 'w'),
+                                         ('title', '名稱', 200, 'w'),
+                                         ('status', '狀態', 70, 'center'),
+                                         ('distance', '差異', 50, 'e')]:
+            self.tree.heading(key, text=text)
+            self.tree.column(key, width=width, anchor=anchor)
+        scroll = ttk.Scrollbar(body, orient=VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scroll.set)
+        self.tree.pack(side=LEFT, fill=BOTH, expand=True)
+        scroll.pack(side=LEFT, fill=Y)
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
+        self.tree.bind('<Double-1>', self._on_open)
+        self.tree.bind('<Return>', self._on_open)
+
+    def _search(self):
+        try:
+            max_distance = int(self.distance_var.get())
+        except (ValueError, tk.TclError):
+            max_distance = SIMILARITY_MAX_DISTANCE
+        self.count_var.set("搜尋中...")
+        get_query_executor(self).submit(f'similar_drawings:{id(self)}', _find_similar,
+                                        self.drawing_id, max_distance, on_done=self._show)
+
+    def _show(self, hits):
+        self.tree.delete(*self.tree.get_children())
+        for row, dist in hits:
+            self.tree.insert('', END, iid=str(row['id']),
+                             values=(row['drawing_number'], row['title'] or '',
+                                     row['status'] or '', dist))
+        if hits:
+            self.count_var.set(f"找到 {len(hits)} 張相似圖面")
+        elif get_thumbnail_path(self.drawing_id) is None:
+            self.count_var.set("此圖面尚無縮圖，無法比對")
+        else:
+            self.count_var.set("沒有相似的圖面")
+
+    def _on_select(self, event=None):
+        sel = self.tree.selection()
+        if not sel:
+            return
+        self._preview_photo = load_thumbnail_tk(get_thumbnail_path(int(sel[0])), PREVIEW_SIZE)
+        if self._preview_photo:
+            self.preview.config(image=self._preview_photo, text='')
+        else:
+            self.preview.config(image='', text="（無縮圖）")
+
+    def _on_open(self, event=None):
+        sel = self.tree.selection()
+        if sel and self.on_open:
+            self.on_open(int(sel[0]))
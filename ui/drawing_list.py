@@ -2,8 +2,13 @@ import os
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 from db import queries
+from db.api_client import run_batch
 from config import FONT_FAMILY
 from core.icon_extractor import get_file_icon_cache
+from core.query_executor import get_query_executor
+
+# 分段插入表格的每段筆數
+DISPLAY_CHUNK = 300
 
 
 class DrawingList(ttk.Frame):
@@ -23,7 +28,11 @@ class DrawingList(ttk.Frame):
         super().__init__(parent)
         self.on_drawing_selected = on_drawing_selected
         self._current_project_id = None
+        self._current_client_id = None
+        self._show_all = False
         self._current_drawings = []
+        self._selected_id = None
+        self._display_token = 0
         self._sort_col = 'drawing_number'
         self._sort_reverse = False
         self._icon_refs = {}  # 保持 PhotoImage 參照避免被 GC 回收
@@ -69,87 +78,180 @@ class DrawingList(ttk.Frame):
         self.tree.bind('<<TreeviewSelect>>', self._on_select)
         self.tree.bind('<Double-1>', self._on_double_click)
 
-    def load_by_project(self, project_id):
+    def load_by_project(self, project_id, keep_selection=False):
         """載入指定專案的圖面"""
         self._current_project_id = project_id
-        project = queries.get_project(project_id)
-        if project:
-            self.header_label.config(text=f"圖面清單 - {project['name']}")
+        self._current_client_id = None
+        self._show_all = False
+
+        def _load():
+            return run_batch([(queries.get_project, (project_id,)),
+                              (queries.get_drawings_by_project, (project_id,))])
+
+        def _done(result):
+            project, drawings = result
+            if project:
+                self.header_label.config(text=f"圖面清單 - {project['name']}")
+            self._set_drawings(drawings, keep_selection)
 
-        self._current_drawings = queries.get_drawings_by_project(project_id)
-        self._display_drawings(self._current_drawings)
+        get_query_executor(self).submit('drawing_list', _load, on_done=_done)
 
     def load_by_client(self, client_id):
         """載入指定客戶所有圖面"""
         self._current_project_id = None
-        client = queries.get_client(client_id)
-        if client:
-            self.header_label.config(text=f"圖面清單 - {client['name']}（所有專案）")
+        self._current_client_id = client_id
+        self._show_all = False
 
-        drawings = []
-        for p in queries.get_projects_by_client(client_id):
-            drawings.extend(queries.get_drawings_by_project(p['id']))
-        self._current_drawings = drawings
-        self._display_drawings(self._current_drawings)
+        def _load():
+            return run_batch([(queries.get_client, (client_id,)),
+                              (queries.get_drawings_by_client, (client_id,))])
+
+        def _done(result):
+            client, drawings = result
+            if client:
+                self.header_label.config(text=f"圖面清單 - {client['name']}（所有專案）")
+            self._set_drawings(drawings)
+
+        get_query_executor(self).submit('drawing_list', _load, on_done=_done)
 
     def load_search_results(self, drawings):
         """載入搜尋結果"""
+        get_query_executor(self).cancel('drawing_list')
         self.header_label.config(text="搜尋結果")
         self._current_project_id = None
-        self._current_drawings = drawings
-        self._display_drawings(drawings)
+        self._current_client_id = None
+        self._show_all = False
+        self._set_drawings(drawings, keep_selection=True)
 
     def load_all(self):
         """載入所有圖面"""
         self.header_label.config(text="所有圖面")
         self._current_project_id = None
-        self._current_drawings = queries.get_all_drawings()
-        self._display_drawings(self._current_drawings)
-
-    def _display_drawings(self, drawings):
-        """顯示圖面到表格"""
-        self.tree.delete(*self.tree.get_children())
-        self._icon_refs.clear()
+        self._current_client_id = None
+        self._show_all = True
+        get_query_executor(self).submit('drawing_list', queries.get_all_drawings,
+                                        on_done=self._set_drawings)
 
-        icon_cache = get_file_icon_cache()
+    def _set_drawings(self, drawings, keep_selection=False):
+        self._current_drawings = drawings
+        self._display_drawings(drawings, keep_selection)
 
-        for d in drawings:
-            file_path = d['file_path'] or ''
-            ext = os.path.splitext(file_path)[1].lower() if file_path else ''
-            ext_display = ext.lstrip('.').upper() if ext else ''
+    def _display_drawings(self, drawings, keep_selection=False):
+        """顯示圖面到表格；keep_selection 時保留原本選取的圖面
 
-            # 取得系統圖示
-            icon = None
-            if ext:
-                try:
-                    icon = icon_cache.get_icon(ext, widget=self.tree)
-                except Exception:
-                    pass
+        大量結果分段插入（每段 DISPLAY_CHUNK 筆），第一段立即顯示，其餘於閒置時接續，
+        插入期間介面仍可操作；再次載入時未完成的插入會被捨棄。
+        """
+        selected = self.get_selected_drawing_id() if keep_selection else None
+        self.tree.delete(*self.tree.get_children())
+        self._icon_refs.clear()
+        self._selected_id = None
+        self._display_token += 1
+        self.count_label.config(text=f"共 {len(drawings)} 張")
+        self._insert_chunk(drawings, 0, self._display_token, selected)
 
+    def _insert_chunk(self, drawings, start, token, selected):
+        if token != self._display_token:
+            return  # 已被較新的載入取代
+        for d in drawings[start:start + DISPLAY_CHUNK]:
             iid = str(d['id'])
+            if self.tree.exists(iid):
+                continue
+            icon, values = self._row(d)
             if icon:
                 self._icon_refs[iid] = icon  # 防止 GC 回收
-                self.tree.insert('', 'end', iid=iid, image=icon, values=(
-                    d['drawing_number'],
-                    d['title'],
-                    ext_display,
-                    d['current_rev'] or '',
-                    d['status'] or '',
-                    d['drawing_type'] or '',
-                    (d['updated_at'] or '')[:16],
-                ))
+                self.tree.insert('', 'end', iid=iid, image=icon, values=values)
             else:
-                self.tree.insert('', 'end', iid=iid, values=(
-                    d['drawing_number'],
-                    d['title'],
-                    ext_display,
-                    d['current_rev'] or '',
-                    d['status'] or '',
-                    d['drawing_type'] or '',
-                    (d['updated_at'] or '')[:16],
-                ))
+                self.tree.insert('', 'end', iid=iid, values=values)
+
+        # 重新整理後還原選取（_on_select 會略過未變更的選取，不重複載入明細）
+        if selected is not None and self.tree.exists(str(selected)):
+            self._selected_id = selected
+            self.tree.selection_set(str(selected))
+            self.tree.see(str(selected))
+            selected = None
+
+        if start + DISPLAY_CHUNK < len(drawings):
+            self.after(1, self._insert_chunk, drawings, start + DISPLAY_CHUNK, token, selected)
+
+    def _row(self, d):
+        """圖面列的 (圖示, 欄位值)"""
+        file_path = d['file_path'] or ''
+        ext = os.path.splitext(file_path)[1].lower() if file_path else ''
+        ext_display = ext.lstrip('.').upper() if ext else ''
+
+        # 取得系統圖示
+        icon = None
+        if ext:
+            try:
+                icon = get_file_icon_cache().get_icon(ext, widget=self.tree)
+            except Exception:
+                pass
+
+        return icon, (
+            d['drawing_number'],
+            d['title'],
+            ext_display,
+            d['current_rev'] or '',
+            d['status'] or '',
+            d['drawing_type'] or '',
+            (d['updated_at'] or '')[:16],
+        )
+
+    def apply_changes(self, drawing_ids):
+        """依異動的圖面 id 更新清單
+
+        已顯示的列就地更新（保留選取、排序與捲動位置），已刪除或移出目前專案/客戶的列移除；
+        未顯示的圖面只在屬於目前專案/客戶（或所有圖面清單）時加入，搜尋結果不加入新圖面。
+        """
+        shown = {d for d in drawing_ids if self.tree.exists(str(d))}
+        scoped = self._current_project_id or self._current_client_id or self._show_all
+        ids = drawing_ids if scoped else shown
+        if not ids:
+            return
 
-        self.count_label.config(text=f"共 {len(drawings)} 張")
+        def _done(rows):
+            found = {r['id']: r for r in rows if r['id'] in shown or self._in_scope(r)}
+            for drawing_id in shown:
+                iid = str(drawing_id)
+                if not self.tree.exists(iid):
+                    continue
+                d = found.get(drawing_id)
+                if d is None or not self._in_scope(d):
+                    found.pop(drawing_id, None)
+                    self.tree.delete(iid)
+                    self._icon_refs.pop(iid, None)
+                    continue
+                icon, values = self._row(d)
+                if icon:
+                    self._icon_refs[iid] = icon
+                    self.tree.item(iid, image=icon, values=values)
+                else:
+                    self.tree.item(iid, values=values)
+            added = [d for d in found.values()
+                     if d['id'] not in shown and not self.tree.exists(str(d['id']))]
+            for d in added:
+                iid = str(d['id'])
+                icon, values = self._row(d)
+                if icon:
+                    self._icon_refs[iid] = icon
+                    self.tree.insert('', 'end', iid=iid, image=icon, values=values)
+                else:
+                    self.tree.insert('', 'end', iid=iid, values=values)
+            self._current_drawings = [found.get(d['id'], d) for d in self._current_drawings
+                                      if d['id'] not in shown or d['id'] in found] + added
+            self.count_label.config(text=f"共 {len(self.tree.get_children())} 張")
+
+        get_query_executor(self).submit('drawing_list_rows', queries.get_drawings_by_ids,
+                                        sorted(ids), on_done=_done)
+
+    def _in_scope(self, d):
+        """圖面是否屬於目前清單的專案/客戶（搜尋結果只保留已顯示的圖面）"""
+        if self._current_project_id:
+            return d['project_id'] == self._current_project_id
+        if self._current_client_id:
+            return d['client_id'] == self._current_client_id
+        return self._show_all or self.tree.exists(str(d['id']))
 
     def _sort_by(self, col):
         """按欄位排序"""
@@ -170,6 +272,9 @@ class DrawingList(ttk.Frame):
         if not selection:
             return
         drawing_id = int(selection[0])
+        if drawing_id == self._selected_id:
+            return
+        self._selected_id = drawing_id
         if self.on_drawing_selected:
             self.on_drawing_selected(drawing_id)
 
@@ -192,9 +297,9 @@ class DrawingList(ttk.Frame):
     def refresh(self):
         """重新載入目前的圖面"""
         if self._current_project_id:
-            self.load_by_project(self._current_project_id)
+            self.load_by_project(self._current_project_id, keep_selection=True)
         else:
-            self._display_drawings(self._current_drawings)
+            self._display_drawings(self._current_drawings, keep_selection=True)
 
     def get_selected_drawing_id(self):
         selection = self.tree.selection()
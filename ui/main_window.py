@@ -18,8 +18,14 @@ from ui.dialogs.client_dialog import ClientDialog
 from ui.dialogs.project_dialog import ProjectDialog
 from ui.dialogs.drawing_dialog import DrawingDialog
 from ui.dialogs.search_dialog import SearchDialog
+from ui.dialogs.inbox_dialog import InboxDialog
 from core.export import export_drawings_to_csv
-from config import COMPANY_NAME, FONT_FAMILY
+from core.query_executor import get_query_executor
+from core.change_poller import get_change_poller, ChangePoller
+from core.live_search import live_search
+from core.content_extractor import background_indexer
+from core import receivables
+from config import COMPANY_NAME, FONT_FAMILY, SEARCH_DEBOUNCE_MS, AR_OVERDUE_CHECK_MINUTES
 
 
 # 模組定義：(key, label, icon_char, bootstyle)
@@ -35,6 +41,36 @@ MODULE_DEFS = [
     ('maintenance',  '機器維修', 'R', DANGER),
 ]
 
+# 各模組顯示的資料表：這些資料表有異動時重新整理模組
+MODULE_TABLES = {
+    'dashboard':   ('clients', 'quotations', 'customer_orders', 'purchase_requisitions',
+                    'invoices', 'production_orders', 'machines', 'maintenance_records',
+                    'circulation_orders', 'circulation_tasks'),
+    'quotation':   ('quotations', 'quotation_items', 'clients'),
+    'purchase':    ('purchase_requisitions', 'pr_items', 'suppliers'),
+    'order':       ('customer_orders', 'order_items', 'clients', 'quotations'),
+    'invoice':     ('invoices', 'invoice_items', 'customer_orders', 'clients'),
+    'export_doc':  ('export_documents', 'invoices', 'customer_orders'),
+    'production':  ('production_orders', 'production_tasks', 'machines'),
+    'maintenance': ('machines', 'maintenance_records'),
+}
+
+# 圖面管理面板相關資料表
+DRAWING_TABLES = ('drawings', 'revisions', 'circulation_orders', 'circulation_tasks')
+
+# 全域搜尋結果 → (模組, 模組內的清單屬性, 是否以上層文件 id 定位)
+SEARCH_TARGETS = {
+    'quotations':          ('quotation', 'tree', False),
+    'quotation_items':     ('quotation', 'tree', True),
+    'customer_orders':     ('order', 'tree', False),
+    'order_items':         ('order', 'tree', True),
+    'invoices':            ('invoice', 'tree', False),
+    'export_documents':    ('export_doc', 'tree', False),
+    'production_orders':   ('production', 'tree', False),
+    'machines':            ('maintenance', 'machine_tree', False),
+    'maintenance_records': ('maintenance', 'machine_tree', True),
+}
+
 
 class MainWindow:
     """主視窗 — 模組導航 + 內容切換"""
@@ -48,11 +84,30 @@ class MainWindow:
         self.modules = {}
         self.current_module = None
         self.nav_buttons = {}
+        self._loading_keys = set()
+        self._stale_modules = set()
+        self._search_after = None
+
+        get_query_executor(self.root).add_loading_listener(self._on_query_loading)
 
         self._create_menu()
         self._create_layout()
         self._switch_module('dashboard')
 
+        # 資料異動輪詢：本機與其他工作站的修改都會增量反映到畫面
+        poller = get_change_poller(self.root)
+        poller.subscribe(('clients', 'projects'), self._on_tree_changed)
+        poller.subscribe(DRAWING_TABLES, self._on_drawings_changed)
+        poller.subscribe(None, self._on_data_changed)
+        poller.subscribe(('revisions',), lambda changes: background_indexer.request())
+        poller.start()
+
+        # 圖檔文字擷取：啟動後處理尚未建立索引的檔案，之後新增版次時再處理
+        self.root.after(5000, background_indexer.request)
+
+        # 應收帳款：啟動時及之後定期將過期未付的發票標為逾期（跨日時自動生效）
+        self._check_overdue_invoices()
+
     def _create_menu(self):
         menubar = Menu(self.root)
         self.root.config(menu=menubar)
@@ -77,13 +132,19 @@ class MainWindow:
 
         tool_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="工具", menu=tool_menu)
+        tool_menu.add_command(label="全域搜尋", command=self._global_search,
+                              accelerator="Ctrl+Shift+F")
         tool_menu.add_command(label="進階搜尋", command=self._advanced_search)
+        tool_menu.add_command(label="發行待辦收件匣", command=self._show_inbox)
+        tool_menu.add_command(label="查詢效能統計", command=self._show_query_stats)
         tool_menu.add_command(label="批次另存所有圖面副本...", command=self._batch_save_copies)
 
         help_menu = Menu(menubar, tearoff=0)
         menubar.add_cascade(label="說明", menu=help_menu)
         help_menu.add_command(label="關於", command=self._show_about)
 
+        self.root.bind('<Control-F>', lambda e: self._global_search())
+
     def _create_layout(self):
         """建立側邊欄 + 內容區主佈局"""
         # 主容器
@@ -136,6 +197,8 @@ class MainWindow:
         self.status_total.pack(side=LEFT)
         self.status_info = ttk.Label(self.statusbar, text="")
         self.status_info.pack(side=RIGHT)
+        self.status_loading = ttk.Label(self.statusbar, text="", bootstyle=INFO)
+        self.status_loading.pack(side=RIGHT, padx=10)
 
     def _switch_module(self, module_key):
         """切換到指定模組"""
@@ -162,6 +225,10 @@ class MainWindow:
         module_widget = self.modules[module_key]
         if module_widget:
             module_widget.pack(fill=BOTH, expand=True)
+            # 隱藏期間資料有異動，顯示時才重新整理
+            if module_key in self._stale_modules and hasattr(module_widget, 'refresh'):
+                module_widget.refresh()
+        self._stale_modules.discard(module_key)
 
         self.current_module = module_key
         self._update_statusbar()
@@ -223,6 +290,8 @@ class MainWindow:
         search_entry = ttk.Entry(toolbar, textvariable=self.search_var, width=25)
         search_entry.pack(side=LEFT, padx=(5, 5))
         search_entry.bind('<Return>', lambda e: self._quick_search())
+        # 輸入即搜尋：停止輸入 SEARCH_DEBOUNCE_MS 後才查詢
+        self.search_var.trace_add('write', self._on_search_typed)
 
         ttk.Button(toolbar, text="搜尋", command=self._quick_search,
                    bootstyle=PRIMARY, width=6).pack(side=LEFT, padx=2)
@@ -276,6 +345,52 @@ class MainWindow:
                            if k == self.current_module), '')
         self.status_info.config(text=f"目前模組：{module_name}")
 
+    def _check_overdue_invoices(self):
+        """背景執行逾期標記；狀態變更經 change_log 輪詢反映到各模組"""
+        get_query_executor(self.root).submit('ar_overdue', receivables.refresh_overdue)
+        self.root.after(AR_OVERDUE_CHECK_MINUTES * 60 * 1000, self._check_overdue_invoices)
+
+    def _on_query_loading(self, key, loading):
+        """背景查詢載入指示（略過背景異動輪詢）"""
+        if key == ChangePoller.QUERY_KEY:
+            return
+        if loading:
+            self._loading_keys.add(key)
+        else:
+            self._loading_keys.discard(key)
+        self.status_loading.config(text="載入中…" if self._loading_keys else "")
+
+    # === 資料異動 ===
+
+    def _on_tree_changed(self, changes):
+        live_search.invalidate()
+        if hasattr(self, 'client_tree'):
+            self.client_tree.refresh()
+
+    def _on_drawings_changed(self, changes):
+        live_search.invalidate()
+        if not hasattr(self, 'drawing_list'):
+            return
+        self.drawing_list.apply_changes(changes.drawing_ids)
+        current = self.detail_panel.get_current_drawing_id()
+        if current in changes.drawing_ids:
+            self.detail_panel.reload()
+
+    def _on_data_changed(self, changes):
+        """重新整理受影響的模組：目前模組立即更新，其他模組標記待切換時更新"""
+        for key, module in self.modules.items():
+            if module is None or key not in MODULE_TABLES:
+                continue
+            if not changes.touches(MODULE_TABLES[key]):
+                continue
+            if key == self.current_module:
+                if hasattr(module, 'refresh'):
+                    module.refresh()
+            else:
+                self._stale_modules.add(key)
+        if changes.touches(('drawings', 'clients')):
+            self._update_statusbar()
+
     # === 圖面管理事件 ===
 
     def _on_project_selected(self, project_id):
@@ -292,6 +407,7 @@ class MainWindow:
         self.detail_panel.load_drawing(drawing_id)
 
     def _on_detail_refresh(self):
+        live_search.invalidate()
         self.drawing_list.refresh()
         self.client_tree.refresh()
         self._update_statusbar()
@@ -326,23 +442,45 @@ class MainWindow:
                 self.client_tree.refresh()
             self._update_statusbar()
 
+    def _on_search_typed(self, *args):
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(SEARCH_DEBOUNCE_MS, self._quick_search)
+
     def _quick_search(self):
         if not hasattr(self, 'search_var'):
             return
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+            self._search_after = None
         keyword = self.search_var.get().strip()
         if not keyword:
+            self._restore_drawing_list()
             return
         if self.current_module != 'drawing':
             self._switch_module('drawing')
-        results = queries.search_drawings(keyword=keyword)
-        self.drawing_list.load_search_results(results)
-        self.detail_panel.clear()
-        self.status_info.config(text=f"搜尋「{keyword}」找到 {len(results)} 筆結果")
+
+        def _done(result):
+            results, source = result
+            self.drawing_list.load_search_results(results)
+            current = self.detail_panel.get_current_drawing_id()
+            if current not in {r['id'] for r in results}:
+                self.detail_panel.clear()
+            cached = "（快取）" if source != 'query' else ""
+            self.status_info.config(text=f"搜尋「{keyword}」找到 {len(results)} 筆結果{cached}")
+
+        # 背景執行；較短關鍵字的快取結果直接在記憶體中精煉
+        get_query_executor(self.root).submit('drawing_list', live_search.search, keyword,
+                                             on_done=_done)
 
     def _clear_search(self):
         if not hasattr(self, 'search_var'):
             return
         self.search_var.set('')
+        self._quick_search()
+
+    def _restore_drawing_list(self):
+        """清除搜尋後回到客戶樹目前選取的專案或客戶"""
         self.status_info.config(text="")
         if hasattr(self, 'client_tree'):
             project_id = self.client_tree.get_selected_project_id()
@@ -358,11 +496,54 @@ class MainWindow:
         if dialog.result:
             if self.current_module != 'drawing':
                 self._switch_module('drawing')
-            results = queries.search_drawings(**dialog.result)
+            results = dialog.rows
+            if results is None:
+                results = queries.search_drawings(**dialog.result)
             self.drawing_list.load_search_results(results)
             self.detail_panel.clear()
             self.status_info.config(text=f"進階搜尋找到 {len(results)} 筆結果")
 
+    def _global_search(self):
+        from ui.dialogs.global_search_dialog import GlobalSearchDialog
+        GlobalSearchDialog(self.root, on_open=self._open_search_hit)
+
+    def _open_search_hit(self, entity, hit):
+        """開啟全域搜尋結果：切換到對應模組並選取該筆資料"""
+        if entity == 'drawings':
+            self._switch_module('drawing')
+            self.drawing_list.load_search_results(queries.get_drawings_by_ids([hit['id']]))
+            self.detail_panel.load_drawing(hit['id'])
+            return
+        if entity == 'suppliers':
+            from ui.modules.purchase_module import SupplierDialog
+            self._switch_module('purchase')
+            self._select_row(SupplierDialog(self.root).tree, hit['id'])
+            return
+        module_key, tree_attr, by_parent = SEARCH_TARGETS[entity]
+        self._switch_module(module_key)
+        tree = getattr(self.modules[module_key], tree_attr)
+        self._select_row(tree, hit['parent_id'] if by_parent else hit['id'])
+
+    def _select_row(self, tree, record_id, retries=10):
+        """選取清單中第一欄為 record_id 的列（背景載入的模組稍後重試）"""
+        for iid in tree.get_children():
+            if tree.item(iid)['values'][0] == record_id:
+                tree.selection_set(iid)
+                tree.focus(iid)
+                tree.see(iid)
+                return
+        if retries:
+            self.root.after(200, lambda: self._select_row(tree, record_id, retries - 1))
+        else:
+            self.status_info.config(text="找不到該筆資料（可能被目前的篩選條件排除）")
+
+    def _show_inbox(self):
+        InboxDialog(self.root)
+
+    def _show_query_stats(self):
+        from ui.dialogs.query_stats_dialog import QueryStatsDialog
+        QueryStatsDialog(self.root)
+
     def _show_all_drawings(self):
         if self.current_module != 'drawing':
             self._switch_module('drawing')
@@ -371,11 +552,20 @@ class MainWindow:
             self.detail_panel.clear()
 
     def _refresh_all(self):
+        # 整個畫面重新載入，尚未分派的異動不必再由輪詢重新整理一次
+        get_change_poller().skip_pending(self._reload_views)
+
+    def _reload_views(self):
+        # 被略過的異動原本會觸發的工作：搜尋快取、文字索引與其他模組的待更新標記
+        live_search.invalidate()
+        background_indexer.request()
+        self._stale_modules.update(key for key, module in self.modules.items()
+                                   if module is not None and key != self.current_module)
         if hasattr(self, 'client_tree'):
             self.client_tree.refresh()
             self.drawing_list.refresh()
             self.detail_panel.clear()
-        # 重整當前模組
+        # 重整當前模組，其他模組切換時再載入
         if self.current_module in self.modules:
             module = self.modules[self.current_module]
             if hasattr(module, 'refresh'):
@@ -3,9 +3,17 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
 from db import business_queries as bq
+from core import circulation_sla, receivables
+from core.query_executor import get_query_executor, get_background_executor
 from config import COMPANY_NAME, FONT_FAMILY
 
 
+def _load_sla_data():
+    """（工作執行緒）發行時效摘要與目前逾期件數"""
+    return (circulation_sla.sla_summary(days=30, refresh_first=False),
+            len(circulation_sla.overdue_tasks()))
+
+
 class DashboardModule(ttk.Frame):
     """首頁儀表板"""
 
@@ -28,22 +36,60 @@ class DashboardModule(ttk.Frame):
 
         ttk.Separator(self, orient=HORIZONTAL).pack(fill=X, padx=10)
 
-        # 卡片容器
+        # 卡片容器：各面板在背景查詢完成後各自填入
         self.card_container = ttk.Frame(self, padding=15)
         self.card_container.pack(fill=BOTH, expand=True)
+        self.stats_holder = ttk.Frame(self.card_container)
+        self.stats_holder.pack(fill=X)
+        self.ar_holder = ttk.Frame(self.card_container)
+        self.ar_holder.pack(fill=X)
+        self.sla_holder = ttk.Frame(self.card_container)
+        self.sla_holder.pack(fill=X)
+
+        # 系統資訊
+        info_frame = ttk.LabelFrame(self.card_container, text="系統資訊")
+        info_frame.pack(fill=X, pady=(15, 0))
+
+        features = [
+            ("報價單管理", "報價單建立、品項管理、PDF匯出、轉訂單"),
+            ("請購單管理", "原物料/零件/工具請購、供應商管理、審核流程"),
+            ("客戶訂單管理", "訂單建立、品項明細、出貨追蹤"),
+            ("發票紀錄", "發票開立、品項管理、PDF匯出、付款追蹤"),
+            ("出口文件紀錄", "商業發票、裝箱單、提單、產地證明等文件管理"),
+            ("生產進度甘特圖", "生產排程、任務分配、進度追蹤、甘特圖視覺化"),
+            ("機器維修彙報", "設備清單、維修紀錄、停機統計、保養排程"),
+        ]
+
+        for i, (name, desc) in enumerate(features):
+            row = ttk.Frame(info_frame)
+            row.pack(fill=X, pady=2)
+            ttk.Label(row, text=f"  {name}", font=(FONT_FAMILY, 10, 'bold'),
+                      width=18, anchor=W).pack(side=LEFT)
+            ttk.Label(row, text=f"— {desc}", foreground='#666666').pack(side=LEFT)
 
     def refresh(self):
-        # 清除舊內容
-        for w in self.card_container.winfo_children():
+        """重新載入各面板（查詢在背景執行，不阻塞畫面）"""
+        executor = get_query_executor(self)
+        executor.submit(f'dashboard_stats:{id(self)}', bq.get_dashboard_stats,
+                        on_done=self._show_stats, on_error=self._on_stats_error)
+        executor.submit(f'dashboard_ar:{id(self)}', receivables.aging_report,
+                        on_done=self._show_ar_panel,
+                        on_error=lambda e: print(f"[帳齡統計失敗] {e}"))
+        self._load_sla()
+        # 彙總表的增量累加是寫入交易，在背景執行；有新歷程時再更新時效面板
+        get_background_executor(self).submit(f'sla_rollup:{id(self)}', circulation_sla.refresh,
+                                             on_done=self._on_sla_rollup)
+
+    def _on_stats_error(self, e):
+        print(f"[儀表板統計失敗] {e}")
+        self._show_stats({})
+
+    def _show_stats(self, stats):
+        for w in self.stats_holder.winfo_children():
             w.destroy()
 
-        try:
-            stats = bq.get_dashboard_stats()
-        except Exception:
-            stats = {}
-
         # 第一行卡片
-        row1 = ttk.Frame(self.card_container)
+        row1 = ttk.Frame(self.stats_holder)
         row1.pack(fill=X, pady=(0, 10))
 
         self._create_card(row1, "客戶", str(stats.get('client_count', 0)),
@@ -56,12 +102,13 @@ class DashboardModule(ttk.Frame):
                           "張請購單", '#E8B84B')
 
         # 第二行卡片
-        row2 = ttk.Frame(self.card_container)
+        row2 = ttk.Frame(self.stats_holder)
         row2.pack(fill=X, pady=(0, 10))
 
         unpaid = stats.get('invoice_unpaid_amount', 0)
         self._create_card(row2, "未收款發票", str(stats.get('invoice_unpaid', 0)),
-                          f"金額：${unpaid:,.0f}", '#E07070')
+                          f"金額：${unpaid:,.0f}　逾期 {stats.get('invoice_overdue', 0)} 張",
+                          '#E07070')
         self._create_card(row2, "生產中", str(stats.get('production_active', 0)),
                           "張生產單", '#FFA726')
         self._create_card(row2, "待處理維修", str(stats.get('maintenance_pending', 0)),
@@ -69,26 +116,70 @@ class DashboardModule(ttk.Frame):
         self._create_card(row2, "異常設備", str(stats.get('machine_down', 0)),
                           "台設備停機/待修", '#EF5350')
 
-        # 系統資訊
-        info_frame = ttk.LabelFrame(self.card_container, text="系統資訊")
-        info_frame.pack(fill=X, pady=(15, 0))
-
-        features = [
-            ("報價單管理", "報價單建立、品項管理、PDF匯出、轉訂單"),
-            ("請購單管理", "原物料/零件/工具請購、供應商管理、審核流程"),
-            ("客戶訂單管理", "訂單建立、品項明細、出貨追蹤"),
-            ("發票紀錄", "發票開立、品項管理、PDF匯出、付款追蹤"),
-            ("出口文件紀錄", "商業發票、裝箱單、提單、產地證明等文件管理"),
-            ("生產進度甘特圖", "生產排程、任務分配、進度追蹤、甘特圖視覺化"),
-            ("機器維修彙報", "設備清單、維修紀錄、停機統計、保養排程"),
-        ]
+    def _show_ar_panel(self, report):
+        """應收帳款帳齡（每客戶 × 幣別）"""
+        for w in self.ar_holder.winfo_children():
+            w.destroy()
+        if not report:
+            return
+
+        ar_frame = ttk.LabelFrame(self.ar_holder, text="應收帳款帳齡（依到期日，天）")
+        ar_frame.pack(fill=X, pady=(5, 10))
+        cols = ('client', 'currency', 'count') + receivables.AGING_LABELS + ('total',)
+        tree = ttk.Treeview(ar_frame, columns=cols, show='headings',
+                            height=min(len(report), 6))
+        headings = [('client', '客戶', 140), ('currency', '幣別', 50), ('count', '張數', 50)]
+        headings += [(label, label, 90) for label in receivables.AGING_LABELS]
+        headings += [('total', '合計', 100)]
+        for key, text, width in headings:
+            tree.heading(key, text=text)
+            tree.column(key, width=width, anchor=W if key == 'client' else E)
+        for r in report:
+            tree.insert('', END, values=(
+                r['client_name'] or '', r['currency'], r['count'],
+                *(f"{r['buckets'][label]:,.0f}" for label in receivables.AGING_LABELS),
+                f"{r['total']:,.0f}"))
+        tree.pack(fill=X, padx=5, pady=5)
+
+    def _on_sla_rollup(self, added):
+        if added and self.winfo_exists():
+            self._load_sla()
+
+    def _load_sla(self):
+        get_query_executor(self).submit(f'dashboard_sla:{id(self)}', _load_sla_data,
+                                        on_done=self._show_sla,
+                                        on_error=lambda e: print(f"[發行時效統計失敗] {e}"))
+
+    def _show_sla(self, data):
+        """發行時效（近 30 天，讀取增量彙總表；彙總表由背景更新，這裡只讀取）"""
+        summary, overdue = data
+        for w in self.sla_holder.winfo_children():
+            w.destroy()
 
-        for i, (name, desc) in enumerate(features):
-            row = ttk.Frame(info_frame)
-            row.pack(fill=X, pady=2)
-            ttk.Label(row, text=f"  {name}", font=(FONT_FAMILY, 10, 'bold'),
-                      width=18, anchor=W).pack(side=LEFT)
-            ttk.Label(row, text=f"— {desc}", foreground='#666666').pack(side=LEFT)
+        sla_frame = ttk.LabelFrame(self.sla_holder,
+                                   text=f"發行時效（近 30 天）　目前逾期未處理：{overdue} 項")
+        sla_frame.pack(fill=X, pady=(5, 0))
+        if not summary:
+            ttk.Label(sla_frame, text="  尚無收到/確認紀錄", foreground='#888888').pack(anchor=W, pady=4)
+            return
+
+        cols = ('flow', 'group', 'count', 'avg', 'p50', 'p95', 'over')
+        tree = ttk.Treeview(sla_frame, columns=cols, show='headings',
+                            height=min(len(summary), 6))
+        for key, text, width in [('flow', '流程', 60), ('group', '部門 / 步驟', 120),
+                                 ('count', '件數', 60), ('avg', '平均 (h)', 80),
+                                 ('p50', 'P50 (h)', 80), ('p95', 'P95 (h)', 80),
+                                 ('over', '逾時件數', 80)]:
+            tree.heading(key, text=text)
+            tree.column(key, width=width, anchor=W if key == 'group' else CENTER)
+        for r in sorted(summary, key=lambda x: (x['flow_type'], x['group_key'])):
+            tree.insert('', END, values=(
+                r['flow_type'], r['group_key'], r['count'],
+                f"{r['avg_hours']:.1f}",
+                '≤ %.1f' % r['p50_hours'] if r['p50_hours'] is not None else '',
+                '≤ %.1f' % r['p95_hours'] if r['p95_hours'] is not None else '',
+                f"{r['over_sla']}（>{r['sla_hours']}h）"))
+        tree.pack(fill=X, padx=5, pady=5)
 
     def _create_card(self, parent, title, value, subtitle, color):
         """建立統計卡片"""
@@ -5,6 +5,7 @@ from tkinter import filedialog
 import os
 
 from db import business_queries as bq
+from ui.dialogs.export_pack_dialog import ExportPackDialog
 from config import (EXPORT_DOC_TYPES, EXPORT_DOC_STATUS, SHIPPING_METHODS, FONT_FAMILY)
 
 
@@ -32,6 +33,8 @@ class ExportDocModule(ttk.Frame):
                    bootstyle=DANGER, width=8).pack(side=LEFT, padx=2)
         ttk.Button(toolbar, text="附加檔案", command=self._attach_file,
                    bootstyle=PRIMARY+OUTLINE, width=10).pack(side=LEFT, padx=2)
+        ttk.Button(toolbar, text="產生文件組", command=self._on_build_pack,
+                   bootstyle=SUCCESS+OUTLINE, width=10).pack(side=LEFT, padx=2)
 
         ttk.Label(toolbar, text="狀態：").pack(side=RIGHT, padx=(10, 2))
         self.filter_status = ttk.Combobox(toolbar, values=['全部'] + EXPORT_DOC_STATUS,
@@ -117,6 +120,14 @@ class ExportDocModule(ttk.Frame):
             bq.delete_export_document(doc_id)
             self.refresh()
 
+    def _on_build_pack(self):
+        # 以目前選取文件的訂單為預設
+        sel = self.tree.selection()
+        order_number = self.tree.set(sel[0], 'order') if sel else None
+        dlg = ExportPackDialog(self.winfo_toplevel(), order_number=order_number)
+        if dlg.result:
+            self.refresh()
+
     def _attach_file(self):
         doc_id = self._get_selected_id()
         if not doc_id:
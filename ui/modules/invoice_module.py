@@ -4,6 +4,7 @@ from ttkbootstrap.constants import *
 from tkinter import filedialog
 
 from db import business_queries as bq
+from core.query_executor import get_query_executor
 from config import (INVOICE_STATUS, CURRENCY_OPTIONS, UNIT_OPTIONS,
                     DOC_NUMBER_PREFIX, FONT_FAMILY)
 
@@ -34,6 +35,8 @@ class InvoiceModule(ttk.Frame):
                    bootstyle=WARNING, width=8).pack(side=LEFT, padx=2)
         ttk.Button(toolbar, text="匯出 PDF", command=self._on_export_pdf,
                    bootstyle=PRIMARY+OUTLINE, width=10).pack(side=LEFT, padx=2)
+        ttk.Button(toolbar, text="批次匯出", command=self._on_batch_export,
+                   bootstyle=PRIMARY+OUTLINE, width=10).pack(side=LEFT, padx=2)
 
         ttk.Label(toolbar, text="狀態：").pack(side=RIGHT, padx=(10, 2))
         self.filter_status = ttk.Combobox(toolbar, values=['全部'] + INVOICE_STATUS,
@@ -114,7 +117,11 @@ class InvoiceModule(ttk.Frame):
     def refresh(self):
         status_filter = self.filter_status.get()
         status = None if status_filter == '全部' else status_filter
-        rows = bq.get_all_invoices(payment_status=status)
+        get_query_executor(self).submit(
+            'invoice_list', bq.get_all_invoices, payment_status=status,
+            on_done=self._fill_list)
+
+    def _fill_list(self, rows):
         self.tree.delete(*self.tree.get_children())
         for r in rows:
             self.tree.insert('', END, values=(
@@ -205,6 +212,10 @@ class InvoiceModule(ttk.Frame):
                 bq.recalculate_invoice(inv_id)
             self._on_select()
 
+    def _on_batch_export(self):
+        from ui.dialogs.batch_pdf_dialog import BatchPdfDialog
+        BatchPdfDialog(self.winfo_toplevel(), 'invoice')
+
     def _on_export_pdf(self):
         inv_id = self._get_selected_id()
         if not inv_id:
@@ -3,6 +3,7 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
 from db import business_queries as bq
+from core.query_executor import get_query_executor
 from config import (MACHINE_STATUS, MAINTENANCE_TYPES, MAINTENANCE_STATUS,
                     DEPARTMENTS, DEFAULT_OPERATOR, FONT_FAMILY)
 
@@ -140,7 +141,11 @@ class MaintenanceModule(ttk.Frame):
     def refresh(self):
         ms = self.filter_machine_status.get()
         status = None if ms == '全部' else ms
-        machines = bq.get_all_machines(status=status)
+        get_query_executor(self).submit(
+            'machine_list', bq.get_all_machines, status=status,
+            on_done=self._fill_machines)
+
+    def _fill_machines(self, machines):
         self.machine_tree.delete(*self.machine_tree.get_children())
         for m in machines:
             self.machine_tree.insert('', END, values=(
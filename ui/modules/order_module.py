@@ -3,6 +3,7 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
 from db import business_queries as bq
+from core.query_executor import get_query_executor
 from config import (ORDER_STATUS, CURRENCY_OPTIONS, UNIT_OPTIONS,
                     PAYMENT_TERMS_OPTIONS, DELIVERY_TERMS_OPTIONS,
                     DOC_NUMBER_PREFIX, FONT_FAMILY)
@@ -121,10 +122,16 @@ class OrderModule(ttk.Frame):
     def refresh(self):
         status_filter = self.filter_status.get()
         status = None if status_filter == '全部' else status_filter
-        rows = bq.get_all_customer_orders(status=status)
+
+        def _load():
+            rows = bq.get_all_customer_orders(status=status)
+            return [(r, bq.get_order_total(r['id'])) for r in rows]
+
+        get_query_executor(self).submit('order_list', _load, on_done=self._fill_list)
+
+    def _fill_list(self, rows):
         self.tree.delete(*self.tree.get_children())
-        for r in rows:
-            total = bq.get_order_total(r['id'])
+        for r, total in rows:
             self.tree.insert('', END, values=(
                 r['id'], r['order_number'], r['client_name'] or '',
                 r['po_number'] or '', r['order_date'],
@@ -3,6 +3,9 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 
 from db import business_queries as bq
+from core.query_executor import get_query_executor
+from core.scheduler import ProductionSchedule, parse_depends_on
+from core.capacity import compute_capacity_months
 from config import (PRODUCTION_STATUS, PRODUCTION_PRIORITY, PRODUCTION_TASK_STATUS,
                     DEPARTMENTS, DOC_NUMBER_PREFIX, UNIT_OPTIONS, FONT_FAMILY)
 
@@ -34,6 +37,8 @@ class ProductionModule(ttk.Frame):
 
         ttk.Button(toolbar, text="甘特圖", command=self._show_gantt,
                    bootstyle=WARNING, width=8).pack(side=LEFT, padx=2)
+        ttk.Button(toolbar, text="產能負荷", command=self._show_capacity,
+                   bootstyle=WARNING+OUTLINE, width=8).pack(side=LEFT, padx=2)
 
         ttk.Label(toolbar, text="狀態：").pack(side=RIGHT, padx=(10, 2))
         self.filter_status = ttk.Combobox(toolbar, values=['全部'] + PRODUCTION_STATUS,
@@ -124,7 +129,11 @@ class ProductionModule(ttk.Frame):
     def refresh(self):
         status_filter = self.filter_status.get()
         status = None if status_filter == '全部' else status_filter
-        rows = bq.get_all_production_orders(status=status)
+        get_query_executor(self).submit(
+            'production_list', bq.get_all_production_orders, status=status,
+            on_done=self._fill_list)
+
+    def _fill_list(self, rows):
         self.tree.delete(*self.tree.get_children())
         for r in rows:
             self.tree.insert('', END, values=(
@@ -191,17 +200,46 @@ class ProductionModule(ttk.Frame):
             return
         task_id = self.task_tree.item(sel[0])['values'][0]
         vals = self.task_tree.item(sel[0])['values']
+        task = bq.get_production_task(task_id)
         existing = {
             'task_name': vals[1], 'department': vals[2],
             'assignee': vals[3], 'start_date': vals[4],
             'end_date': vals[5], 'progress_pct': int(str(vals[6]).replace('%', '')),
             'status': vals[7],
+            'depends_on': task['depends_on'] if task else None,
         }
         dlg = TaskDialog(self.winfo_toplevel(), data=existing)
         if dlg.result:
+            changes = {}
+            if (dlg.result['start_date'], dlg.result['end_date']) != (vals[4], vals[5]):
+                # 須以修改前的排程計算，寫入後再比對就看不出後續任務的變動
+                changes = self._slip_changes(task_id, dlg.result['start_date'],
+                                             dlg.result['end_date'])
             bq.update_production_task(task_id, **dlg.result)
+            self._propagate_slip(changes)
             self._on_select()
 
+    def _slip_changes(self, task_id, start_date, end_date):
+        """以修改前的任務日期建立排程，回傳受影響的後續任務 {task_id: (start, end)}"""
+        if not end_date:
+            return {}
+        schedule = ProductionSchedule(bq.get_all_production_tasks_for_gantt())
+        if task_id not in schedule.tasks:
+            return {}
+        changes = schedule.shift_task(task_id, new_start=start_date, new_end=end_date)
+        changes.pop(task_id, None)
+        return changes
+
+    def _propagate_slip(self, changes):
+        """任務日期變動後，詢問是否順延相依的後續任務"""
+        if not changes:
+            return
+        if ttk.dialogs.Messagebox.yesno(
+                f"有 {len(changes)} 項後續任務受前置任務日期影響，是否一併調整？",
+                parent=self.winfo_toplevel()) == '是':
+            bq.update_production_task_dates(
+                [(start, end, tid) for tid, (start, end) in changes.items()])
+
     def _on_delete_task(self):
         sel = self.task_tree.selection()
         if sel:
@@ -232,26 +270,93 @@ class ProductionModule(ttk.Frame):
         gantt = GanttChart(gantt_win)
         gantt.pack(fill=BOTH, expand=True, padx=5, pady=5)
 
+        state = {}
+        info_var = ttk.StringVar()
+
         def update_gantt(*_args):
             status = filter_var.get()
             status_filter = None if status == '全部' else status
-            tasks = bq.get_all_production_tasks_for_gantt(status_filter=status_filter)
-            chart_data = []
-            for t in tasks:
-                if t['start_date'] and t['end_date']:
-                    chart_data.append({
-                        'label': f"{t['product_name']} - {t['task_name']}",
-                        'start': t['start_date'],
-                        'end': t['end_date'],
-                        'progress': t['progress_pct'] or 0,
-                        'status': t['status'],
-                        'group': t['product_name'],
-                    })
-            gantt.update_chart(chart_data)
+            # 相依關係可跨生產單，排程一律以全部任務計算，篩選只影響顯示
+            tasks = bq.get_all_production_tasks_for_gantt()
+            schedule = ProductionSchedule(tasks)
+            state['schedule'] = schedule
+            shown = [t['id'] for t in tasks
+                     if t['start_date'] and t['end_date']
+                     and (not status_filter or t['po_status'] == status_filter)]
+            gantt.update_chart(schedule.gantt_rows(shown))
+
+            info = f"要徑任務 {len(schedule.critical_path())} 項"
+            if schedule.cycles:
+                info += f"，循環相依 {len(schedule.cycles)} 項（已忽略）"
+            info_var.set(info)
+
+        def apply_schedule():
+            schedule = state.get('schedule')
+            if not schedule:
+                return
+            updates = schedule.date_updates()
+            if not updates:
+                ttk.dialogs.Messagebox.show_info("任務日期皆已符合相依關係", parent=gantt_win)
+                return
+            if ttk.dialogs.Messagebox.yesno(
+                    f"將依前置任務調整 {len(updates)} 項任務的日期，確定？",
+                    parent=gantt_win) == '是':
+                bq.update_production_task_dates(updates)
+                update_gantt()
+                self._on_select()
+
+        ttk.Button(toolbar, text="依相依關係排程", command=apply_schedule,
+                   bootstyle=WARNING).pack(side=RIGHT, padx=5)
+        ttk.Label(toolbar, textvariable=info_var).pack(side=LEFT, padx=15)
 
         filter_combo.bind('<<ComboboxSelected>>', update_gantt)
         update_gantt()
 
+    def _show_capacity(self):
+        """顯示部門產能負荷熱度圖視窗"""
+        cap_win = ttk.Toplevel(self.winfo_toplevel())
+        cap_win.title("部門產能負荷")
+        cap_win.geometry("1100x450")
+        cap_win.transient(self.winfo_toplevel())
+
+        toolbar = ttk.Frame(cap_win, padding=5)
+        toolbar.pack(fill=X)
+        ttk.Label(toolbar, text="部門產能負荷", font=(FONT_FAMILY, 14, 'bold'),
+                  bootstyle=PRIMARY).pack(side=LEFT)
+
+        bucket_map = {'日': 'day', '週': 'week', '月': 'month'}
+        bucket_var = ttk.StringVar(value='週')
+        ttk.Combobox(toolbar, textvariable=bucket_var, values=list(bucket_map),
+                     width=5, state='readonly').pack(side=RIGHT, padx=5)
+        ttk.Label(toolbar, text="區段：").pack(side=RIGHT)
+
+        months_var = ttk.StringVar(value='12')
+        ttk.Combobox(toolbar, textvariable=months_var, values=['1', '3', '6', '12'],
+                     width=4, state='readonly').pack(side=RIGHT, padx=5)
+        ttk.Label(toolbar, text="月數：").pack(side=RIGHT)
+
+        info_var = ttk.StringVar()
+        ttk.Label(toolbar, textvariable=info_var).pack(side=LEFT, padx=15)
+
+        from ui.widgets.capacity_heatmap import CapacityHeatmap
+        heatmap = CapacityHeatmap(cap_win)
+        heatmap.pack(fill=BOTH, expand=True, padx=5, pady=5)
+
+        def on_done(result):
+            heatmap.update_chart(result, '%Y/%m' if bucket_var.get() == '月' else '%m/%d')
+            over = result.overloaded()
+            info_var.set(f"超載區段 {len(over)} 個" if over else "無超載區段")
+
+        def update_heatmap(*_args):
+            get_query_executor(self).submit(
+                'capacity_heatmap', compute_capacity_months,
+                months=int(months_var.get()), bucket=bucket_map[bucket_var.get()],
+                on_done=on_done)
+
+        bucket_var.trace_add('write', update_heatmap)
+        months_var.trace_add('write', update_heatmap)
+        update_heatmap()
+
 
 class ProductionDialog(ttk.Toplevel):
     """生產單對話框"""
@@ -396,7 +501,7 @@ class TaskDialog(ttk.Toplevel):
         super().__init__(parent)
         self.result = None
         self.title("生產任務")
-        self.geometry("420x380")
+        self.geometry("420x410")
         self.resizable(False, False)
         self.transient(parent)
         self.grab_set()
@@ -442,6 +547,13 @@ class TaskDialog(ttk.Toplevel):
         self.e_status.set('待開始')
         self.e_status.grid(row=row, column=1, sticky=W, pady=3)
 
+        row += 1
+        ttk.Label(frame, text="前置任務：").grid(row=row, column=0, sticky=W, pady=3)
+        self.e_depends = ttk.Entry(frame, width=15)
+        self.e_depends.grid(row=row, column=1, sticky=W, pady=3)
+        ttk.Label(frame, text="任務 ID，以逗號分隔", bootstyle=SECONDARY).grid(
+            row=row, column=1, sticky=E, pady=3)
+
         row += 1
         ttk.Label(frame, text="備註：").grid(row=row, column=0, sticky=NW, pady=3)
         self.e_notes = ttk.Text(frame, width=25, height=2)
@@ -463,6 +575,7 @@ class TaskDialog(ttk.Toplevel):
             self.e_progress.delete(0, 'end')
             self.e_progress.insert(0, str(data.get('progress_pct', 0)))
             self.e_status.set(data.get('status', '待開始'))
+            self.e_depends.insert(0, data.get('depends_on') or '')
 
         self.wait_window()
 
@@ -478,6 +591,8 @@ class TaskDialog(ttk.Toplevel):
         except ValueError:
             progress = 0
 
+        deps = parse_depends_on(self.e_depends.get())
+
         self.result = dict(
             task_name=name,
             department=self.e_dept.get().strip() or None,
@@ -486,6 +601,7 @@ class TaskDialog(ttk.Toplevel):
             end_date=self.e_end.entry.get().strip() or None,
             progress_pct=progress,
             status=self.e_status.get(),
+            depends_on=', '.join(str(i) for i in deps) or None,
             notes=self.e_notes.get('1.0', 'end').strip() or None,
         )
         self.destroy()
@@ -36,6 +36,8 @@ class QuotationModule(ttk.Frame):
                    bootstyle=WARNING, width=8).pack(side=LEFT, padx=2)
         ttk.Button(toolbar, text="匯出 PDF", command=self._on_export_pdf,
                    bootstyle=PRIMARY+OUTLINE, width=10).pack(side=LEFT, padx=2)
+        ttk.Button(toolbar, text="批次匯出", command=self._on_batch_export,
+                   bootstyle=PRIMARY+OUTLINE, width=10).pack(side=LEFT, padx=2)
 
         # 篩選
         ttk.Label(toolbar, text="狀態：").pack(side=RIGHT, padx=(10, 2))
@@ -215,6 +217,10 @@ class QuotationModule(ttk.Frame):
                 f"已成功轉為訂單：{order_num}", parent=self.winfo_toplevel())
             self.refresh()
 
+    def _on_batch_export(self):
+        from ui.dialogs.batch_pdf_dialog import BatchPdfDialog
+        BatchPdfDialog(self.winfo_toplevel(), 'quotation')
+
     def _on_export_pdf(self):
         qid = self._get_selected_id()
         if not qid:
@@ -0,0 +1,78 @@
+"""部門產能負荷熱度圖 Widget — 使用 matplotlib 嵌入 Tkinter"""
+import tkinter as tk
+import numpy as np
+import matplotlib
+matplotlib.use('TkAgg')
+import matplotlib.pyplot as plt
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+
+class CapacityHeatmap(tk.Frame):
+    """顯示 core.capacity.CapacityResult 的負荷率熱度圖"""
+
+    # 負荷率色階上限（超過此值皆以最深色顯示）
+    MAX_UTILIZATION = 1.5
+
+    def __init__(self, parent, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.figure = plt.Figure(figsize=(10, 4), dpi=96, facecolor='white')
+        self.figure.subplots_adjust(left=0.10, right=0.92, top=0.95, bottom=0.18)
+        self.ax = self.figure.add_subplot(111)
+        self.canvas = FigureCanvasTkAgg(self.figure, master=self)
+        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        cmap = matplotlib.colormaps['RdYlGn_r'].copy()
+        cmap.set_bad('#EEEEEE')     # 無產能（無機器）的區段
+        self._image = self.ax.imshow(np.zeros((1, 1)), cmap=cmap, aspect='auto',
+                                     vmin=0, vmax=self.MAX_UTILIZATION,
+                                     interpolation='nearest')
+        cbar = self.figure.colorbar(self._image, ax=self.ax, fraction=0.03, pad=0.02)
+        cbar.set_label('負荷率', fontsize=9)
+
+        self._hover = self.ax.annotate('', xy=(0, 0), xytext=(10, 10),
+                                       textcoords='offset points', fontsize=8,
+                                       visible=False,
+                                       bbox=dict(boxstyle='round,pad=0.3',
+                                                 fc='#FFFDE7', ec='#BDBDBD'))
+        self._result = None
+        self.canvas.mpl_connect('motion_notify_event', self._on_motion)
+
+    def update_chart(self, result, date_format='%m/%d'):
+        """以 CapacityResult 更新熱度圖"""
+        self._result = result
+        util = np.ma.masked_invalid(result.utilization)
+        self._image.set_data(util)
+        self._image.set_extent((-0.5, util.shape[1] - 0.5, util.shape[0] - 0.5, -0.5))
+
+        self.ax.set_yticks(range(len(result.departments)))
+        self.ax.set_yticklabels(result.departments, fontsize=9)
+
+        # 區段很多時只標示部分刻度
+        step = max(1, len(result.periods) // 26)
+        ticks = list(range(0, len(result.periods), step))
+        self.ax.set_xticks(ticks)
+        self.ax.set_xticklabels([result.periods[i].strftime(date_format) for i in ticks],
+                                rotation=45, fontsize=8)
+        self.canvas.draw_idle()
+
+    def _on_motion(self, event):
+        result = self._result
+        if result is None or event.inaxes is not self.ax or event.xdata is None:
+            if self._hover.get_visible():
+                self._hover.set_visible(False)
+                self.canvas.draw_idle()
+            return
+
+        col, row = int(round(event.xdata)), int(round(event.ydata))
+        if not (0 <= row < len(result.departments) and 0 <= col < len(result.periods)):
+            return
+        load = result.load[row, col]
+        cap = result.capacity[row, col]
+        text = (f"{result.departments[row]}  {result.periods[col].isoformat()}\n"
+                f"負荷 {load:,.1f} h / 產能 {cap:,.1f} h")
+        if cap > 0:
+            text += f"\n負荷率 {load / cap:.0%}"
+        self._hover.xy = (col, row)
+        self._hover.set_text(text)
+        self._hover.set_visible(True)
+        self.canvas.draw_idle()
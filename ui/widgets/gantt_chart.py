@@ -1,10 +1,19 @@
-"""生產進度甘特圖 Widget — 使用 matplotlib 嵌入 Tkinter"""
+"""生產進度甘特圖 Widget — 使用 matplotlib 嵌入 Tkinter
+
+繪製方式：
+- 所有任務條以兩個 PolyCollection（底條 / 進度條）一次繪製，更新時只替換頂點資料
+- 只繪製捲動視窗內可見的列，任務數量再多也維持固定繪製成本
+- 今日線與滑鼠提示為 animated artist，以 blitting 更新，不重繪整張圖
+"""
 import tkinter as tk
 from datetime import datetime, timedelta
+import numpy as np
 import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba_array
 from matplotlib.dates import DateFormatter, DayLocator, WeekdayLocator
 import matplotlib.dates as mdates
 
@@ -27,13 +36,72 @@ class GanttChart(tk.Frame):
         '低': '#66BB6A',
     }
 
+    CRITICAL_COLOR = '#C62828'
+
+    BAR_HEIGHT = 0.6
+    ROW_PIXELS = 24     # 每列約佔像素高度（決定可見列數）
+
     def __init__(self, parent, **kwargs):
         super().__init__(parent, **kwargs)
         self.figure = plt.Figure(figsize=(10, 5), dpi=96, facecolor='white')
+        self.figure.subplots_adjust(left=0.22, right=0.98, top=0.97, bottom=0.12)
         self.ax = self.figure.add_subplot(111)
         self.canvas = FigureCanvasTkAgg(self.figure, master=self)
-        self.canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+        self.v_scroll = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.v_scroll.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.get_tk_widget().pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
         self._tasks = []
+        self._row_offset = 0
+        self._visible_rows = 20
+        self._background = None
+
+        # 任務資料（numpy 陣列，依顯示順序由上而下）
+        self._starts = np.empty(0)
+        self._durations = np.empty(0)
+        self._progress = np.empty(0)
+        self._colors = np.empty((0, 4))
+        self._critical = np.empty(0, dtype=bool)
+        self._labels = []
+
+        self._create_artists()
+
+        self.canvas.mpl_connect('draw_event', self._on_draw)
+        self.canvas.mpl_connect('resize_event', self._on_resize)
+        self.canvas.mpl_connect('scroll_event', self._on_wheel)
+        self.canvas.mpl_connect('motion_notify_event', self._on_motion)
+
+        self._today_after = None
+        self.bind('<Destroy>', self._on_destroy, add='+')
+        self._schedule_today_update()
+
+    def _create_artists(self):
+        """建立可重複使用的 artist（之後只更新資料）"""
+        ax = self.ax
+        self._bg_bars = PolyCollection([], facecolors='#E0E0E0', edgecolors='none', zorder=1)
+        self._prog_bars = PolyCollection([], edgecolors='none', zorder=2, alpha=0.85)
+        ax.add_collection(self._bg_bars)
+        ax.add_collection(self._prog_bars)
+
+        self._pct_texts = []
+        self._empty_text = ax.text(0.5, 0.5, '尚無排程資料', ha='center', va='center',
+                                   fontsize=14, color='#888888', transform=ax.transAxes,
+                                   visible=False)
+
+        self._today_line = ax.axvline(mdates.date2num(datetime.now()), color='#E53935',
+                                      linewidth=1.5, linestyle='--', zorder=4,
+                                      animated=True)
+        self._hover = ax.annotate('', xy=(0, 0), xytext=(12, 12), textcoords='offset points',
+                                  fontsize=8, zorder=5, animated=True, visible=False,
+                                  bbox=dict(boxstyle='round,pad=0.3', fc='#FFFDE7', ec='#BDBDBD'))
+
+        ax.xaxis.set_major_formatter(DateFormatter('%m/%d'))
+        ax.tick_params(axis='x', rotation=45, labelsize=8)
+        ax.grid(axis='x', alpha=0.3, linestyle='--')
+        ax.set_axisbelow(True)
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
 
     def update_chart(self, tasks):
         """更新甘特圖
@@ -45,96 +113,218 @@ class GanttChart(tk.Frame):
             - progress: int (0-100)
             - status: str
             - group: str (分組名稱，如產品名稱)
+            - critical: bool (選用，要徑任務以紅框標示)
+            - slack: int (選用，浮時天數，顯示於滑鼠提示)
         """
         self._tasks = tasks
-        self.ax.clear()
+        self._row_offset = 0
+        n = len(tasks)
 
-        if not tasks:
-            self.ax.text(0.5, 0.5, '尚無排程資料', ha='center', va='center',
-                         fontsize=14, color='#888888', transform=self.ax.transAxes)
-            self.ax.set_xticks([])
-            self.ax.set_yticks([])
-            self.canvas.draw()
-            return
+        self._labels = [t.get('label', f'任務 {i+1}') for i, t in enumerate(tasks)]
+        starts, ends = self._parse_dates(tasks)
+        self._starts = starts
+        self._durations = np.maximum(ends - starts, 1.0)
+        self._progress = np.array([t.get('progress', 0) or 0 for t in tasks], dtype=float)
+        self._colors = to_rgba_array(
+            [self.STATUS_COLORS.get(t.get('status', '待開始'), '#90A4AE') for t in tasks]
+        ) if n else np.empty((0, 4))
+        self._critical = np.array([bool(t.get('critical')) for t in tasks], dtype=bool)
 
-        labels = []
-        starts = []
-        durations = []
-        colors = []
-        progress_list = []
+        if n:
+            min_date = self._starts.min() - 2
+            max_date = (self._starts + self._durations).max() + 2
+            date_range = max_date - min_date
+            if date_range <= 30:
+                self.ax.xaxis.set_major_locator(DayLocator(interval=2))
+            elif date_range <= 90:
+                self.ax.xaxis.set_major_locator(WeekdayLocator(byweekday=0))
+            else:
+                self.ax.xaxis.set_major_locator(mdates.MonthLocator())
+            self.ax.set_xlim(min_date, max_date)
+
+        self._render_rows()
+
+    def _parse_dates(self, tasks):
+        """將起訖日期字串轉為 matplotlib 日期數值（向量化解析，失敗時逐筆處理）"""
+        if not tasks:
+            return np.empty(0), np.empty(0)
+        try:
+            starts = np.array([t['start'] for t in tasks], dtype='datetime64[D]')
+            ends = np.array([t['end'] for t in tasks], dtype='datetime64[D]')
+            return mdates.date2num(starts), mdates.date2num(ends)
+        except (ValueError, KeyError, TypeError):
+            pass
 
-        for i, task in enumerate(reversed(tasks)):
-            labels.append(task.get('label', f'任務 {i+1}'))
+        starts, ends = [], []
+        for task in tasks:
             try:
                 start_dt = datetime.strptime(task['start'], '%Y-%m-%d')
                 end_dt = datetime.strptime(task['end'], '%Y-%m-%d')
-            except (ValueError, KeyError):
+            except (ValueError, KeyError, TypeError):
                 start_dt = datetime.now()
                 end_dt = start_dt + timedelta(days=1)
-
             starts.append(start_dt)
-            dur = (end_dt - start_dt).days
-            if dur < 1:
-                dur = 1
-            durations.append(dur)
-
-            status = task.get('status', '待開始')
-            colors.append(self.STATUS_COLORS.get(status, '#90A4AE'))
-            progress_list.append(task.get('progress', 0))
-
-        y_positions = range(len(labels))
-
-        # 繪製背景條（灰色底）
-        self.ax.barh(y_positions, durations, left=starts, height=0.6,
-                     color='#E0E0E0', edgecolor='none', zorder=1)
-
-        # 繪製進度條
-        for i, (start, dur, prog, color) in enumerate(
-                zip(starts, durations, progress_list, colors)):
-            prog_dur = dur * prog / 100
-            if prog_dur > 0:
-                self.ax.barh(i, prog_dur, left=start, height=0.6,
-                             color=color, edgecolor='none', zorder=2, alpha=0.85)
-
-            # 在條上顯示百分比
-            bar_center = start + timedelta(days=dur / 2)
-            self.ax.text(bar_center, i, f'{prog}%',
-                         ha='center', va='center', fontsize=8,
-                         color='#333333', fontweight='bold', zorder=3)
-
-        # 今日線
-        today = datetime.now()
-        self.ax.axvline(today, color='#E53935', linewidth=1.5,
-                        linestyle='--', zorder=4, label='今日')
-
-        # 設定 Y 軸
-        self.ax.set_yticks(y_positions)
-        self.ax.set_yticklabels(labels, fontsize=9)
-
-        # 設定 X 軸（日期格式）
-        self.ax.xaxis.set_major_formatter(DateFormatter('%m/%d'))
-        if len(starts) > 0:
-            all_dates = starts + [s + timedelta(days=d) for s, d in zip(starts, durations)]
-            min_date = min(all_dates) - timedelta(days=2)
-            max_date = max(all_dates) + timedelta(days=2)
-            date_range = (max_date - min_date).days
-            if date_range <= 30:
-                self.ax.xaxis.set_major_locator(DayLocator(interval=2))
-            elif date_range <= 90:
-                self.ax.xaxis.set_major_locator(WeekdayLocator(byweekday=0))
+            ends.append(end_dt)
+        return mdates.date2num(starts), mdates.date2num(ends)
+
+    def _render_rows(self):
+        """只把可見範圍內的列寫入 collection，並更新捲軸與軸標籤"""
+        n = len(self._tasks)
+        self._empty_text.set_visible(n == 0)
+        self._hover.set_visible(False)
+
+        if n == 0:
+            self._bg_bars.set_verts([])
+            self._prog_bars.set_verts([])
+            for txt in self._pct_texts:
+                txt.set_visible(False)
+            self.ax.set_xticks([])
+            self.ax.set_yticks([])
+            self.v_scroll.set(0, 1)
+            self.canvas.draw_idle()
+            return
+
+        first = self._row_offset
+        last = min(n, first + self._visible_rows)
+        rows = np.arange(first, last)
+        y = -rows.astype(float)          # 第一筆任務在最上方
+        h = self.BAR_HEIGHT / 2
+
+        starts = self._starts[first:last]
+        durs = self._durations[first:last]
+        prog_durs = durs * self._progress[first:last] / 100
+
+        self._bg_bars.set_verts(self._bar_verts(starts, durs, y, h))
+        critical = self._critical[first:last]
+        self._bg_bars.set_edgecolor([self.CRITICAL_COLOR if c else 'none' for c in critical])
+        self._bg_bars.set_linewidth(np.where(critical, 1.5, 0))
+        has_prog = prog_durs > 0
+        self._prog_bars.set_verts(self._bar_verts(starts[has_prog], prog_durs[has_prog],
+                                                  y[has_prog], h))
+        self._prog_bars.set_facecolor(self._colors[first:last][has_prog])
+
+        # 百分比文字：重複使用 Text 物件
+        while len(self._pct_texts) < len(rows):
+            self._pct_texts.append(self.ax.text(0, 0, '', ha='center', va='center',
+                                                fontsize=8, color='#333333',
+                                                fontweight='bold', zorder=3))
+        centers = starts + durs / 2
+        for i, txt in enumerate(self._pct_texts):
+            if i < len(rows):
+                txt.set_position((centers[i], y[i]))
+                txt.set_text(f'{int(self._progress[first + i])}%')
+                txt.set_visible(True)
             else:
-                self.ax.xaxis.set_major_locator(mdates.MonthLocator())
-            self.ax.set_xlim(min_date, max_date)
+                txt.set_visible(False)
+
+        self.ax.set_yticks(y)
+        self.ax.set_yticklabels(self._labels[first:last], fontsize=9)
+        self.ax.set_ylim(-(first + self._visible_rows) + 0.5, -first + 0.5)
+
+        self.v_scroll.set(first / n, last / n)
+        self.canvas.draw_idle()
 
-        self.ax.tick_params(axis='x', rotation=45, labelsize=8)
-        self.ax.grid(axis='x', alpha=0.3, linestyle='--')
-        self.ax.set_axisbelow(True)
-        self.ax.spines['top'].set_visible(False)
-        self.ax.spines['right'].set_visible(False)
+    @staticmethod
+    def _bar_verts(starts, durs, y, h):
+        """以陣列運算產生矩形頂點 (N, 4, 2)"""
+        x0 = starts
+        x1 = starts + durs
+        verts = np.empty((len(starts), 4, 2))
+        verts[:, 0, 0] = x0
+        verts[:, 0, 1] = y - h
+        verts[:, 1, 0] = x0
+        verts[:, 1, 1] = y + h
+        verts[:, 2, 0] = x1
+        verts[:, 2, 1] = y + h
+        verts[:, 3, 0] = x1
+        verts[:, 3, 1] = y - h
+        return verts
+
+    # ----- 捲動 -----
+
+    def _scroll_to(self, offset):
+        n = len(self._tasks)
+        offset = max(0, min(int(offset), max(0, n - self._visible_rows)))
+        if offset != self._row_offset:
+            self._row_offset = offset
+            self._render_rows()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self._scroll_to(float(value) * len(self._tasks))
+        elif action == 'scroll':
+            step = self._visible_rows if unit == 'pages' else 1
+            self._scroll_to(self._row_offset + int(value) * step)
+
+    def _on_wheel(self, event):
+        self._scroll_to(self._row_offset + (-3 if event.button == 'up' else 3))
+
+    def _on_resize(self, event):
+        axes_height = self.ax.get_window_extent().height
+        rows = max(5, int(axes_height // self.ROW_PIXELS))
+        if rows != self._visible_rows:
+            self._visible_rows = rows
+            self._row_offset = max(0, min(self._row_offset, len(self._tasks) - rows))
+            self._render_rows()
+
+    # ----- blitting：今日線與滑鼠提示 -----
+
+    def _on_draw(self, event):
+        """完整重繪後快取背景，再疊上動態元素"""
+        self._background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self._blit_overlays()
+
+    def _blit_overlays(self):
+        if self._background is None:
+            return
+        self.canvas.restore_region(self._background)
+        if self._tasks:
+            self.ax.draw_artist(self._today_line)
+        if self._hover.get_visible():
+            self.ax.draw_artist(self._hover)
+        self.canvas.blit(self.figure.bbox)
+
+    def _on_motion(self, event):
+        if not self._tasks or event.inaxes is not self.ax or event.xdata is None:
+            if self._hover.get_visible():
+                self._hover.set_visible(False)
+                self._blit_overlays()
+            return
+
+        idx = int(round(-event.ydata))
+        visible = False
+        if self._row_offset <= idx < min(len(self._tasks), self._row_offset + self._visible_rows):
+            start = self._starts[idx]
+            end = start + self._durations[idx]
+            if start <= event.xdata <= end and abs(event.ydata + idx) <= self.BAR_HEIGHT / 2:
+                task = self._tasks[idx]
+                text = (f"{self._labels[idx]}\n"
+                        f"{task.get('start', '')} ~ {task.get('end', '')}\n"
+                        f"{task.get('status', '')}  {int(self._progress[idx])}%")
+                if task.get('slack') is not None:
+                    text += '  要徑' if task.get('critical') else f"  浮時 {task['slack']} 天"
+                self._hover.xy = (event.xdata, event.ydata)
+                self._hover.set_text(text)
+                visible = True
+
+        if visible or self._hover.get_visible():
+            self._hover.set_visible(visible)
+            self._blit_overlays()
+
+    def _schedule_today_update(self):
+        """每分鐘更新今日線位置（只 blit，不重繪）"""
+        self._today_after = None
+        if not self.winfo_exists():
+            return
+        self._today_line.set_xdata([mdates.date2num(datetime.now())] * 2)
+        self._blit_overlays()
+        self._today_after = self.after(60000, self._schedule_today_update)
 
-        self.figure.tight_layout()
-        self.canvas.draw()
+    def _on_destroy(self, event):
+        """元件銷毀時取消今日線計時器，避免對已銷毀的畫布 blit"""
+        if event.widget is self and self._today_after is not None:
+            self.after_cancel(self._today_after)
+            self._today_after = None
 
     def clear_chart(self):
-        self.ax.clear()
-        self.canvas.draw()
+        self.update_chart([])
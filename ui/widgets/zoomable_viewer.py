@@ -79,8 +79,13 @@ class ZoomableImageViewer(ttk.Frame):
 
     # ===== 公開方法 =====
 
-    def set_image(self, pil_image):
-        """設定要顯示的 PIL Image（完整解析度）"""
+    def set_image(self, pil_image, keep_view=False):
+        """設定要顯示的 PIL Image（完整解析度）
+
+        keep_view 為 True 且尺寸與目前圖片相同時保留縮放與平移（切換同一組比對圖時使用）
+        """
+        same_size = (self._pil_image is not None and pil_image is not None
+                     and self._pil_image.size == pil_image.size)
         self._pil_image = pil_image
         if pil_image is None:
             self._clear_display()
@@ -88,7 +93,26 @@ class ZoomableImageViewer(ttk.Frame):
 
         w, h = pil_image.size
         self._size_label.config(text=f"{w}x{h}")
-        self._zoom_fit()
+        if keep_view and same_size:
+            self._redraw()
+        else:
+            self._zoom_fit()
+
+    def zoom_to_region(self, left, top, right, bottom):
+        """縮放並平移至圖片中的指定範圍（原圖像素座標）"""
+        if self._pil_image is None:
+            return
+        cw = self._canvas.winfo_width()
+        ch = self._canvas.winfo_height()
+        if cw < 10 or ch < 10:
+            self.after(50, lambda: self.zoom_to_region(left, top, right, bottom))
+            return
+        iw, ih = self._pil_image.size
+        zoom = min(cw / max(1, right - left), ch / max(1, bottom - top)) * 0.9
+        self._zoom = max(self.ZOOM_MIN, min(self.ZOOM_MAX, zoom))
+        self._pan_x = -((left + right) / 2 - iw / 2) * self._zoom
+        self._pan_y = -((top + bottom) / 2 - ih / 2) * self._zoom
+        self._redraw()
 
     def clear(self):
         """清除圖片"""